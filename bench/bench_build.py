@@ -0,0 +1,216 @@
+'''
+Per-stage build timings on a synthetic corpus (see corpus.py).
+
+Each stage runs `--repeats` times over the whole corpus; the fastest run is
+the number compared against a baseline, since it is the one least disturbed
+by whatever else the machine was doing:
+
+    python3 bench/bench_build.py --output bench/baseline.json
+    python3 bench/bench_build.py --baseline bench/baseline.json --threshold 0.10
+
+With --baseline, a stage slower than baseline * (1 + threshold) is reported
+as a regression & the exit status is 1. A baseline recorded on a different
+corpus shape is refused rather than compared.
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+import argparse
+from   collections.abc import Callable
+import contextlib
+import io
+import json
+from   pathlib import Path
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve() / "src"))
+
+from   corpus   import CorpusShape, add_shape_args, generate_pages, shape_from_args, write_corpus
+from   main     import collect_pages, compile_page_template, render_pages
+from   utils    import (
+    block_to_block_type,
+    markdown_to_blocks,
+    markdown_to_html_node,
+    text_to_text_nodes,
+)
+
+#---[ Global Imports ]----------------------------------------------------------
+
+BENCH_FORMAT = 1
+
+STAGES = (
+    "block_split",
+    "block_classify",
+    "inline_tokenize",
+    "tree_build",
+    "render",
+    "template_fill",
+    "end_to_end",
+)
+
+
+#---[ Stages ]------------------------------------------------------------------
+def make_stages(shape: CorpusShape, work_dir: Path) -> dict[str, Callable[[], object]]:
+    '''
+    one zero-argument callable per stage, each covering every page
+    - a stage's inputs are prepared up front, so its time is only its own work
+    - end_to_end reads markdown from & writes HTML to `work_dir`
+    '''
+    markdowns = list(generate_pages(shape).values())
+    blocks    = [block for markdown in markdowns for block in markdown_to_blocks(markdown)]
+    trees     = [markdown_to_html_node(markdown) for markdown in markdowns]
+    contents  = [tree.to_html() for tree in trees]
+
+    content_dir, template_path = write_corpus(work_dir, shape)
+    template  = compile_page_template(template_path, "/", {})
+    work_list = collect_pages(content_dir, work_dir / "docs")
+
+    def end_to_end() -> None:
+        for _, dest_path in work_list:
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            render_pages(work_list, template, "/")
+
+        return
+
+    return {
+        "block_split":     lambda: [markdown_to_blocks(markdown) for markdown in markdowns],
+        "block_classify":  lambda: [block_to_block_type(block) for block in blocks],
+        "inline_tokenize": lambda: [text_to_text_nodes(block) for block in blocks],
+        "tree_build":      lambda: [markdown_to_html_node(markdown) for markdown in markdowns],
+        "render":          lambda: [tree.to_html() for tree in trees],
+        "template_fill":   lambda: [
+            template.render({"Title": "Title", "Content": content}) for content in contents
+        ],
+        "end_to_end":      end_to_end,
+    }
+
+def time_stage(run: Callable[[], object], repeats: int) -> dict[str, float | int]:
+    timings = []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "min":     min(timings),
+        "median":  statistics.median(timings),
+        "repeats": repeats,
+    }
+
+def run_benchmarks(shape: CorpusShape, repeats: int, stages: list[str]) -> dict:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        runs = make_stages(shape, Path(temp_dir))
+
+        results = {}
+        for name in stages:
+            results[name] = time_stage(runs[name], repeats)
+
+    return {
+        "format":   BENCH_FORMAT,
+        "python":   platform.python_version(),
+        "platform": platform.platform(),
+        "corpus":   shape.to_dict(),
+        "stages":   results,
+    }
+
+#---[ Stages ]------------------------------------------------------------------
+
+
+#---[ Baseline Comparison ]-----------------------------------------------------
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    '''
+    returns the names of stages whose fastest time exceeds the baseline's by
+    more than `threshold` (a fraction, 0.1 == 10%)
+    - stages missing from either side are skipped
+    '''
+    regressions = []
+
+    for name, timing in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+        if timing["min"] > base["min"] * (1 + threshold):
+            regressions.append(name)
+
+    return regressions
+
+def print_report(results: dict, baseline: dict | None, regressions: list[str]) -> None:
+    print(f"corpus: {', '.join(f'{k}={v}' for k, v in results['corpus'].items())}")
+    print("")
+
+    header = f"{'stage':<18}{'min (ms)':>12}{'median (ms)':>14}"
+    if baseline:
+        header += f"{'baseline (ms)':>16}{'change':>10}"
+    print(header)
+
+    for name, timing in results["stages"].items():
+        line = f"{name:<18}{timing['min'] * 1000:>12.2f}{timing['median'] * 1000:>14.2f}"
+
+        base = baseline["stages"].get(name) if baseline else None
+        if base:
+            change = timing["min"] / base["min"] - 1
+            line += f"{base['min'] * 1000:>16.2f}{change:>+10.1%}"
+            if name in regressions:
+                line += "  REGRESSION"
+        print(line)
+
+    return
+
+#---[ Baseline Comparison ]-----------------------------------------------------
+
+
+#---[ Entry ]-------------------------------------------------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser(description="per-stage build benchmarks on a synthetic corpus")
+    add_shape_args(parser)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--stage", action="append", choices=STAGES, dest="stages",
+        help="only run this stage (repeatable); default is every stage"
+    )
+    parser.add_argument("--output", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10,
+        help="allowed slowdown against the baseline, as a fraction (default 0.10)"
+    )
+    args = parser.parse_args()
+
+    shape = shape_from_args(args)
+
+    baseline = None
+    if args.baseline:
+        with args.baseline.open("r") as inFile:
+            baseline = json.load(inFile)
+        if baseline.get("format") != BENCH_FORMAT:
+            sys.exit(f"{args.baseline}: unsupported benchmark format {baseline.get('format')!r}")
+        if baseline.get("corpus") != shape.to_dict():
+            sys.exit(f"{args.baseline}: recorded on a different corpus: {baseline.get('corpus')}")
+
+    results = run_benchmarks(shape, args.repeats, args.stages or list(STAGES))
+
+    regressions = []
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+
+    print_report(results, baseline, regressions)
+
+    if args.output:
+        with args.output.open("w") as outFile:
+            json.dump(results, outFile, indent=1)
+            outFile.write("\n")
+
+    if regressions:
+        sys.exit(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+
+    return
+
+if __name__ == "__main__":
+    main()
+
+#---[ Entry ]-------------------------------------------------------------------
@@ -0,0 +1,141 @@
+'''
+Memory benchmark: bytes per node for a big synthetic document.
+
+A parsed tree is copied twice: once into the real node classes & once into
+plain `__dict__` classes with a fresh props dict per node (how the node
+classes used to be laid out). The copies share the parsed strings, so the
+numbers are the cost of the node objects themselves:
+
+    python3 bench/bench_memory.py --paragraphs 5000
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+import argparse
+import gc
+from   pathlib import Path
+import sys
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve() / "src"))
+
+from   htmlnode   import HTMLNode
+from   leafnode   import LeafNode
+from   parentnode import ParentNode
+from   textnode   import TextNode
+from   utils      import markdown_to_html_node, text_to_text_nodes
+
+#---[ Global Imports ]----------------------------------------------------------
+
+
+#---[ Synthetic Document ]------------------------------------------------------
+def synthetic_markdown(paragraphs: int) -> str:
+    blocks = ["# Synthetic Document"]
+
+    for i in range(paragraphs):
+        blocks.append(
+            f"Paragraph {i} has **bold {i}** words, _italic {i}_ words, `code {i}` "
+            f"and a [link {i}](/pages/{i}) next to an ![image {i}](/images/{i}.png)."
+        )
+        if i % 10 == 0:
+            blocks.append("\n".join(f"- item {i}.{j} with **bold**" for j in range(5)))
+        if i % 25 == 0:
+            blocks.append(f"## Heading {i}")
+
+    return "\n\n".join(blocks)
+
+#---[ Synthetic Document ]------------------------------------------------------
+
+
+#---[ Plain __dict__ Layout ]---------------------------------------------------
+class PlainNode:
+    def __init__(self, tag, value, children, props) -> None:
+        self.tag      = tag
+        self.value    = value
+        self.children = children
+        self.props    = dict(props) if props is not None else None
+
+class PlainTextNode:
+    def __init__(self, text, text_type, url) -> None:
+        self.text      = text
+        self.text_type = text_type
+        self.url       = url
+
+def to_plain(node: HTMLNode) -> PlainNode:
+    children = None
+    if isinstance(node, ParentNode):
+        children = [to_plain(child) for child in node.children]
+
+    props = dict(node.props) if node.props else None
+
+    return PlainNode(node.tag, node.value, children, props)
+
+def to_current(node: HTMLNode) -> HTMLNode:
+    props = dict(node.props) if node.props else None
+
+    if isinstance(node, ParentNode):
+        return ParentNode(node.tag, [to_current(child) for child in node.children], props)
+
+    return LeafNode(node.tag, node.value, props)
+
+#---[ Plain __dict__ Layout ]---------------------------------------------------
+
+
+#---[ Measurement ]-------------------------------------------------------------
+def count_nodes(node: HTMLNode) -> int:
+    if isinstance(node, ParentNode):
+        return 1 + sum(count_nodes(child) for child in node.children)
+
+    return 1
+
+def measure(build) -> tuple[object, int]:
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+
+    result = build()
+
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    return result, size
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="bytes per node on a synthetic document")
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    args = parser.parse_args()
+
+    markdown = synthetic_markdown(args.paragraphs)
+
+    root = markdown_to_html_node(markdown)
+    node_count = count_nodes(root)
+
+    _, plain_bytes = measure(lambda: to_plain(root))
+    _, tree_bytes  = measure(lambda: to_current(root))
+
+    text_nodes = [text_to_text_nodes(line) for line in markdown.split("\n")]
+    text_node_count = sum(len(nodes) for nodes in text_nodes)
+
+    _, plain_text_bytes = measure(lambda: [
+        [PlainTextNode(n.text, n.text_type, n.url) for n in nodes] for nodes in text_nodes
+    ])
+    _, text_bytes = measure(lambda: [
+        [TextNode(n.text, n.text_type, n.url) for n in nodes] for nodes in text_nodes
+    ])
+
+    print(f"document: {len(markdown):,} chars, {node_count:,} HTML nodes, {text_node_count:,} TextNodes")
+    print("")
+    print(f"{'':<24}{'plain __dict__':>16}{'current':>16}")
+    print(f"{'HTML tree bytes/node':<24}{plain_bytes / node_count:>16.1f}{tree_bytes / node_count:>16.1f}")
+    print(f"{'TextNode bytes/node':<24}{plain_text_bytes / text_node_count:>16.1f}{text_bytes / text_node_count:>16.1f}")
+
+    return
+
+#---[ Measurement ]-------------------------------------------------------------
+
+
+#---[ Entry ]-------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
+
+#---[ Entry ]-------------------------------------------------------------------
@@ -0,0 +1,200 @@
+'''
+Deterministic synthetic sites for the benchmarks.
+
+The same shape & seed always produce byte-identical markdown, so timings from
+different checkouts or machines are measured on the same input:
+
+    python3 bench/corpus.py /tmp/site --pages 200 --words 80 --depth 3
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+import argparse
+from   pathlib import Path
+import random
+
+#---[ Global Imports ]----------------------------------------------------------
+
+WORDS = (
+    "tom", "bombadil", "river", "daughter", "willow", "barrow", "downs", "hobbit",
+    "ring", "shire", "elf", "ford", "bruinen", "glorfindel", "horse", "light",
+    "road", "forest", "old", "song", "merry", "dol", "singing", "water", "stone",
+    "the", "a", "of", "and", "in", "to", "was", "his", "with", "under", "over",
+)
+
+TEMPLATE = """<!doctype html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title> {{ Title }} </title>
+    <link href="/index.css" rel="stylesheet">
+</head>
+<body>
+    <article>
+        {{ Content }}
+    </article>
+</body>
+</html>
+"""
+
+
+class CorpusShape:
+    '''
+    Size & shape of a synthetic site:
+        - pages:      number of markdown files
+        - paragraphs: paragraphs per page (lists, quotes, & code are mixed in)
+        - words:      words per paragraph
+        - links:      fraction of words that become a link or image
+        - emphasis:   fraction of words wrapped in bold, italic, or code
+        - list_items: items per list
+        - depth:      directory nesting depth of the content tree
+        - seed:       random seed; same shape + seed -> same corpus
+    '''
+    FIELDS = ("pages", "paragraphs", "words", "links", "emphasis", "list_items", "depth", "seed")
+
+    def __init__(self,
+        pages: int=100,
+        paragraphs: int=20,
+        words: int=60,
+        links: float=0.05,
+        emphasis: float=0.1,
+        list_items: int=5,
+        depth: int=2,
+        seed: int=0
+    ) -> None:
+        self.pages      = pages
+        self.paragraphs = paragraphs
+        self.words      = words
+        self.links      = links
+        self.emphasis   = emphasis
+        self.list_items = list_items
+        self.depth      = depth
+        self.seed       = seed
+
+        return
+
+    def to_dict(self) -> dict[str, int | float]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f"CorpusShape({', '.join(f'{k}={v}' for k, v in self.to_dict().items())})"
+
+
+#---[ Generation ]--------------------------------------------------------------
+def inline_text(rng: random.Random, shape: CorpusShape, count: int) -> str:
+    words = []
+
+    for i in range(count):
+        word = rng.choice(WORDS)
+        roll = rng.random()
+
+        if roll < shape.links:
+            if rng.random() < 0.25:
+                word = f"![{word}](/images/{word}.png)"
+            else:
+                word = f"[{word}](/{word}/{i})"
+        elif roll < shape.links + shape.emphasis:
+            word = rng.choice(("**{}**", "_{}_", "`{}`")).format(word)
+
+        words.append(word)
+
+    return " ".join(words)
+
+def page_markdown(rng: random.Random, shape: CorpusShape, number: int) -> str:
+    blocks = [f"# Page {number}"]
+
+    for i in range(shape.paragraphs):
+        blocks.append(inline_text(rng, shape, shape.words))
+
+        kind = i % 8
+        if kind == 2:
+            blocks.append("\n".join(
+                f"- {inline_text(rng, shape, 6)}" for _ in range(shape.list_items)
+            ))
+        elif kind == 4:
+            blocks.append("\n".join(
+                f"{j}. {inline_text(rng, shape, 6)}" for j in range(1, shape.list_items + 1)
+            ))
+        elif kind == 5:
+            blocks.append(f"## Section {i}")
+        elif kind == 6:
+            blocks.append(f"> {inline_text(rng, shape, shape.words // 2)}")
+        elif kind == 7:
+            blocks.append("```\n" + "\n".join(f"line {j} = {j * i}" for j in range(4)) + "\n```")
+
+    return "\n\n".join(blocks) + "\n"
+
+def page_rel_path(shape: CorpusShape, number: int) -> Path:
+    '''
+    spreads pages over a tree `depth` directories deep: page n lives under
+    d{n % 3}/d{n % 5}/... so every level has a few siblings
+    '''
+    parts = [f"d{number % (3 + level * 2)}" for level in range(shape.depth)]
+
+    return Path(*parts, f"page{number}", "index.md")
+
+def generate_pages(shape: CorpusShape) -> dict[Path, str]:
+    '''
+    every page of the corpus as {path relative to content/: markdown}
+    '''
+    rng = random.Random(shape.seed)
+
+    pages = {}
+    for number in range(shape.pages):
+        pages[page_rel_path(shape, number)] = page_markdown(rng, shape, number)
+
+    return pages
+
+def write_corpus(root: Path, shape: CorpusShape) -> tuple[Path, Path]:
+    '''
+    writes `root`/content/... & `root`/template.html, returning
+    (content_dir, template_path)
+    '''
+    content_dir = root / "content"
+
+    for rel, markdown in generate_pages(shape).items():
+        path = content_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(markdown)
+
+    template_path = root / "template.html"
+    template_path.write_text(TEMPLATE)
+
+    return content_dir, template_path
+
+def add_shape_args(parser: argparse.ArgumentParser) -> None:
+    defaults = CorpusShape()
+
+    parser.add_argument("--pages",      type=int,   default=defaults.pages)
+    parser.add_argument("--paragraphs", type=int,   default=defaults.paragraphs)
+    parser.add_argument("--words",      type=int,   default=defaults.words)
+    parser.add_argument("--links",      type=float, default=defaults.links)
+    parser.add_argument("--emphasis",   type=float, default=defaults.emphasis)
+    parser.add_argument("--list-items", type=int,   default=defaults.list_items, dest="list_items")
+    parser.add_argument("--depth",      type=int,   default=defaults.depth)
+    parser.add_argument("--seed",       type=int,   default=defaults.seed)
+
+    return
+
+def shape_from_args(args: argparse.Namespace) -> CorpusShape:
+    return CorpusShape(**{name: getattr(args, name) for name in CorpusShape.FIELDS})
+
+#---[ Generation ]--------------------------------------------------------------
+
+
+#---[ Entry ]-------------------------------------------------------------------
+def main() -> None:
+    parser = argparse.ArgumentParser(description="write a synthetic site")
+    parser.add_argument("root", type=Path, help="directory to write content/ & template.html into")
+    add_shape_args(parser)
+    args = parser.parse_args()
+
+    shape = shape_from_args(args)
+    content_dir, _ = write_corpus(args.root, shape)
+    print(f"wrote {shape.pages} pages to {content_dir}")
+
+    return
+
+if __name__ == "__main__":
+    main()
+
+#---[ Entry ]-------------------------------------------------------------------
@@ -0,0 +1,568 @@
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Callable
+from   concurrent.futures import ThreadPoolExecutor
+import errno
+import json
+import os
+from   pathlib import Path, PurePosixPath
+import posixpath
+import re
+import shutil
+
+from   deps     import STATIC_PREFIX
+from   manifest import BuildManifest, hash_bytes, hash_file
+from   walker   import DirListings, walk_files
+
+#---[ Global Imports ]----------------------------------------------------------
+
+# files at least this big are copied on the thread pool
+LARGE_FILE_SIZE    = 1 << 20
+ASSET_COPY_THREADS = 4
+
+COPY_CHUNK_SIZE    = 1 << 24
+
+# errors meaning "this kernel/filesystem can't do an in-kernel copy"
+_FAST_COPY_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ETXTBSY}
+
+# --fingerprint: hex digits of the content hash put in asset names, & the map
+# from static paths to fingerprinted names written next to the site
+FINGERPRINT_LENGTH = 8
+ASSET_MAP_NAME     = "asset-manifest.json"
+
+# fetched by name rather than through a link, so never renamed
+FINGERPRINT_EXEMPT = frozenset(("favicon.ico", "robots.txt", "CNAME", ".nojekyll", ASSET_MAP_NAME))
+
+# url(...) & @import "..." references in stylesheets, which --fingerprint
+# points at the fingerprinted copies
+CSS_URL_PATTERN = re.compile(r"""(url\(\s*(["']?))([^"')\s]+)(\2\s*\))|(@import\s+(["']))([^"']+)(\6)""")
+
+
+class SyncStats:
+    def __init__(self) -> None:
+        self.copied       = 0
+        self.linked       = 0
+        self.unchanged    = 0
+        self.removed      = 0
+        self.bytes_copied = 0
+
+        return
+
+    def __str__(self) -> str:
+        return (
+            f"{self.copied} copied ({self.bytes_copied:,} bytes), {self.linked} linked, "
+            f"{self.unchanged} unchanged, {self.removed} removed"
+        )
+
+
+#---[ Copying ]-----------------------------------------------------------------
+def fast_copy(src_path: Path, dest_path: Path) -> None:
+    '''
+    copies a file's contents & timestamps, letting the kernel move the bytes
+    when it can (copy_file_range, then sendfile) & falling back to a plain
+    read/write loop
+    - written to a temp file & renamed into place, so readers never see half
+      a file & an existing hardlink at `dest_path` is replaced, not written
+      through
+    '''
+    temp_path = dest_path.with_name(f".{dest_path.name}.tmp")
+
+    with src_path.open("rb") as inFile, temp_path.open("wb") as outFile:
+        size = os.fstat(inFile.fileno()).st_size
+
+        if not _kernel_copy(inFile.fileno(), outFile.fileno(), size):
+            shutil.copyfileobj(inFile, outFile, COPY_CHUNK_SIZE)
+
+    shutil.copystat(src_path, temp_path)
+    os.replace(temp_path, dest_path)
+
+    return
+
+def _kernel_copy(in_fd: int, out_fd: int, size: int) -> bool:
+    for copy_name in ("copy_file_range", "sendfile"):
+        copy = getattr(os, copy_name, None)
+        if copy is None:
+            continue
+
+        copied = 0
+        try:
+            while copied < size:
+                count = min(COPY_CHUNK_SIZE, size - copied)
+                if copy_name == "copy_file_range":
+                    sent = copy(in_fd, out_fd, count)
+                else:
+                    sent = copy(out_fd, in_fd, copied, count)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError as e:
+            if e.errno not in _FAST_COPY_ERRNOS:
+                raise
+
+        if copied == size:
+            return True
+
+        # start over with the next method
+        os.lseek(in_fd, 0, os.SEEK_SET)
+        os.lseek(out_fd, 0, os.SEEK_SET)
+        os.ftruncate(out_fd, 0)
+
+    return False
+
+def hardlink(src_path: Path, dest_path: Path) -> bool:
+    '''
+    points `dest_path` at the same inode as `src_path`
+    - returns False (having changed nothing) if the filesystem won't allow it
+    '''
+    temp_path = dest_path.with_name(f".{dest_path.name}.tmp")
+
+    try:
+        if temp_path.exists():
+            os.remove(temp_path)
+        os.link(src_path, temp_path)
+    except OSError:
+        return False
+
+    os.replace(temp_path, dest_path)
+
+    return True
+
+#---[ Copying ]-----------------------------------------------------------------
+
+
+#---[ Fingerprinting ]----------------------------------------------------------
+def fingerprinted_name(rel: str, file_hash: str) -> str:
+    '''
+    "css/index.css" -> "css/index.3f2a9c1b.css"
+    '''
+    if rel in FINGERPRINT_EXEMPT:
+        return rel
+
+    path   = PurePosixPath(rel)
+    suffix = path.suffix
+    stem   = path.name[:-len(suffix)] if suffix else path.name
+
+    return str(path.with_name(f"{stem}.{file_hash[:FINGERPRINT_LENGTH]}{suffix}"))
+
+def asset_content_hash(src_path: Path, manifest: BuildManifest, rel: str) -> str:
+    '''
+    hash of a static file, reusing the recorded one while the file has the
+    size & mtime of the copy it was recorded for, so unchanged assets aren't
+    re-read every build
+    '''
+    stat  = src_path.stat()
+    entry = manifest.assets.get(rel, {})
+
+    if (
+        entry.get("hash")
+        and entry.get("size") == stat.st_size
+        and entry.get("mtime") == stat.st_mtime_ns
+    ):
+        return entry["hash"]
+
+    return hash_file(src_path)
+
+def is_stylesheet(rel: str) -> bool:
+    return rel.lower().endswith(".css") and rel not in FINGERPRINT_EXEMPT
+
+def rewrite_css_urls(css: str, css_rel: str, fingerprinted: Callable[[str], str | None]) -> str:
+    '''
+    points the url(...) & @import references in the stylesheet static/`css_rel`
+    at fingerprinted copies, where `fingerprinted(rel)` gives the output path
+    of static/`rel` (or None to leave a reference alone)
+    - relative references stay relative & site-absolute ones absolute; only
+      the file name changes, as a fingerprinted copy stays in its directory
+    - full URLs, "//cdn..." URLs, data: URIs & "#fragment"s are left alone
+    '''
+    base = posixpath.dirname(css_rel)
+
+    def rewrite(url: str) -> str:
+        if url.startswith(("#", "//")) or re.match(r"[a-zA-Z][a-zA-Z0-9+.-]*:", url):
+            return url
+
+        end = len(url)
+        for separator in "?#":
+            index = url.find(separator)
+            if index != -1:
+                end = min(end, index)
+        path = url[:end]
+
+        rel = posixpath.normpath(path[1:] if path.startswith("/") else posixpath.join(base, path))
+        if rel.startswith("../") or rel in (".", ".."):
+            return url
+
+        output = fingerprinted(rel)
+        if output is None:
+            return url
+
+        return path[:len(path) - len(posixpath.basename(path))] + posixpath.basename(output) + url[end:]
+
+    def replace(match: re.Match) -> str:
+        if match.group(1) is not None:
+            return match.group(1) + rewrite(match.group(3)) + match.group(4)
+
+        return match.group(5) + rewrite(match.group(7)) + match.group(8)
+
+    return CSS_URL_PATTERN.sub(replace, css)
+
+def write_asset_map(target_dir: Path, asset_map: dict[str, str]) -> None:
+    '''
+    writes `asset_map` (static path -> fingerprinted path) as ASSET_MAP_NAME,
+    for anything outside the build that needs to find an asset
+    '''
+    path = target_dir / ASSET_MAP_NAME
+    temp_path = path.with_name(f".{path.name}.tmp")
+
+    with temp_path.open("w") as outFile:
+        json.dump(asset_map, outFile, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+    return
+
+#---[ Fingerprinting ]----------------------------------------------------------
+
+
+#---[ Static Sync ]-------------------------------------------------------------
+def gzip_path(path: Path) -> Path:
+    return path.with_name(path.name + ".gz")
+
+def remove_gzip_sibling(target_dir: Path, dest_rel: str, manifest: BuildManifest) -> None:
+    '''
+    removes the .gz that --gzip wrote next to an output that's going away
+    (see compress), & forgets it
+    '''
+    entry = manifest.compressed.pop(dest_rel, None)
+    if entry is None:
+        return
+
+    manifest.changed = True
+    if entry["gzip_size"] is not None:
+        gzip_path(target_dir / dest_rel).unlink(missing_ok=True)
+
+    return
+
+def remove_empty_parents(directory: Path, stop_dir: Path) -> None:
+    '''
+    removes `directory` and its parents while they are empty, stopping at
+    `stop_dir` (which is never removed)
+    '''
+    while directory != stop_dir and stop_dir in directory.parents:
+        if any(directory.iterdir()):
+            break
+        os.rmdir(directory)
+        directory = directory.parent
+
+    return
+
+def list_files(directory: Path, listings: DirListings | None=None, key_prefix: str="") -> list[Path]:
+    return [path for path, _ in walk_files(directory, listings=listings, key_prefix=key_prefix)]
+
+def asset_stale_reason(
+    src_path: Path,
+    dest_path: Path,
+    manifest: BuildManifest,
+    rel: str,
+    use_hash: bool=False
+) -> str | None:
+    '''
+    why the asset needs copying, or None if it's up to date
+    - an asset is up to date when the output has the same size & mtime as the
+      source (copies keep the source mtime)
+    - with `use_hash`, a same-sized file whose mtime differs is compared by
+      content hash instead, and just has its mtime fixed up if it matches
+    '''
+    try:
+        dest_stat = dest_path.stat()
+    except FileNotFoundError:
+        return "not in output yet"
+
+    src_stat = src_path.stat()
+
+    if src_stat.st_size != dest_stat.st_size:
+        return "size changed"
+    if src_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return None
+    if not use_hash:
+        return "modified"
+
+    entry = manifest.assets.get(rel, {})
+    src_hash = hash_file(src_path)
+    dest_hash = None
+    if entry.get("mtime") == dest_stat.st_mtime_ns:
+        dest_hash = entry.get("hash")
+    if dest_hash is None:
+        dest_hash = hash_file(dest_path)
+    if src_hash != dest_hash:
+        return "content changed"
+
+    os.utime(dest_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return None
+
+def sync_static(
+    source_dir: Path,
+    target_dir: Path,
+    manifest: BuildManifest,
+    use_hash: bool=False,
+    use_hardlinks: bool=False,
+    threads: int=ASSET_COPY_THREADS,
+    explain: bool=False,
+    fingerprint: bool=False
+) -> SyncStats:
+    '''
+    Makes the assets under `target_dir` match `source_dir`:
+        - only new or changed files are copied (see asset_stale_reason)
+        - files at least LARGE_FILE_SIZE bytes are copied on a thread pool
+        - with `use_hardlinks`, outputs are hardlinked to their sources when
+          both live on the same filesystem
+        - with `fingerprint`, each file is copied under a name containing its
+          content hash (see fingerprinted_name), & the copy of its previous
+          contents is removed; stylesheets are written with their references
+          to other assets rewritten, & hashed after rewriting (see
+          write_stylesheets)
+        - assets recorded in the manifest whose source is gone are removed
+        - with `explain`, each copy says why it was needed
+    '''
+    print("syncing files:")
+    print(f"source: {source_dir.parent.name}/{source_dir.name}")
+    print(f"dest: {target_dir.parent.name}/{target_dir.name}")
+
+    stats = SyncStats()
+
+    src_paths = list_files(source_dir, manifest.dirs, STATIC_PREFIX)
+    manifest.dirs.prune(STATIC_PREFIX)
+    copy_assets(src_paths, source_dir, target_dir, manifest, stats, use_hash, use_hardlinks, threads, explain, fingerprint)
+
+    seen = {src_path.relative_to(source_dir).as_posix() for src_path in src_paths}
+    remove_assets(sorted(set(manifest.assets) - seen), target_dir, manifest, stats)
+
+    return stats
+
+def update_assets(
+    changed_paths: list[Path],
+    source_dir: Path,
+    target_dir: Path,
+    manifest: BuildManifest,
+    use_hash: bool=False,
+    use_hardlinks: bool=False,
+    explain: bool=False,
+    fingerprint: bool=False
+) -> SyncStats:
+    '''
+    sync_static for just the given source paths (e.g. from a file watcher)
+    - a path that no longer exists removes its asset, or every asset below it
+      if it was a directory
+    '''
+    stats = SyncStats()
+
+    src_paths = [path for path in sorted(changed_paths) if path.is_file()]
+    copy_assets(
+        src_paths, source_dir, target_dir, manifest, stats, use_hash, use_hardlinks,
+        explain=explain, fingerprint=fingerprint
+    )
+
+    gone = set()
+    for path in changed_paths:
+        if path.exists():
+            continue
+        rel = path.relative_to(source_dir).as_posix()
+        gone.update(
+            asset_rel for asset_rel in manifest.assets
+            if asset_rel == rel or asset_rel.startswith(rel + "/")
+        )
+    remove_assets(sorted(gone), target_dir, manifest, stats)
+
+    return stats
+
+def copy_assets(
+    src_paths: list[Path],
+    source_dir: Path,
+    target_dir: Path,
+    manifest: BuildManifest,
+    stats: SyncStats,
+    use_hash: bool=False,
+    use_hardlinks: bool=False,
+    threads: int=ASSET_COPY_THREADS,
+    explain: bool=False,
+    fingerprint: bool=False
+) -> None:
+    target_dev = target_dir.stat().st_dev
+
+    large_copies = []
+    stylesheets  = []
+    for src_path in src_paths:
+        rel = src_path.relative_to(source_dir).as_posix()
+        if fingerprint and is_stylesheet(rel):
+            stylesheets.append(rel)
+            continue
+
+        file_hash = None
+        dest_rel  = rel
+        if fingerprint:
+            file_hash = asset_content_hash(src_path, manifest, rel)
+            dest_rel  = fingerprinted_name(rel, file_hash)
+        dest_path = target_dir / dest_rel
+        label     = rel if dest_rel == rel else f"{rel} as {dest_rel}"
+
+        reason = asset_stale_reason(src_path, dest_path, manifest, rel, use_hash)
+        if reason is None:
+            stats.unchanged += 1
+            record_copy(manifest, target_dir, rel, dest_rel, dest_path, stats, use_hash, file_hash)
+            continue
+        if explain:
+            print(f"{rel}: {reason}")
+
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if use_hardlinks and src_path.stat().st_dev == target_dev and hardlink(src_path, dest_path):
+            print(f"linking {label}")
+            stats.linked += 1
+            record_copy(manifest, target_dir, rel, dest_rel, dest_path, stats, use_hash, file_hash)
+            continue
+
+        size = src_path.stat().st_size
+        if size >= LARGE_FILE_SIZE and threads > 1:
+            large_copies.append((src_path, dest_path, rel, dest_rel, label, size, file_hash))
+            continue
+
+        print(f"copying {label}")
+        fast_copy(src_path, dest_path)
+        stats.copied += 1
+        stats.bytes_copied += size
+        record_copy(manifest, target_dir, rel, dest_rel, dest_path, stats, use_hash, file_hash)
+
+    if large_copies:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(fast_copy, copy[0], copy[1]) for copy in large_copies]
+            for future, (_, dest_path, rel, dest_rel, label, size, file_hash) in zip(futures, large_copies):
+                future.result()
+                print(f"copying {label}")
+                stats.copied += 1
+                stats.bytes_copied += size
+                record_copy(manifest, target_dir, rel, dest_rel, dest_path, stats, use_hash, file_hash)
+
+    if fingerprint:
+        write_stylesheets(stylesheets, source_dir, target_dir, manifest, stats, explain)
+
+    return
+
+def write_stylesheets(
+    rels: list[str],
+    source_dir: Path,
+    target_dir: Path,
+    manifest: BuildManifest,
+    stats: SyncStats,
+    explain: bool=False
+) -> None:
+    '''
+    writes the fingerprinted copies of the stylesheets static/`rels`, plus
+    every other stylesheet already in the manifest, with their references to
+    other assets rewritten (see rewrite_css_urls)
+    - a stylesheet's name hashes its rewritten contents, so it changes along
+      with the name of any asset it references; that's why they all get
+      looked at even when only an image changed
+    - a stylesheet @import-ing another is written after it
+    '''
+    pending = {rel for rel in manifest.assets if is_stylesheet(rel)}
+    pending.update(rels)
+    pending = {rel for rel in pending if (source_dir / rel).is_file()}
+
+    def fingerprinted(rel: str) -> str | None:
+        if rel in pending:
+            write(rel)
+        if rel not in manifest.assets or not (source_dir / rel).is_file():
+            return None
+
+        return manifest.asset_output(rel)
+
+    def write(rel: str) -> None:
+        # removing it first also stops an @import cycle
+        pending.discard(rel)
+
+        src_path = source_dir / rel
+        css  = src_path.read_bytes().decode("utf-8", "surrogateescape")
+        data = rewrite_css_urls(css, rel, fingerprinted).encode("utf-8", "surrogateescape")
+
+        file_hash = hash_bytes(data)
+        dest_rel  = fingerprinted_name(rel, file_hash)
+        dest_path = target_dir / dest_rel
+
+        # the name says what's in it
+        if dest_path.exists():
+            stats.unchanged += 1
+        else:
+            if explain:
+                print(f"{rel}: {'not in output yet' if rel not in manifest.assets else 'content changed'}")
+            print(f"writing {rel} as {dest_rel}")
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = dest_path.with_name(f".{dest_path.name}.tmp")
+            temp_path.write_bytes(data)
+            os.replace(temp_path, dest_path)
+            stats.copied += 1
+            stats.bytes_copied += len(data)
+
+        record_copy(manifest, target_dir, rel, dest_rel, dest_path, stats, file_hash=file_hash)
+
+        return
+
+    for rel in sorted(rels):
+        if rel in pending:
+            write(rel)
+    for rel in sorted(pending):
+        write(rel)
+
+    return
+
+def record_copy(
+    manifest: BuildManifest,
+    target_dir: Path,
+    rel: str,
+    dest_rel: str,
+    dest_path: Path,
+    stats: SyncStats,
+    use_hash: bool=False,
+    file_hash: str | None=None
+) -> None:
+    '''
+    records the asset static/`rel` as copied to `dest_rel`, removing the copy
+    it had under another name (an older fingerprint, or before/after
+    --fingerprint was turned on)
+    '''
+    if rel in manifest.assets:
+        old_rel = manifest.asset_output(rel)
+        if old_rel != dest_rel:
+            manifest.forget_asset(rel)
+            if remove_output(target_dir, old_rel, manifest):
+                stats.removed += 1
+
+    manifest.record_asset(rel, dest_path, use_hash, dest_rel, file_hash)
+
+    return
+
+def remove_assets(
+    rels: list[str],
+    target_dir: Path,
+    manifest: BuildManifest,
+    stats: SyncStats
+) -> None:
+    for rel in rels:
+        if remove_output(target_dir, manifest.asset_output(rel), manifest):
+            stats.removed += 1
+        manifest.forget_asset(rel)
+
+    return
+
+def remove_output(target_dir: Path, dest_rel: str, manifest: BuildManifest) -> bool:
+    '''
+    removes an asset's output, unless a page has taken over its path
+    '''
+    stale_path = target_dir / dest_rel
+    if dest_rel in manifest.pages or not stale_path.exists():
+        return False
+
+    print(f"removing stale {dest_rel}")
+    os.remove(stale_path)
+    remove_gzip_sibling(target_dir, dest_rel, manifest)
+    remove_empty_parents(stale_path.parent, target_dir)
+
+    return True
+
+#---[ Static Sync ]-------------------------------------------------------------
@@ -0,0 +1,76 @@
+#---[ Global Imports ]----------------------------------------------------------
+from   collections import OrderedDict
+from   collections.abc import Hashable
+
+#---[ Global Imports ]----------------------------------------------------------
+
+BLOCK_CACHE_SIZE = 4096
+
+
+class BlockCache:
+    '''
+    LRU map from a markdown block (plus the URL rewriter it was rendered with)
+    to its rendered HTML, so blocks repeated across pages (disclaimers, shared
+    code samples, ...) are classified, parsed, & rendered once per process.
+
+    - keys are hashed by Python's own str hash; the block text is already in
+      memory, so no separate digest is computed
+    - holds at most `max_entries` blocks, evicting the least recently used
+    '''
+    def __init__(self, max_entries: int=BLOCK_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Hashable, str] = OrderedDict()
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+        return
+
+    def get(self, key: Hashable) -> str | None:
+        html = self.entries.get(key)
+
+        if html is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return html
+
+    def put(self, key: Hashable, html: str) -> None:
+        if self.max_entries <= 0:
+            return
+
+        self.entries[key] = html
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+        return
+
+    def stats(self) -> tuple[int, int, int]:
+        return self.hits, self.misses, self.evictions
+
+    def add_stats(self, stats: tuple[int, int, int]) -> None:
+        '''
+        folds in counts from another process's cache (see main.render_pages)
+        '''
+        hits, misses, evictions = stats
+        self.hits      += hits
+        self.misses    += misses
+        self.evictions += evictions
+
+        return
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __str__(self) -> str:
+        lookups  = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate), {self.evictions} evicted"
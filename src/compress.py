@@ -0,0 +1,179 @@
+'''
+Precompressed .gz siblings of text outputs, for --gzip.
+
+Static servers that support it (nginx gzip_static, caddy precompressed, ...)
+send "page.html.gz" to clients accepting gzip instead of compressing
+"page.html" on every request.
+
+    - only outputs whose size or mtime changed since their .gz was made are
+      compressed again (recorded in the manifest)
+    - files are compressed on a thread pool; zlib releases the GIL while it
+      works, so the threads run in parallel
+    - a .gz that wouldn't be at least MIN_SAVING smaller, or whose source is
+      under MIN_SIZE bytes, isn't kept
+    - .gz files are deterministic (no timestamp or name in the header), so
+      the same output always compresses to the same bytes
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   concurrent.futures import ThreadPoolExecutor
+import gzip
+import os
+from   pathlib import Path
+import shutil
+
+from   assets   import gzip_path, list_files
+from   manifest import BuildManifest
+
+#---[ Global Imports ]----------------------------------------------------------
+
+COMPRESSIBLE_SUFFIXES = frozenset((
+    ".html", ".htm", ".css", ".js", ".mjs", ".json", ".svg", ".xml", ".txt", ".md", ".map",
+))
+
+GZIP_LEVEL       = 9
+GZIP_THREADS     = os.cpu_count() or 1
+MIN_SIZE         = 256
+MIN_SAVING       = 0.10
+
+COPY_CHUNK_SIZE  = 1 << 20
+
+
+class CompressStats:
+    def __init__(self) -> None:
+        self.compressed  = 0
+        self.unchanged   = 0
+        self.skipped     = 0
+        self.removed     = 0
+        self.bytes_in    = 0
+        self.bytes_saved = 0
+
+        return
+
+    def __str__(self) -> str:
+        return (
+            f"{self.compressed} compressed, {self.unchanged} unchanged, {self.skipped} not worth it, "
+            f"{self.removed} removed; .gz files save {self.bytes_saved:,} of {self.bytes_in:,} bytes"
+        )
+
+
+#---[ Compression ]-------------------------------------------------------------
+def is_compressible(path: Path) -> bool:
+    return path.suffix.lower() in COMPRESSIBLE_SUFFIXES and not path.name.startswith(".")
+
+def gzip_file(path: Path, level: int=GZIP_LEVEL) -> int | None:
+    '''
+    writes `path`.gz, returning its size, or removes it & returns None if
+    compressing `path` doesn't pay off
+    '''
+    dest_path = gzip_path(path)
+
+    size = path.stat().st_size
+    if size < MIN_SIZE:
+        dest_path.unlink(missing_ok=True)
+        return None
+
+    temp_path = dest_path.with_name(f".{dest_path.name}.tmp")
+    try:
+        with path.open("rb") as inFile, temp_path.open("wb") as outFile:
+            with gzip.GzipFile(filename="", mode="wb", compresslevel=level, fileobj=outFile, mtime=0) as gzFile:
+                shutil.copyfileobj(inFile, gzFile, COPY_CHUNK_SIZE)
+
+        gz_size = temp_path.stat().st_size
+        if gz_size > size * (1 - MIN_SAVING):
+            temp_path.unlink()
+            dest_path.unlink(missing_ok=True)
+            return None
+
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return gz_size
+
+def compress_outputs(
+    output_dir: Path,
+    manifest: BuildManifest,
+    threads: int=GZIP_THREADS,
+    level: int=GZIP_LEVEL
+) -> CompressStats:
+    '''
+    brings the .gz sibling of every compressible file under `output_dir` up
+    to date, and removes the siblings of outputs that are gone
+    '''
+    stats = CompressStats()
+
+    outputs = [path for path in list_files(output_dir) if is_compressible(path)]
+
+    seen = set()
+    work_list = []
+    for path in outputs:
+        rel = path.relative_to(output_dir).as_posix()
+        seen.add(rel)
+
+        stat  = path.stat()
+        entry = manifest.compressed.get(rel)
+        if (
+            entry
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+            and (entry["gzip_size"] is None or gzip_path(path).exists())
+        ):
+            stats.unchanged += 1
+            add_saving(stats, entry)
+            continue
+
+        work_list.append((path, rel, stat))
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        gz_sizes = executor.map(lambda job: gzip_file(job[0], level), work_list)
+
+        for (path, rel, stat), gz_size in zip(work_list, gz_sizes):
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "gzip_size": gz_size}
+            manifest.compressed[rel] = entry
+            manifest.changed = True
+
+            if gz_size is None:
+                stats.skipped += 1
+            else:
+                stats.compressed += 1
+            add_saving(stats, entry)
+
+    for rel in sorted(set(manifest.compressed) - seen):
+        stale_path = gzip_path(output_dir / rel)
+        if stale_path.exists():
+            os.remove(stale_path)
+            stats.removed += 1
+        del manifest.compressed[rel]
+        manifest.changed = True
+
+    return stats
+
+def remove_compressed(output_dir: Path, manifest: BuildManifest) -> int:
+    '''
+    removes the .gz siblings left by an earlier --gzip build, so a server
+    sending precompressed files doesn't keep serving their old contents,
+    returning how many there were
+    '''
+    removed = 0
+
+    for rel, entry in sorted(manifest.compressed.items()):
+        stale_path = gzip_path(output_dir / rel)
+        if entry["gzip_size"] is not None and stale_path.exists():
+            os.remove(stale_path)
+            removed += 1
+    if manifest.compressed:
+        manifest.compressed.clear()
+        manifest.changed = True
+
+    return removed
+
+def add_saving(stats: CompressStats, entry: dict) -> None:
+    stats.bytes_in += entry["size"]
+    if entry["gzip_size"] is not None:
+        stats.bytes_saved += entry["size"] - entry["gzip_size"]
+
+    return
+
+#---[ Compression ]-------------------------------------------------------------
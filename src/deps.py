@@ -0,0 +1,122 @@
+'''
+Dependency graph from build inputs to outputs.
+
+Every output (a page or an asset, keyed by its path relative to docs/) maps
+to the inputs it was built from & a fingerprint of each at build time:
+
+    "blog/tom/index.html": {
+        "content/blog/tom/index.md": "<sha256 of the markdown>",
+        "template.html":             "<template fingerprint>",
+        "@basepath":                 "/SSG/",
+    }
+
+With --fingerprint, pages also depend on "@assets", a hash of the asset map
+(static path -> fingerprinted name) their URLs were rewritten with.
+
+Input names are paths relative to the project root, except names starting
+with "@", which are build settings fingerprinted by their value (so reasons
+can show the old & new value). An output whose recorded fingerprints all
+match the current ones is up to date; otherwise stale_reasons() says why.
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Iterable
+
+#---[ Global Imports ]----------------------------------------------------------
+
+CONTENT_PREFIX  = "content/"
+STATIC_PREFIX   = "static/"
+TEMPLATE_INPUT  = "template.html"
+BASEPATH_INPUT  = "@basepath"
+ASSETS_INPUT    = "@assets"
+
+
+def page_inputs(
+    src_rel: str,
+    src_hash: str,
+    template_hash: str,
+    basepath: str,
+    assets_hash: str | None=None
+) -> dict[str, str]:
+    inputs = {
+        CONTENT_PREFIX + src_rel: src_hash,
+        TEMPLATE_INPUT:           template_hash,
+        BASEPATH_INPUT:           basepath,
+    }
+    if assets_hash is not None:
+        inputs[ASSETS_INPUT] = assets_hash
+
+    return inputs
+
+def asset_inputs(rel: str, fingerprint: str) -> dict[str, str]:
+    return {STATIC_PREFIX + rel: fingerprint}
+
+
+class DependencyGraph:
+    '''
+    output -> {input name -> fingerprint}
+    - `changed` says whether an edge was added, changed, or removed since it
+      was last cleared (by BuildManifest.save)
+    '''
+    def __init__(self, edges: dict[str, dict[str, str]] | None=None) -> None:
+        self.edges   = edges if edges is not None else {}
+        self.changed = False
+
+        return
+
+    def record(self, output: str, inputs: dict[str, str]) -> None:
+        if self.edges.get(output) != inputs:
+            self.edges[output] = dict(inputs)
+            self.changed = True
+
+        return
+
+    def forget(self, output: str) -> None:
+        if self.edges.pop(output, None) is not None:
+            self.changed = True
+
+        return
+
+    def inputs(self, output: str) -> dict[str, str]:
+        return self.edges.get(output, {})
+
+    def dependents(self, input_names: Iterable[str], below: bool=False) -> set[str]:
+        '''
+        outputs built from any of `input_names`
+        - with `below`, a name also matches every input under it as a
+          directory (e.g. "content/blog" matches "content/blog/tom/index.md")
+        '''
+        names = set(input_names)
+        prefixes = tuple(name.rstrip("/") + "/" for name in names) if below else ()
+
+        return {
+            output for output, inputs in self.edges.items()
+            if any(name in names or (prefixes and name.startswith(prefixes)) for name in inputs)
+        }
+
+    def stale_reasons(self, output: str, inputs: dict[str, str]) -> list[str]:
+        '''
+        why `output` needs rebuilding from `inputs`, or [] if it's up to date
+        '''
+        recorded = self.edges.get(output)
+        if recorded is None:
+            return ["never built"]
+
+        reasons = []
+        for name, fingerprint in inputs.items():
+            old = recorded.get(name)
+            if old is None:
+                reasons.append(f"new input {describe(name)}")
+            elif old != fingerprint:
+                if name.startswith("@"):
+                    reasons.append(f"{describe(name)} changed ({old!r} -> {fingerprint!r})")
+                else:
+                    reasons.append(f"{describe(name)} changed")
+
+        for name in sorted(recorded.keys() - inputs.keys()):
+            reasons.append(f"{describe(name)} no longer an input")
+
+        return reasons
+
+def describe(name: str) -> str:
+    return name[1:] if name.startswith("@") else name
@@ -1,40 +1,74 @@
+from   collections.abc import Callable, Mapping
+import sys
+from   types import MappingProxyType
+
+from   urls import URL_ATTRS
+
+# every node without props shares this one read-only mapping
+EMPTY_PROPS: Mapping[str, str] = MappingProxyType({})
+
 class HTMLNode:
+    # slotted: documents allocate a node per inline fragment, so no __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self,
         tag: str | None=None,
         value: str | None=None,
         children: list["HTMLNode"] | None=None,
-        props: dict[str, str] | None=None
+        props: Mapping[str, str] | None=None
     ) -> None:
-        self.tag      = tag
+        # the same handful of tag names repeat across every node
+        self.tag      = sys.intern(tag) if isinstance(tag, str) else tag
         self.value    = value
         self.children = children
-        self.props    = props
+        self.props    = props if props else EMPTY_PROPS
 
         return
 
-    def to_html(self) -> str:
+    def to_html(self, rewrite_url: Callable[[str], str] | None=None) -> str:
+        '''
+        renders the whole node as one string
+        - thin wrapper around render_into(): chunks are collected & joined once
+        '''
+        chunks = []
+        self.render_into(chunks.append, rewrite_url)
+
+        return "".join(chunks)
+
+    def render_into(self,
+        write: Callable[[str], object],
+        rewrite_url: Callable[[str], str] | None=None
+    ) -> None:
+        '''
+        emits the node's HTML as a series of chunks passed to `write`, e.g.
+        `list.append` or an open file's `write`, so nothing gets re-copied
+        no matter how deep or wide the tree is
+        '''
         # child classes must override this method to render as HTML
         raise NotImplementedError
 
-    def props_to_html(self) -> str:
+    def props_to_html(self, rewrite_url: Callable[[str], str] | None=None) -> str:
         '''
         this method generates the string for the props inside the opening tag
         - it even does the starting space for you!
+        - `rewrite_url` is applied to URL props (href, src) as they're rendered
         '''
         if not self.props: return ""
 
-        res = ""
+        res = []
         for attr, value in self.props.items():
-            res += f" {attr}=\"{value}\""
+            if rewrite_url and attr in URL_ATTRS:
+                value = rewrite_url(value)
+            res.append(f" {attr}=\"{value}\"")
 
-        return res
+        return "".join(res)
 
     def __repr__(self) -> str:
         res = "HTMLNode(\n"
         res += f"    tag: {self.tag}\n"
         res += f"    value: {self.value}\n"
         res += f"    children: {self.children}\n"
-        res += f"    props: {self.props}\n"
+        res += f"    props: {dict(self.props)}\n"
         res += ")"
 
         return res
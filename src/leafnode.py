@@ -1,43 +1,53 @@
+from collections.abc import Callable, Mapping
+
 from htmlnode import HTMLNode
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self,
         tag: str | None,
         value: str,
-        props: dict[str, str] | None=None
+        props: Mapping[str, str] | None=None
     ) -> None:
         super().__init__(tag=tag, value=value, props=props)
 
         return
 
-    def to_html(self) -> str:
+    def render_into(self,
+        write: Callable[[str], object],
+        rewrite_url: Callable[[str], str] | None=None
+    ) -> None:
         '''
-        generates the html string
+        writes the html string
         '''
         if self.value == None:
             raise ValueError("Error: All leaf nodes must have a value")
-        
+
         # case 1: no tag
         # 1. value
-        res = self.value
+        if not self.tag:
+            write(self.value)
 
-        # case 2: everything besides img
-        # 2. <tag>value</tag>
-        # 3. <tag props>value</tag>
-        if self.tag and self.tag != "img":
-            res = f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+        # case 2: img is self closing
+        # 2. <img props />
+        elif self.tag == "img":
+            write(f"<img{self.props_to_html(rewrite_url)} />")
 
-        # case 3: img is self closing
-        # 4. <img props />
-        if self.tag and self.tag == "img":
-            res = f"<img{self.props_to_html()} />"
+        # case 3: everything besides img
+        # 3. <tag>value</tag>
+        # 4. <tag props>value</tag>
+        else:
+            write(f"<{self.tag}{self.props_to_html(rewrite_url)}>")
+            write(self.value)
+            write(f"</{self.tag}>")
 
-        return res
+        return
 
     def __repr__(self) -> str:
         res = "LeafNode(\n"
         res += f"    tag:   {self.tag}\n"
         res += f"    value: {self.value}\n"
-        res += f"    props: {self.props}\n"
+        res += f"    props: {dict(self.props)}\n"
         return res + ")"
     
@@ -1,39 +1,432 @@
 #---[ Global Imports ]----------------------------------------------------------
+import argparse
+from   collections import deque
+from   collections.abc import Callable, Iterator
+from   concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import io
 import os
 import sys
 from   pathlib import Path
-import shutil
+import threading
+import time
+from   typing import TextIO
 
-from   utils   import extract_title, markdown_to_html_node
+from   utils    import render_markdown_into
+from   assets   import ASSET_MAP_NAME, list_files, remove_empty_parents, remove_gzip_sibling, sync_static, update_assets, write_asset_map
+from   blockcache import BLOCK_CACHE_SIZE, BlockCache
+from   compress import compress_outputs, remove_compressed
+from   deps     import BASEPATH_INPUT, CONTENT_PREFIX
+from   manifest import MANIFEST_NAME, BuildManifest, hash_bytes
+from   parsecache import PARSE_CACHE_DIR, PARSE_CACHE_SIZE, ParseCache
+from   profiler import NULL_PROFILER, TRACE_NAME, Profiler
+from   search   import SEARCH_DIR, PageTerms, remove_search_index, update_search_index
+from   source   import MarkdownSource, read_page
+from   shard    import SHARD_DIR, MergeError, ShardMerge, ShardSpec
+from   serve    import ReloadBroker, Resource, SiteServer, SiteStore, inject_reload_script_into
+from   template import BUILD_NAMES, PAGE_NAMES, Template, TemplateError, load_template
+from   urls     import UrlRewriter
+from   walker   import DirListings, PathFilter, walk_files
+from   watch    import DEBOUNCE, make_watcher, wait_for_changes
+from   writer   import WriteResult, WriteStats, write_if_changed
 
 #---[ Global Imports ]----------------------------------------------------------
 
+COPY_TEXT_CHUNK_SIZE = 1 << 16
 
-#---[ Main Function ]-----------------------------------------------------------
-def main():
-    basepath = "/"
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
+# pages this big or bigger are streamed by generate_page, even when pipelined
+PIPELINE_MAX_BYTES = 4 << 20
 
-    # remove_public_dir_files()
 
-    static_dir = get_project_dir("static")
-    docs_dir = get_project_dir("docs")
-    
-    remove_files(docs_dir)
+#---[ Main Function ]-----------------------------------------------------------
+def main(argv: list[str] | None=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        serve_site(parse_serve_args(argv[1:]))
+        return
+    if argv[:1] == ["merge"]:
+        merge_site(parse_merge_args(argv[1:]))
+        return
 
-    copy_files(static_dir, docs_dir)
+    args = parse_args(argv)
+    basepath = args.basepath
 
+    # remove_public_dir_files()
+
+    static_dir   = get_project_dir("static")
+    docs_dir     = output_dir(args)
     content_dir  = get_project_dir("content")
     template_dir = get_project_dir(".") / "template.html"
 
+    profiler = Profiler() if args.profile else NULL_PROFILER
+    cache    = BlockCache(args.block_cache) if args.block_cache > 0 else None
+
+    parse_cache = None
+    if args.parse_cache > 0:
+        parse_cache = ParseCache(get_project_dir(PARSE_CACHE_DIR), args.parse_cache << 20)
+
+    # a broken template fails the build before the output is touched
+    try:
+        with profiler.span("load_template"):
+            page_template = load_page_template(template_dir, args.var)
+    except TemplateError as e:
+        sys.exit(f"{template_dir}: {e}")
+
+    if not args.incremental:
+        with profiler.span("clean"):
+            remove_files(docs_dir)
+
+    manifest = BuildManifest.load(docs_dir / MANIFEST_NAME)
+
+    with profiler.span("sync_static"):
+        sync_stats = sync_static(
+            static_dir, docs_dir, manifest,
+            use_hash=args.hash_assets,
+            use_hardlinks=args.hardlink,
+            explain=args.explain,
+            fingerprint=args.fingerprint
+        )
+    print(sync_stats)
+
+    asset_map = None
+    if args.fingerprint:
+        asset_map = manifest.asset_map()
+        write_asset_map(docs_dir, asset_map)
+    else:
+        (docs_dir / ASSET_MAP_NAME).unlink(missing_ok=True)
+        remove_gzip_sibling(docs_dir, ASSET_MAP_NAME, manifest)
+
+    with profiler.span("compile_template"):
+        template = bind_page_template(page_template, basepath, args.var, asset_map)
+
     print("")
-    generate_pages_recursively(content_dir, template_dir, docs_dir, basepath)
+    search_terms = {} if args.search else None
+    with profiler.span("pages"):
+        generate_pages_incrementally(
+            content_dir, template, docs_dir, basepath, manifest, args.jobs, profiler, cache, parse_cache,
+            args.explain, args.io_threads, page_filter(args), args.shard, search_terms
+        )
+    manifest.shard = [args.shard.index, args.shard.count] if args.shard else None
+
+    if args.search:
+        with profiler.span("search_index"):
+            build_search_index(content_dir, docs_dir, manifest, basepath, search_terms)
+    else:
+        remove_search_index(docs_dir)
+
+    if args.gzip:
+        with profiler.span("gzip"):
+            print(f"gzip: {compress_outputs(docs_dir, manifest)}")
+    else:
+        remove_compressed(docs_dir, manifest)
+
+    with profiler.span("save_manifest"):
+        manifest.save()
+
+    if parse_cache is not None:
+        with profiler.span("prune_parse_cache"):
+            parse_cache.prune()
+
+    if profiler.enabled:
+        print("")
+        print(profiler.report(args.profile_top))
+        profiler.write_trace(args.profile)
+        print(f"\ntrace written to {args.profile} (open in chrome://tracing or ui.perfetto.dev)")
+
+    if args.watch:
+        watch_and_rebuild(
+            content_dir, static_dir, template_dir, docs_dir, template, manifest, args, cache, parse_cache
+        )
 
     return
 
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Converts the markdown files under content/ into HTML pages under docs/"
+    )
+    parser.add_argument(
+        "basepath", nargs="?", default="/",
+        help="URL prefix the site is served under (default: /)"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="keep docs/ and only regenerate pages whose inputs changed since the last build"
+    )
+    parser.add_argument(
+        "--hash-assets", action="store_true",
+        help="compare static files by content hash when their mtime changed but their size didn't"
+    )
+    parser.add_argument(
+        "--hardlink", action="store_true",
+        help="hardlink static files into docs/ instead of copying when both are on the same filesystem"
+    )
+    parser.add_argument(
+        "--fingerprint", action="store_true",
+        help="copy static files under names containing their content hash (index.3f2a9c1b.css), point page & template URLs at them, and write the mapping to docs/asset-manifest.json"
+    )
+    parser.add_argument(
+        "--explain", action="store_true",
+        help="print why each page or static file was rebuilt"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, metavar="N",
+        help="render pages in N worker processes (0 = one per CPU core)"
+    )
+    parser.add_argument(
+        "--io-threads", type=int, default=0, metavar="N",
+        help="without --jobs, read & write pages on N threads while rendering; pays off when file access is slow, e.g. on NFS (default: 0, off)"
+    )
+    parser.add_argument(
+        "--block-cache", type=int, default=BLOCK_CACHE_SIZE, metavar="N",
+        help=f"remember the HTML of up to N recently rendered blocks, so blocks repeated across pages render once (0 = off, default: {BLOCK_CACHE_SIZE})"
+    )
+    parser.add_argument(
+        "--parse-cache", type=int, default=PARSE_CACHE_SIZE >> 20, metavar="MB",
+        help=f"keep up to MB megabytes of rendered page bodies in {PARSE_CACHE_DIR}/, so pages whose markdown didn't change skip parsing (0 = off, default: {PARSE_CACHE_SIZE >> 20})"
+    )
+    parser.add_argument(
+        "--gzip", action="store_true",
+        help="also write a .gz copy of each HTML, CSS & other text output that compresses well, for servers that send precompressed files"
+    )
+    parser.add_argument(
+        "--search", action="store_true",
+        help=f"build an inverted search index of the pages in docs/{SEARCH_DIR}/, sharded by term prefix & updated only for changed pages"
+    )
+    parser.add_argument(
+        "--var", action="append", default=[], metavar="NAME=VALUE",
+        help="fill the template placeholder {{ NAME }} with VALUE on every page"
+    )
+    parser.add_argument(
+        "--output", type=Path, metavar="DIR",
+        help="write the site to DIR instead of docs/ (cleared first unless --incremental, so it must be empty or an earlier build)"
+    )
+    parser.add_argument(
+        "--shard", type=parse_shard, metavar="I/N",
+        help=f"build only shard I of N of the pages, into {SHARD_DIR}/I-of-N/ (or --output); combine the shards with `main.py merge`"
+    )
+    parser.add_argument(
+        "--include", action="append", default=[], metavar="GLOB",
+        help="only treat markdown files matching GLOB (relative to content/, e.g. 'blog/**') as pages; may be repeated"
+    )
+    parser.add_argument(
+        "--exclude", action="append", default=[], metavar="GLOB",
+        help="skip markdown files & directories matching GLOB (e.g. 'drafts', '**/_*.md'); may be repeated"
+    )
+
+    parser.add_argument(
+        "--profile", nargs="?", type=Path, const=Path(TRACE_NAME), metavar="TRACE",
+        help=f"time each build stage & page, print a report, and write a Chrome trace to TRACE (default: {TRACE_NAME})"
+    )
+    parser.add_argument(
+        "--profile-top", type=int, default=10, metavar="N",
+        help="with --profile, list the N slowest pages (default: 10)"
+    )
+
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="after building, keep watching content/, static/ & template.html and rebuild what changes"
+    )
+    parser.add_argument(
+        "--poll", action="store_true",
+        help="with --watch, poll for changes instead of using inotify"
+    )
+    parser.add_argument(
+        "--debounce", type=float, default=DEBOUNCE, metavar="SECONDS",
+        help=f"with --watch, wait until no changes arrive for this long before rebuilding (default: {DEBOUNCE})"
+    )
+
+    args = parser.parse_args(argv)
+    args.var = parse_site_vars(parser, args.var)
+
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.io_threads < 0:
+        parser.error("--io-threads must be 0 or a positive number")
+    if args.block_cache < 0:
+        parser.error("--block-cache must be 0 or a positive number")
+    if args.parse_cache < 0:
+        parser.error("--parse-cache must be 0 or a positive number")
+    if args.shard is not None:
+        if args.watch:
+            parser.error("--watch cannot be combined with --shard")
+        for option in ("search", "gzip"):
+            if getattr(args, option):
+                parser.error(f"--{option} can't be used with --shard (pass --{option} to merge instead)")
+    check_output_dir(parser, args.output)
+
+    return args
+
+def parse_shard(text: str) -> ShardSpec:
+    try:
+        return ShardSpec.parse(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+def check_output_dir(parser: argparse.ArgumentParser, output: Path | None) -> None:
+    '''
+    the output directory is emptied before a build, so it mustn't be (or
+    hold) the project's sources, & if it already holds anything, that has to
+    be an earlier build (it has a build manifest)
+    '''
+    if output is None:
+        return
+
+    output = output.resolve()
+    project_dir = Path(__file__).parent.parent.resolve()
+    if output == project_dir or output in project_dir.parents:
+        parser.error(f"--output {output} would overwrite the project")
+    for name in ("src", "content", "static"):
+        if output == project_dir / name or project_dir / name in output.parents:
+            parser.error(f"--output {output} is inside {name}/")
+    if output.is_dir() and not (output / MANIFEST_NAME).exists() and any(output.iterdir()):
+        parser.error(f"--output {output} is not empty & holds no earlier build ({MANIFEST_NAME})")
+
+    return
+
+def output_dir(args: argparse.Namespace) -> Path:
+    if args.output is not None:
+        args.output.mkdir(parents=True, exist_ok=True)
+        return args.output
+    if args.shard is not None:
+        shard_dir = get_project_dir(SHARD_DIR) / args.shard.name
+        shard_dir.mkdir(exist_ok=True)
+        return shard_dir
+
+    return get_project_dir("docs")
+
+def parse_serve_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="main.py serve",
+        description="Serves the site from memory, re-rendering pages as content/, static/ & template.html change"
+    )
+    parser.add_argument(
+        "basepath", nargs="?", default="/",
+        help="URL prefix the site is served under (default: /)"
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1",
+        help="address to listen on (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=8888,
+        help="port to listen on (default: 8888)"
+    )
+    parser.add_argument(
+        "--block-cache", type=int, default=BLOCK_CACHE_SIZE, metavar="N",
+        help=f"remember the HTML of up to N recently rendered blocks (0 = off, default: {BLOCK_CACHE_SIZE})"
+    )
+    parser.add_argument(
+        "--var", action="append", default=[], metavar="NAME=VALUE",
+        help="fill the template placeholder {{ NAME }} with VALUE on every page"
+    )
+    parser.add_argument(
+        "--include", action="append", default=[], metavar="GLOB",
+        help="only treat markdown files matching GLOB (relative to content/, e.g. 'blog/**') as pages; may be repeated"
+    )
+    parser.add_argument(
+        "--exclude", action="append", default=[], metavar="GLOB",
+        help="skip markdown files & directories matching GLOB (e.g. 'drafts', '**/_*.md'); may be repeated"
+    )
+    parser.add_argument(
+        "--poll", action="store_true",
+        help="poll for changes instead of using inotify"
+    )
+    parser.add_argument(
+        "--debounce", type=float, default=DEBOUNCE, metavar="SECONDS",
+        help=f"wait until no changes arrive for this long before re-rendering (default: {DEBOUNCE})"
+    )
+    parser.add_argument(
+        "--quiet", action="store_true",
+        help="don't log each request"
+    )
+
+    args = parser.parse_args(argv)
+    args.var = parse_site_vars(parser, args.var)
+
+    if args.block_cache < 0:
+        parser.error("--block-cache must be 0 or a positive number")
+
+    return args
+
+def page_filter(args: argparse.Namespace) -> PathFilter | None:
+    return PathFilter(args.include, args.exclude) or None
+
+def parse_site_vars(parser: argparse.ArgumentParser, assignments: list[str]) -> dict[str, str]:
+    site_vars = {}
+
+    for assignment in assignments:
+        name, sep, value = assignment.partition("=")
+        if not sep or not name:
+            parser.error(f"--var expects NAME=VALUE, got {assignment!r}")
+        if name in PAGE_NAMES or name in BUILD_NAMES:
+            parser.error(f"--var cannot override the built-in placeholder {name!r}")
+        site_vars[name] = value
+
+    return site_vars
+
+def compile_page_template(
+    template_path: Path,
+    basepath: str,
+    site_vars: dict[str, str],
+    asset_map: dict[str, str] | None=None
+) -> Template:
+    '''
+    compiled once per build, with the per-build values already filled in
+    - with `asset_map`, URLs of static files point at their fingerprinted
+      copies, in the template & in every page rendered into it
+    '''
+    return bind_page_template(load_page_template(template_path, site_vars), basepath, site_vars, asset_map)
+
+def load_page_template(template_path: Path, site_vars: dict[str, str]) -> Template:
+    '''
+    compile_page_template's first half: reads & checks the template, before
+    the basepath & asset names are known to be final
+    '''
+    known_names = set(PAGE_NAMES) | set(BUILD_NAMES) | set(site_vars)
+
+    return load_template(template_path, known_names)
+
+def bind_page_template(
+    template: Template,
+    basepath: str,
+    site_vars: dict[str, str],
+    asset_map: dict[str, str] | None=None
+) -> Template:
+    '''
+    compile_page_template's second half: rewrites the template's URLs & fills
+    in the per-build values
+    '''
+    build_context = {"Basepath": basepath, **site_vars}
+
+    return template.with_url_rewriter(UrlRewriter(basepath, asset_map)).partial(build_context)
+
+def page_url_rewriter(template: Template, basepath: str) -> UrlRewriter:
+    '''
+    pages rewrite URLs the same way as the template they're rendered into
+    '''
+    if template.url_rewriter is not None:
+        return template.url_rewriter
+
+    return UrlRewriter(basepath)
+
 #---[ Main Function ]-----------------------------------------------------------
 
+class PageBuildError(Exception):
+    '''
+    raised when generating a page fails, naming the source file responsible
+    '''
+    def __init__(self, src_path: Path, message: str) -> None:
+        super().__init__(src_path, message)
+        self.src_path = src_path
+        self.message  = message
+
+        return
+
+    def __str__(self) -> str:
+        return f"{self.src_path}: {self.message}"
+
 def get_project_dir(subdir: str) -> Path:
     script_dir = Path(__file__).parent.resolve()
     target_dir = script_dir.parent.resolve() / subdir 
@@ -52,86 +445,1081 @@ def remove_files(directory: Path) -> None:
 
     return
 
-def copy_files(source_dir: Path, target_dir: Path) -> None:
-    print("copying files:")
-    print(f"source: {source_dir.parent.name}/{source_dir.name}")
-    print(f"dest: {target_dir.parent.name}/{target_dir.name}")
-    for file in source_dir.iterdir():
-        if file.is_dir():
-            new_directory = target_dir / f"{file.name}"
-            print(f"creating directory {new_directory.parent.name}/{new_directory.name}")
-            os.mkdir(new_directory)
-            copy_files(file, new_directory)
-        else:
-            print(f"copying {file.name}")
-            shutil.copy(file, target_dir / f"{file.name}")
-
-    return
+def page_message(src_path: Path, template: Template, dest_path: Path) -> str:
+    template_path = template.path or Path("template.html")
 
-def generate_page(src_path: Path, template_path: Path, dest_path: Path, basepath: str) -> bool:
     short_src_path      = f"{src_path.parent.parent.name}/{src_path.parent.name}/{src_path.name}"
     short_template_path = f"{template_path.parent.parent.name}/{template_path.parent.name}/{template_path.name}"
     short_dest_path     = f"{dest_path.parent.parent.name}/{dest_path.parent.name}/{dest_path.name}"
-    message = f"Generating page from {short_src_path} to {short_dest_path} using {short_template_path}"
 
-    print(message)
+    return f"Generating page from {short_src_path} to {short_dest_path} using {short_template_path}"
+
+def generate_page(
+    src_path: Path,
+    template: Template,
+    dest_path: Path,
+    basepath: str,
+    verbose: bool=True,
+    profiler: Profiler=NULL_PROFILER,
+    cache: BlockCache | None=None,
+    parse_cache: ParseCache | None=None,
+    previous: list | None=None,
+    terms: PageTerms | None=None
+) -> WriteResult | None:
+    '''
+    renders one page into `dest_path` (see write_page), returning what was
+    written, or None for an empty page
+    - `previous` is the output's [size, mtime, hash] recorded in the manifest
+    - `terms` is filled with the page's search terms as it renders (left
+      untouched on a parse cache hit)
+    '''
+    if verbose:
+        print(page_message(src_path, template, dest_path))
+
+    # page URLs are rewritten as the tree renders; the template's own URLs were
+    # already rewritten when it was compiled
+    url_rewriter = page_url_rewriter(template, basepath)
+    rewrite_url = None if url_rewriter.is_identity else url_rewriter
+
+    block_profiler = profiler if profiler.enabled else None
+
+    with profiler.span("page", src_path), MarkdownSource(src_path) as source:
+        key = None
+        if parse_cache is not None:
+            key = parse_cache.key(source.hash(), url_rewriter.key)
+
+            entry_path = parse_cache.get(key)
+            if entry_path is not None:
+                with profiler.span("parse_cache_hit"), entry_path.open("r") as entryFile:
+                    title = entryFile.readline().rstrip("\n")
+                    return write_page(
+                        dest_path, template, title, lambda write: copy_text(entryFile, write), previous
+                    )
 
-    markdown = ""
-    with src_path.open("r") as inFile:
-        markdown = inFile.read()
+        with source.lines() as inFile:
+            page = read_page(inFile)
+            if page is None:
+                return None
 
-        if markdown == "":
-            return False
+            # blocks are read, rendered, & written one at a time, straight into
+            # the output file, so big pages never sit in memory whole (and big
+            # sources are read off a memory map, see source.py)
+            title, _, lines = page
 
-    template = ""
-    with template_path.open('r') as inFile:
-        template = inFile.read()
+            on_node = None
+            if terms is not None:
+                terms.title = title
+                on_node = terms.add_node
 
-        if template == "":
-            return False
+            def content(write: Callable[[str], object]) -> None:
+                render_markdown_into(lines, write, rewrite_url, block_profiler, cache, on_node)
 
-    root_node = markdown_to_html_node(markdown)
+                return
 
-    content = root_node.to_html()
-    title = extract_title(markdown)
+            if key is None:
+                return write_page(dest_path, template, title, content, previous)
 
-    html_str = template.replace("{{ Title }}", title)
-    html_str = html_str.replace("{{ Content }}", content)
+            # the body is copied into the parse cache as it's written
+            with parse_cache.store(key, title) as entryFile:
+                return write_page(
+                    dest_path, template, title,
+                    lambda write: content(tee(write, entryFile.write)),
+                    previous
+                )
 
-    match_str = "href=\"/"
-    sub_str = "href=\"{basepath}"
-    while html_str.find(match_str) != -1:
-        html_str = html_str.replace(match_str, sub_str)
+def write_page(
+    dest_path: Path,
+    template: Template,
+    title: str,
+    content: str | Callable[[Callable[[str], object]], None],
+    previous: list | None=None
+) -> WriteResult:
+    '''
+    renders the page into a temp file & replaces `dest_path` with it only if
+    the bytes changed (see writer.write_if_changed); a failed render leaves
+    the previous page in place
+    '''
+    return write_if_changed(
+        dest_path,
+        lambda write: template.render_into(write, {"Title": title, "Content": content}),
+        previous
+    )
 
-    match_str = "src=\"/"
-    sub_str = "src=\"{basepath}"
-    while html_str.find(match_str) != -1:
-        html_str = html_str.replace(match_str, sub_str)
+def copy_text(inFile: TextIO, write: Callable[[str], object]) -> None:
+    while chunk := inFile.read(COPY_TEXT_CHUNK_SIZE):
+        write(chunk)
 
-    match_str = "{basepath}"
-    sub_str = f"{basepath}"
-    while html_str.find(match_str) != -1:
-        html_str = html_str.replace(match_str, sub_str)
+    return
+
+def tee(*writes: Callable[[str], object]) -> Callable[[str], None]:
+    def write_all(chunk: str) -> None:
+        for write in writes:
+            write(chunk)
+
+        return
+
+    return write_all
 
-    with dest_path.open('w') as outFile:
-        outFile.write(html_str)
+def iter_pages(
+    content_path: Path,
+    dest_path: Path,
+    path_filter: PathFilter | None=None,
+    listings: DirListings | None=None
+) -> Iterator[tuple[Path, Path]]:
+    '''
+    walks the content tree & pairs every markdown file with its output path,
+    as the walk finds them
+    - `path_filter` picks which files count as pages (see --include/--exclude)
+    - output directories are not created here
+    '''
+    # files come grouped by directory, so each output directory is joined once
+    last_dir, dest_dir = None, dest_path
+
+    for path, rel in walk_files(content_path, path_filter, listings, CONTENT_PREFIX):
+        if rel.endswith(".md"):
+            rel_dir, _, name = rel.rpartition("/")
+            if rel_dir != last_dir:
+                last_dir, dest_dir = rel_dir, dest_path / rel_dir
+            yield path, dest_dir / name.replace(".md", ".html")
+
+    return
 
-    return True
+def collect_pages(
+    content_path: Path,
+    dest_path: Path,
+    path_filter: PathFilter | None=None,
+    listings: DirListings | None=None
+) -> list[tuple[Path, Path]]:
+    return list(iter_pages(content_path, dest_path, path_filter, listings))
 
-def generate_pages_recursively(content_path: Path, template_path: Path, dest_path: Path, basepath: str) -> None:
-    for path in content_path.iterdir():
-        if path.is_dir():
-            new_dest = dest_path / path.name
-            if not new_dest.exists():
-                new_dest.mkdir()
+# each worker process's own block cache, set up by _init_page_worker
+_worker_cache: BlockCache | None = None
 
-            generate_pages_recursively(path, template_path, new_dest, basepath)
-        elif path.name.endswith(".md"):
-            file_dest_path = dest_path / str(path.name).replace(".md", ".html")
-            generate_page(path, template_path, file_dest_path, basepath)
+def _init_page_worker(cache_size: int) -> None:
+    global _worker_cache
+    _worker_cache = BlockCache(cache_size) if cache_size > 0 else None
 
     return
 
+def _generate_page_job(
+    job: tuple[Path, Template, Path, str, bool, ParseCache | None, list | None, bool]
+) -> tuple[
+    WriteResult | None, str | None, dict | None, tuple[int, ...] | None, tuple[int, ...] | None, PageTerms | None
+]:
+    '''
+    process pool entry point: returns
+        (write_result, error, profile, block_cache_stats, parse_cache_stats, terms)
+    instead of raising so the parent can attribute the failure to the page
+    that caused it
+    - profile is the worker's Profiler.export() when profiling, else None
+    - the cache stats are this page's share of each cache's stats(), or None
+      for a cache that's off
+    - terms are the page's search terms when the job asked for them
+    '''
+    src_path, template, dest_path, basepath, profile, parse_cache, previous, collect_terms = job
+
+    profiler = Profiler() if profile else NULL_PROFILER
+
+    # jobs pickled in the same chunk share one unpickled ParseCache, & the
+    # block cache lives for the whole worker, so count this page's lookups as
+    # differences
+    block_before = _worker_cache.stats() if _worker_cache is not None else None
+    parse_before = parse_cache.stats() if parse_cache is not None else None
+
+    terms = PageTerms() if collect_terms else None
+
+    try:
+        result = generate_page(
+            src_path, template, dest_path, basepath,
+            verbose=False, profiler=profiler, cache=_worker_cache, parse_cache=parse_cache, previous=previous,
+            terms=terms
+        )
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", None, None, None, None
+
+    block_stats = None
+    if _worker_cache is not None:
+        block_stats = tuple(after - start for after, start in zip(_worker_cache.stats(), block_before))
+
+    parse_stats = None
+    if parse_cache is not None:
+        parse_stats = tuple(after - start for after, start in zip(parse_cache.stats(), parse_before))
+
+    return result, None, profiler.export() if profile else None, block_stats, parse_stats, terms
+
+def render_pages(
+    work_list: list[tuple[Path, Path]],
+    template: Template,
+    basepath: str,
+    jobs: int=1,
+    profiler: Profiler=NULL_PROFILER,
+    cache: BlockCache | None=None,
+    parse_cache: ParseCache | None=None,
+    io_threads: int=0,
+    previous: list[list | None] | None=None,
+    terms: list[PageTerms | None] | None=None
+) -> list[WriteResult | None]:
+    '''
+    generates every (src, dest) page in `work_list`, returning each one's
+    WriteResult (None for an empty page), in work list order
+    - `previous` holds each output's recorded [size, mtime, hash] (or None),
+      so unchanged pages can be recognised without reading them
+    - `terms`, if given, gets each page's search terms appended, collected as
+      it renders (see search.PageTerms)
+    - with jobs > 1 pages are rendered in a process pool; output & messages are
+      still reported in work list order so builds stay deterministic
+    - with jobs <= 1 & io_threads > 0, file reads & writes overlap with
+      rendering (see render_pages_pipelined)
+    - raises PageBuildError for the first failing page (after the rest finish)
+    '''
+    if previous is None:
+        previous = [None] * len(work_list)
+
+    if jobs <= 1 and io_threads > 0 and len(work_list) > 1:
+        return render_pages_pipelined(
+            work_list, template, basepath, io_threads, profiler, cache, parse_cache, previous, terms
+        )
+
+    if jobs <= 1 or len(work_list) <= 1:
+        results = []
+        for (src_path, dest_path), recorded in zip(work_list, previous):
+            collected = PageTerms() if terms is not None else None
+            try:
+                results.append(generate_page(
+                    src_path, template, dest_path, basepath,
+                    profiler=profiler, cache=cache, parse_cache=parse_cache, previous=recorded, terms=collected
+                ))
+            except Exception as e:
+                raise PageBuildError(src_path, f"{type(e).__name__}: {e}") from e
+            if terms is not None:
+                terms.append(collected)
+
+        return results
+
+    job_list  = [
+        (src_path, template, dest_path, basepath, profiler.enabled, parse_cache, recorded, terms is not None)
+        for (src_path, dest_path), recorded in zip(work_list, previous)
+    ]
+    chunksize = max(1, len(job_list) // (jobs * 4))
+
+    results = []
+    errors  = []
+    cache_size = cache.max_entries if cache is not None else 0
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_page_worker, initargs=(cache_size,)
+    ) as executor:
+        for (src_path, dest_path), (result, error, profile, block_stats, parse_stats, collected) in zip(
+            work_list, executor.map(_generate_page_job, job_list, chunksize=chunksize)
+        ):
+            if terms is not None:
+                terms.append(collected)
+            if profile:
+                profiler.merge(profile)
+            if block_stats and cache is not None:
+                cache.add_stats(block_stats)
+            if parse_stats and parse_cache is not None:
+                parse_cache.add_stats(parse_stats)
+            if error:
+                print(f"Error generating page from {src_path}: {error}")
+                errors.append(PageBuildError(src_path, error))
+            else:
+                print(page_message(src_path, template, dest_path))
+            results.append(result)
+
+    if errors:
+        raise errors[0]
+
+    return results
+
+#---[ Pipelined Rendering ]-----------------------------------------------------
+class PageSource:
+    '''
+    what the read stage hands the render stage for one page:
+        - data:  the markdown file's bytes, or None if the page is too big to
+                 read whole (or came from the parse cache)
+        - key:   its parse cache key, when the cache is on
+        - entry: (title, body HTML) on a parse cache hit
+    '''
+    def __init__(self,
+        data: bytes | None=None,
+        key: str | None=None,
+        entry: tuple[str, str] | None=None
+    ) -> None:
+        self.data  = data
+        self.key   = key
+        self.entry = entry
+
+        return
+
+def read_page_source(src_path: Path, url_rewriter: UrlRewriter, parse_cache: ParseCache | None=None) -> PageSource:
+    '''
+    read stage, run on an I/O thread
+    '''
+    if src_path.stat().st_size >= PIPELINE_MAX_BYTES:
+        return PageSource()
+
+    data = src_path.read_bytes()
+
+    key = None
+    if parse_cache is not None:
+        key = parse_cache.key(hash_bytes(data), url_rewriter.key)
+
+        entry_path = parse_cache.find(key)
+        if entry_path is not None:
+            with entry_path.open("r") as entryFile:
+                title = entryFile.readline().rstrip("\n")
+                return PageSource(key=key, entry=(title, entryFile.read()))
+
+    # decoded by the render stage, a buffer at a time
+    return PageSource(data, key)
+
+def render_page_source(
+    source: PageSource,
+    url_rewriter: UrlRewriter,
+    profiler: Profiler=NULL_PROFILER,
+    cache: BlockCache | None=None,
+    terms: PageTerms | None=None
+) -> tuple[str, str] | None:
+    '''
+    render stage, run on the main thread: returns (title, body HTML), or None
+    for an empty page
+    - `terms` is filled as in generate_page
+    '''
+    if source.entry is not None:
+        return source.entry
+
+    # decoded exactly as src_path.open("r") would; BytesIO shares the bytes
+    page = read_page(io.TextIOWrapper(io.BytesIO(source.data)))
+    if page is None:
+        return None
+
+    title, _, lines = page
+    rewrite_url = None if url_rewriter.is_identity else url_rewriter
+
+    on_node = None
+    if terms is not None:
+        terms.title = title
+        on_node = terms.add_node
+
+    chunks = []
+    render_markdown_into(
+        lines, chunks.append, rewrite_url, profiler if profiler.enabled else None, cache, on_node
+    )
+
+    return title, "".join(chunks)
+
+def write_page_output(
+    dest_path: Path,
+    template: Template,
+    title: str,
+    body: str,
+    parse_cache: ParseCache | None=None,
+    key: str | None=None,
+    previous: list | None=None
+) -> WriteResult:
+    '''
+    write stage, run on an I/O thread; with `parse_cache`, the body is also
+    stored under `key`
+    '''
+    result = write_page(dest_path, template, title, body, previous)
+
+    if parse_cache is not None and key is not None:
+        with parse_cache.store(key, title) as entryFile:
+            entryFile.write(body)
+
+    return result
+
+def render_pages_pipelined(
+    work_list: list[tuple[Path, Path]],
+    template: Template,
+    basepath: str,
+    io_threads: int,
+    profiler: Profiler=NULL_PROFILER,
+    cache: BlockCache | None=None,
+    parse_cache: ParseCache | None=None,
+    previous: list[list | None] | None=None,
+    terms: list[PageTerms | None] | None=None
+) -> list[WriteResult | None]:
+    '''
+    render_pages in one process, with file I/O overlapped with rendering:
+        - sources are read up to `window` pages ahead on an I/O thread pool
+        - pages are parsed & rendered on this thread, in work list order
+        - rendered pages are written out on the same pool, with at most
+          `window` writes pending
+    so at most about 2 * `window` pages are in memory at once. Pages of
+    PIPELINE_MAX_BYTES or more are streamed by generate_page instead.
+
+    Only this thread touches the profiler & caches' counters; the read_wait &
+    write_wait stages show how long it sat waiting on I/O.
+    '''
+    window = io_threads * 2
+    url_rewriter = page_url_rewriter(template, basepath)
+
+    if previous is None:
+        previous = [None] * len(work_list)
+
+    results = []
+    reads: deque[tuple[Path, Path, list | None, Future]] = deque()
+    writes: deque[tuple[Path, int, Future]]              = deque()
+    upcoming = zip(work_list, previous)
+
+    def finish_write() -> None:
+        src_path, index, write = writes.popleft()
+        with profiler.span("write_wait"):
+            try:
+                results[index] = write.result()
+            except Exception as e:
+                raise PageBuildError(src_path, f"{type(e).__name__}: {e}") from e
+
+        return
+
+    with ThreadPoolExecutor(max_workers=io_threads) as executor:
+        def fill_reads() -> None:
+            while len(reads) < window:
+                page = next(upcoming, None)
+                if page is None:
+                    break
+                (src_path, dest_path), recorded = page
+                reads.append((
+                    src_path, dest_path, recorded,
+                    executor.submit(read_page_source, src_path, url_rewriter, parse_cache)
+                ))
+
+            return
+
+        fill_reads()
+        while reads:
+            src_path, dest_path, recorded, read = reads.popleft()
+            fill_reads()
+
+            collected = None
+            if terms is not None:
+                collected = PageTerms()
+                terms.append(collected)
+
+            try:
+                with profiler.span("read_wait"):
+                    source = read.result()
+
+                if source.data is None and source.entry is None:
+                    results.append(generate_page(
+                        src_path, template, dest_path, basepath,
+                        profiler=profiler, cache=cache, parse_cache=parse_cache, previous=recorded,
+                        terms=collected
+                    ))
+                    continue
+
+                print(page_message(src_path, template, dest_path))
+                if parse_cache is not None:
+                    parse_cache.count_lookup(source.entry is not None)
+
+                with profiler.span("page", src_path):
+                    rendered = render_page_source(source, url_rewriter, profiler, cache, collected)
+            except Exception as e:
+                raise PageBuildError(src_path, f"{type(e).__name__}: {e}") from e
+
+            if rendered is None:
+                results.append(None)
+                continue
+
+            title, body = rendered
+            store_cache = parse_cache if source.entry is None else None
+
+            while len(writes) >= window:
+                finish_write()
+            writes.append((src_path, len(results), executor.submit(
+                write_page_output, dest_path, template, title, body, store_cache, source.key, recorded
+            )))
+            # filled in by finish_write
+            results.append(None)
+
+        while writes:
+            finish_write()
+
+    return results
+
+#---[ Pipelined Rendering ]-----------------------------------------------------
+
+def is_page_source(src_path: Path, content_path: Path, path_filter: PathFilter | None=None) -> bool:
+    return path_filter is None or path_filter.allows(src_path.relative_to(content_path).as_posix())
+
+def page_dest_path(src_path: Path, content_path: Path, dest_path: Path) -> Path:
+    rel = src_path.relative_to(content_path)
+
+    return dest_path / rel.parent / str(rel.name).replace(".md", ".html")
+
+def update_pages(
+    page_list: list[tuple[Path, Path]],
+    content_path: Path,
+    template: Template,
+    dest_path: Path,
+    basepath: str,
+    manifest: BuildManifest,
+    jobs: int=1,
+    profiler: Profiler=NULL_PROFILER,
+    cache: BlockCache | None=None,
+    parse_cache: ParseCache | None=None,
+    explain: bool=False,
+    io_threads: int=0,
+    write_stats: WriteStats | None=None,
+    search_terms: dict[str, PageTerms] | None=None
+) -> tuple[int, int]:
+    '''
+    regenerates the (src, dest) pages in `page_list` whose source markdown,
+    template, or basepath changed since they were last built, returning
+    (generated, skipped)
+    - with `explain`, prints why each regenerated page was out of date
+    - regenerated pages whose HTML came out the same aren't rewritten; with
+      `write_stats`, they're counted there
+    - with `search_terms`, the search terms of pages rendered from their
+      markdown are added to it by dest_rel, for build_search_index
+    '''
+    template_hash = template.fingerprint
+    assets_hash   = page_url_rewriter(template, basepath).assets_hash
+
+    skipped = 0
+
+    # work out what's stale first, then render the stale pages in one go
+    work_list  = []
+    work_state = []
+    previous   = []
+    with profiler.span("stale_check"):
+        for src_path, file_dest_path in page_list:
+            dest_rel = file_dest_path.relative_to(dest_path).as_posix()
+
+            src_rel  = src_path.relative_to(content_path).as_posix()
+            src_hash = manifest.source_hash(dest_rel, src_path)
+
+            reasons = manifest.page_stale_reasons(dest_rel, src_rel, src_hash, template_hash, basepath, assets_hash)
+            if not file_dest_path.exists():
+                reasons.insert(0, "output missing")
+            if not reasons:
+                skipped += 1
+                continue
+            if explain:
+                print(f"{dest_rel}: {'; '.join(reasons)}")
+
+            file_dest_path.parent.mkdir(parents=True, exist_ok=True)
+            work_list.append((src_path, file_dest_path))
+            work_state.append((dest_rel, src_hash))
+            previous.append(manifest.output_state(dest_rel))
+
+    generated = 0
+    terms = [] if search_terms is not None else None
+    with profiler.span("render_pages"):
+        results = render_pages(
+            work_list, template, basepath, jobs, profiler, cache, parse_cache, io_threads, previous, terms
+        )
+    if terms is not None:
+        for (dest_rel, _), collected in zip(work_state, terms):
+            if collected is not None and collected.title is not None:
+                search_terms[dest_rel] = collected
+
+    for (src_path, _), (dest_rel, src_hash), result in zip(work_list, work_state, results):
+        if result is not None:
+            src_rel = src_path.relative_to(content_path).as_posix()
+            manifest.record_page(
+                dest_rel, src_path, src_rel, src_hash, template_hash, basepath, assets_hash, result.state()
+            )
+            generated += 1
+            if write_stats is not None:
+                write_stats.add(result)
+        else:
+            manifest.forget_page(dest_rel)
+
+    return generated, skipped
+
+def remove_pages(dest_rels: list[str], dest_path: Path, manifest: BuildManifest) -> int:
+    removed = 0
+
+    for dest_rel in dest_rels:
+        stale_path = dest_path / dest_rel
+        if stale_path.exists():
+            print(f"Removing stale page {dest_rel}")
+            os.remove(stale_path)
+            remove_gzip_sibling(dest_path, dest_rel, manifest)
+            remove_empty_parents(stale_path.parent, dest_path)
+            removed += 1
+        manifest.forget_page(dest_rel)
+
+    return removed
+
+def generate_pages_incrementally(
+    content_path: Path,
+    template: Template,
+    dest_path: Path,
+    basepath: str,
+    manifest: BuildManifest,
+    jobs: int=1,
+    profiler: Profiler=NULL_PROFILER,
+    cache: BlockCache | None=None,
+    parse_cache: ParseCache | None=None,
+    explain: bool=False,
+    io_threads: int=0,
+    path_filter: PathFilter | None=None,
+    shard: ShardSpec | None=None,
+    search_terms: dict[str, PageTerms] | None=None
+) -> None:
+    '''
+    regenerates only the pages whose source markdown, template, or basepath
+    changed since the last build, as recorded in the build manifest
+    - with `shard`, only the pages belonging to that shard are built
+    - outputs whose source markdown no longer exists (or that `path_filter`
+      or `shard` now leaves out) are deleted
+    - with an empty docs/ (or no manifest) this is just a full build
+    - `search_terms` is filled as in update_pages
+    - the caller saves the manifest
+    '''
+    with profiler.span("collect_pages"):
+        page_list = collect_pages(content_path, dest_path, path_filter, manifest.dirs)
+        manifest.dirs.prune(CONTENT_PREFIX)
+        if shard is not None:
+            page_list = [
+                (src, dest) for src, dest in page_list if shard.owns(src.relative_to(content_path).as_posix())
+            ]
+
+    write_stats = WriteStats()
+    generated, skipped = update_pages(
+        page_list, content_path, template, dest_path, basepath, manifest, jobs, profiler, cache, parse_cache,
+        explain, io_threads, write_stats, search_terms
+    )
+
+    # sources that vanished take their output pages with them
+    seen = {file_dest_path.relative_to(dest_path).as_posix() for _, file_dest_path in page_list}
+    removed = remove_pages(sorted(set(manifest.pages) - seen), dest_path, manifest)
+
+    print(f"\n{generated} generated, {skipped} up to date, {removed} removed")
+    if generated:
+        print(f"writes: {write_stats}")
+    if cache is not None and generated:
+        print(f"block cache: {cache}")
+    if parse_cache is not None and generated:
+        print(f"parse cache: {parse_cache}")
+
+    return
+
+def refresh_pages(
+    changed_paths: list[Path],
+    content_path: Path,
+    template: Template,
+    dest_path: Path,
+    basepath: str,
+    manifest: BuildManifest,
+    jobs: int=1,
+    cache: BlockCache | None=None,
+    parse_cache: ParseCache | None=None,
+    explain: bool=False,
+    io_threads: int=0,
+    path_filter: PathFilter | None=None,
+    search_terms: dict[str, PageTerms] | None=None
+) -> None:
+    '''
+    generate_pages_incrementally for just the given content paths
+    - a path that no longer exists removes its page, or every page below it if
+      it was a directory
+    '''
+    page_list = [
+        (path, page_dest_path(path, content_path, dest_path))
+        for path in sorted(changed_paths)
+        if path.name.endswith(".md") and path.is_file() and is_page_source(path, content_path, path_filter)
+    ]
+    write_stats = WriteStats()
+    generated, _ = update_pages(
+        page_list, content_path, template, dest_path, basepath, manifest, jobs,
+        cache=cache, parse_cache=parse_cache, explain=explain, io_threads=io_threads, write_stats=write_stats,
+        search_terms=search_terms
+    )
+
+    # pages built from a deleted file, or from anything below a deleted directory
+    gone = manifest.deps.dependents(
+        [CONTENT_PREFIX + path.relative_to(content_path).as_posix() for path in changed_paths if not path.exists()],
+        below=True
+    )
+    removed = remove_pages(sorted(gone), dest_path, manifest)
+
+    if generated or removed:
+        print(f"{generated} generated ({write_stats.written} written), {removed} removed")
+
+    return
+
+def build_search_index(
+    content_path: Path,
+    dest_path: Path,
+    manifest: BuildManifest,
+    basepath: str,
+    search_terms: dict[str, PageTerms] | None=None
+) -> None:
+    '''
+    updates the search index from the pages in the build manifest, so it
+    has to run after the pages are generated
+    - `search_terms` are the terms collected while generating them (see
+      update_pages); other changed pages are parsed again
+    '''
+    indexed, unchanged, removed, write_stats = update_search_index(
+        content_path, dest_path, manifest.pages, UrlRewriter(basepath).basepath, search_terms
+    )
+    if indexed or removed:
+        print(f"search: {indexed} indexed, {unchanged} unchanged, {removed} removed; shards {write_stats}")
+
+    return
+
+#---[ Watch Mode ]--------------------------------------------------------------
+def watch_and_rebuild(
+    content_dir: Path,
+    static_dir: Path,
+    template_path: Path,
+    docs_dir: Path,
+    template: Template,
+    manifest: BuildManifest,
+    args: argparse.Namespace,
+    cache: BlockCache | None=None,
+    parse_cache: ParseCache | None=None
+) -> None:
+    '''
+    rebuilds whatever a change touches until interrupted:
+        - template.html: recompiled, then every page
+        - a markdown file: just that page
+        - a static file: just that asset, plus every page with --fingerprint
+          when its fingerprinted name changed
+    '''
+    path_filter = page_filter(args)
+
+    watcher = make_watcher([content_dir, static_dir], [template_path], polling=args.poll)
+    print(f"\nwatching for changes with {type(watcher).__name__} (ctrl+c to stop)")
+
+    try:
+        while True:
+            changed = wait_for_changes(watcher, args.debounce)
+            start = time.perf_counter()
+
+            try:
+                # assets first: with --fingerprint, pages link to their new names
+                asset_paths = [path for path in changed if static_dir in path.parents]
+                if asset_paths:
+                    update_assets(
+                        asset_paths, static_dir, docs_dir, manifest, args.hash_assets, args.hardlink, args.explain,
+                        args.fingerprint
+                    )
+
+                asset_map = None
+                if args.fingerprint:
+                    asset_map = manifest.asset_map()
+                    write_asset_map(docs_dir, asset_map)
+
+                search_terms = {} if args.search else None
+                if template_path in changed or (args.fingerprint and asset_map != template.url_rewriter.assets):
+                    template = compile_page_template(template_path, args.basepath, args.var, asset_map)
+                    generate_pages_incrementally(
+                        content_dir, template, docs_dir, args.basepath, manifest, args.jobs,
+                        cache=cache, parse_cache=parse_cache, explain=args.explain, io_threads=args.io_threads,
+                        path_filter=path_filter, search_terms=search_terms
+                    )
+                else:
+                    page_paths = [path for path in changed if content_dir in path.parents]
+                    if page_paths:
+                        refresh_pages(
+                            page_paths, content_dir, template, docs_dir, args.basepath, manifest, args.jobs,
+                            cache, parse_cache, args.explain, args.io_threads, path_filter, search_terms
+                        )
+
+                if args.search:
+                    build_search_index(content_dir, docs_dir, manifest, args.basepath, search_terms)
+
+                if args.gzip:
+                    print(f"gzip: {compress_outputs(docs_dir, manifest)}")
+            except (PageBuildError, TemplateError) as e:
+                print(f"Error: {e}")
+                continue
+            finally:
+                if manifest.has_changes():
+                    manifest.save()
+
+            print(f"rebuilt {len(changed)} changed path(s) in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except KeyboardInterrupt:
+        print("")
+    finally:
+        watcher.close()
+        # once rather than per rebuild: it looks at the whole cache
+        if parse_cache is not None:
+            parse_cache.prune()
+
+    return
+
+#---[ Watch Mode ]--------------------------------------------------------------
+
+
+#---[ Merge ]-------------------------------------------------------------------
+def parse_merge_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="main.py merge",
+        description="Combines the outputs of `main.py --shard i/N` builds into one site"
+    )
+    parser.add_argument(
+        "shards", nargs="*", type=Path, metavar="SHARD_DIR",
+        help=f"the shard builds' output directories (default: every directory in {SHARD_DIR}/)"
+    )
+    parser.add_argument(
+        "--output", type=Path, metavar="DIR",
+        help="write the merged site to DIR instead of docs/ (its contents are replaced, so it must be empty or an earlier build)"
+    )
+    parser.add_argument(
+        "--search", action="store_true",
+        help=f"build the search index over the merged pages into {SEARCH_DIR}/"
+    )
+    parser.add_argument(
+        "--gzip", action="store_true",
+        help="write a .gz next to each compressible output"
+    )
+
+    args = parser.parse_args(argv)
+    check_output_dir(parser, args.output)
+
+    if not args.shards:
+        shard_root = get_project_dir(SHARD_DIR)
+        if shard_root.is_dir():
+            args.shards = sorted(path for path in shard_root.iterdir() if path.is_dir())
+
+    # the output is emptied before the shards are copied into it
+    output = (args.output or get_project_dir("docs")).resolve()
+    for shard_dir in args.shards:
+        shard_dir = shard_dir.resolve()
+        if output == shard_dir or output in shard_dir.parents or shard_dir in output.parents:
+            parser.error(f"the output {output} overlaps the shard {shard_dir}")
+
+    return args
+
+def merge_site(args: argparse.Namespace) -> None:
+    '''
+    checks the shard builds fit together, then replaces the output directory
+    with their combined pages, static files & manifest; the output is left
+    alone if they don't
+    '''
+    try:
+        merge = ShardMerge(args.shards)
+    except MergeError as e:
+        sys.exit(f"can't merge shards:\n{e}")
+
+    if args.output is not None:
+        args.output.mkdir(parents=True, exist_ok=True)
+        docs_dir = args.output
+    else:
+        docs_dir = get_project_dir("docs")
+
+    remove_files(docs_dir)
+    manifest = merge.copy_to(docs_dir)
+    print(merge.stats)
+
+    if args.search:
+        basepath = merge.settings.get(BASEPATH_INPUT) or "/"
+        build_search_index(get_project_dir("content"), docs_dir, manifest, basepath)
+    if args.gzip:
+        print(f"gzip: {compress_outputs(docs_dir, manifest)}")
+
+    manifest.save()
+
+    return
+
+#---[ Merge ]-------------------------------------------------------------------
+
+
+#---[ Serve Mode ]--------------------------------------------------------------
+def render_served_page(
+    src_path: Path,
+    name: str,
+    template: Template,
+    basepath: str,
+    cache: BlockCache | None=None
+) -> Resource | None:
+    '''
+    renders a page into memory, with the live reload script added; None for
+    an empty page
+    '''
+    url_rewriter = page_url_rewriter(template, basepath)
+    rewrite_url  = None if url_rewriter.is_identity else url_rewriter
+
+    # encoded as it renders, so a big page is held once rather than as its
+    # body, the filled template & the bytes
+    html = io.BytesIO()
+    try:
+        with MarkdownSource(src_path) as source, source.lines() as lines:
+            page = read_page(lines)
+            if page is None:
+                return None
+
+            title, _, body_lines = page
+            template.render_into(
+                lambda chunk: html.write(chunk.encode()),
+                {"Title": title, "Content": lambda write: render_markdown_into(body_lines, write, rewrite_url, None, cache)}
+            )
+        inject_reload_script_into(html)
+    except Exception as e:
+        raise PageBuildError(src_path, f"{type(e).__name__}: {e}") from e
+
+    return Resource.from_bytes(name, html.getvalue())
+
+def serve_pages(
+    page_list: list[tuple[Path, str]],
+    template: Template,
+    basepath: str,
+    store: SiteStore,
+    sources: dict[str, Path],
+    cache: BlockCache | None=None
+) -> list[str]:
+    '''
+    renders (source, output name) pairs into `store`, returning the names
+    that were updated
+    - a page that fails keeps serving its last good version
+    '''
+    updated = []
+
+    for src_path, name in page_list:
+        try:
+            resource = render_served_page(src_path, name, template, basepath, cache)
+        except PageBuildError as e:
+            print(f"Error: {e}")
+            continue
+
+        if resource is None:
+            store.remove(name)
+            sources.pop(name, None)
+        else:
+            store.put(name, resource)
+            sources[name] = src_path
+        updated.append(name)
+
+    return updated
+
+def serve_static(
+    paths: list[Path],
+    static_dir: Path,
+    store: SiteStore,
+    sources: dict[str, Path],
+) -> list[str]:
+    updated = []
+
+    for path in paths:
+        name = path.relative_to(static_dir).as_posix()
+        try:
+            store.put(name, Resource.from_file(name, path))
+        except OSError as e:
+            print(f"Error: {path}: {e}")
+            continue
+        sources[name] = path
+        updated.append(name)
+
+    return updated
+
+def forget_served(gone: list[Path], store: SiteStore, sources: dict[str, Path]) -> list[str]:
+    '''
+    drops the outputs of deleted files, & of everything below deleted
+    directories
+    '''
+    removed = []
+
+    for name, src_path in list(sources.items()):
+        if any(src_path == path or path in src_path.parents for path in gone):
+            store.remove(name)
+            del sources[name]
+            removed.append(name)
+
+    return removed
+
+def serve_site(args: argparse.Namespace) -> None:
+    '''
+    renders the whole site into memory & serves it, then re-renders whatever
+    a change touches, the same way --watch does, & tells open pages to reload
+    - requests are answered on their own threads from the store, which a
+      rebuild only updates once a page is fully rendered
+    '''
+    static_dir    = get_project_dir("static")
+    content_dir   = get_project_dir("content")
+    template_path = get_project_dir(".") / "template.html"
+
+    basepath = UrlRewriter(args.basepath).basepath
+    cache    = BlockCache(args.block_cache) if args.block_cache > 0 else None
+
+    try:
+        template = compile_page_template(template_path, args.basepath, args.var)
+    except TemplateError as e:
+        sys.exit(f"{template_path}: {e}")
+
+    store   = SiteStore(basepath)
+    broker  = ReloadBroker()
+    sources = {}
+
+    path_filter = page_filter(args)
+
+    start = time.perf_counter()
+    serve_static(list_files(static_dir), static_dir, store, sources)
+    page_list = [
+        (src_path, dest_path.as_posix()) for src_path, dest_path in collect_pages(content_dir, Path(), path_filter)
+    ]
+    serve_pages(page_list, template, args.basepath, store, sources, cache)
+    print(f"rendered {len(store.resources)} file(s) in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    server = SiteServer((args.host, args.port), store, broker, quiet=args.quiet)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    print(f"serving at http://{args.host}:{server.server_port}{basepath} (ctrl+c to stop)")
+
+    watcher = make_watcher([content_dir, static_dir], [template_path], polling=args.poll)
+
+    try:
+        while True:
+            changed = wait_for_changes(watcher, args.debounce)
+            start = time.perf_counter()
+
+            gone = [path for path in changed if not path.exists()]
+            urls = []
+
+            if template_path in changed:
+                try:
+                    template = compile_page_template(template_path, args.basepath, args.var)
+                except TemplateError as e:
+                    print(f"Error: {template_path}: {e}")
+                else:
+                    page_list = [
+                        (src_path, dest_path.as_posix())
+                        for src_path, dest_path in collect_pages(content_dir, Path(), path_filter)
+                    ]
+                    serve_pages(page_list, template, args.basepath, store, sources, cache)
+                    urls.append("*")
+
+            removed = forget_served(gone, store, sources)
+            urls.extend(store.url(name) for name in removed)
+
+            page_list = [
+                (path, page_dest_path(path, content_dir, Path()).as_posix())
+                for path in sorted(changed)
+                if content_dir in path.parents and path.name.endswith(".md") and path.is_file()
+                and is_page_source(path, content_dir, path_filter)
+            ]
+            urls.extend(store.url(name) for name in serve_pages(page_list, template, args.basepath, store, sources, cache))
+
+            asset_paths = sorted(path for path in changed if static_dir in path.parents and path.is_file())
+            if serve_static(asset_paths, static_dir, store, sources) or any(static_dir in path.parents for path in gone):
+                # stylesheets & images can be used by any page
+                urls.append("*")
+
+            if urls:
+                broker.publish(urls)
+                print(
+                    f"re-rendered {len(changed)} changed path(s) in {(time.perf_counter() - start) * 1000:.0f} ms, "
+                    f"reloading {len(broker)} open page(s)"
+                )
+    except KeyboardInterrupt:
+        print("")
+    finally:
+        watcher.close()
+        broker.close()
+        server.shutdown()
+        server.server_close()
+
+    return
+
+#---[ Serve Mode ]--------------------------------------------------------------
+
 
 #---[ Entry ]-------------------------------------------------------------------
 if __name__ == "__main__":
@@ -0,0 +1,282 @@
+#---[ Global Imports ]----------------------------------------------------------
+import hashlib
+import json
+import os
+from   pathlib import Path
+
+from   deps   import STATIC_PREFIX, DependencyGraph, asset_inputs, page_inputs
+from   walker import DirListings
+
+#---[ Global Imports ]----------------------------------------------------------
+
+MANIFEST_NAME    = ".ssg-manifest.json"
+MANIFEST_VERSION = 2
+
+HASH_CHUNK_SIZE  = 1 << 20
+
+
+#---[ Hashing ]-----------------------------------------------------------------
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def hash_str(text: str) -> str:
+    return hash_bytes(text.encode("utf-8"))
+
+def hash_file(path: Path) -> str:
+    '''
+    sha256 of a file's contents, read in chunks so big files don't get loaded
+    into memory all at once
+    '''
+    digest = hashlib.sha256()
+
+    with path.open("rb") as inFile:
+        while chunk := inFile.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+#---[ Hashing ]-----------------------------------------------------------------
+
+
+#---[ Build Manifest ]----------------------------------------------------------
+class BuildManifest:
+    '''
+    Records what every output was built from, in a DependencyGraph (see
+    deps.py): pages depend on their source markdown file, template.html, & the
+    basepath; assets on their file under static/. An output whose recorded
+    inputs all match the current ones doesn't need to be regenerated. Keys are
+    output paths relative to the output directory.
+
+    Alongside the graph:
+        - pages: the source file of each page, with the size & mtime its hash
+          was taken at, so unchanged sources aren't re-hashed; & the [size,
+          mtime, hash] of the page written, so a re-render can tell whether
+          it changed without reading it (see writer.py)
+        - assets: size, mtime, and optionally hash of each copied asset, so
+          ones whose source disappears can be removed; keyed by the path
+          under static/, with "output" set when the copy was fingerprinted
+          under another name
+        - compressed: size & mtime of each output when its .gz sibling was
+          made, and the .gz size (None when compressing didn't pay off)
+        - dirs: the entries of each source directory at a given mtime (see
+          walker.DirListings), so unchanged directories aren't listed again
+        - shard: [i, N] for the output of `--shard i/N`, which holds only that
+          shard's pages (see shard.py)
+    '''
+    def __init__(self,
+        path: Path,
+        pages: dict[str, dict] | None=None,
+        assets: dict[str, dict] | None=None,
+        deps: dict[str, dict[str, str]] | None=None,
+        compressed: dict[str, dict] | None=None,
+        dirs: dict[str, dict] | None=None,
+        shard: list[int] | None=None
+    ) -> None:
+        self.path       = path
+        self.pages      = pages if pages is not None else {}
+        self.assets     = assets if assets is not None else {}
+        self.deps       = DependencyGraph(deps)
+        self.compressed = compressed if compressed is not None else {}
+        self.dirs       = DirListings(dirs)
+        self.shard      = shard
+
+        # set when an entry changes; see has_changes
+        self.changed = False
+
+        return
+
+    @classmethod
+    def load(cls, path: Path) -> "BuildManifest":
+        '''
+        a missing, unreadable, or outdated manifest is treated as empty, which
+        just means every page gets rebuilt
+        '''
+        try:
+            with path.open("r") as inFile:
+                data = json.load(inFile)
+        except (OSError, ValueError):
+            return cls(path)
+
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+
+        return cls(
+            path,
+            data.get("pages", {}),
+            data.get("assets", {}),
+            data.get("deps", {}),
+            data.get("compressed", {}),
+            data.get("dirs", {}),
+            data.get("shard")
+        )
+
+    def save(self) -> None:
+        data = {
+            "version": MANIFEST_VERSION,
+            "pages": self.pages,
+            "assets": self.assets,
+            "deps": self.deps.edges,
+            "compressed": self.compressed,
+            "dirs": self.dirs.entries,
+            "shard": self.shard,
+        }
+
+        # write then rename so an interrupted build never leaves half a manifest;
+        # compact, since it's rewritten after every --watch rebuild that
+        # changes something
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with temp_path.open("w") as outFile:
+            # dumps, not dump: only the one-shot encoder is the C one
+            outFile.write(json.dumps(data, separators=(",", ":")))
+        os.replace(temp_path, self.path)
+
+        self.changed = self.deps.changed = self.dirs.changed = False
+
+        return
+
+    def has_changes(self) -> bool:
+        '''
+        whether anything was recorded or forgotten since the manifest was
+        loaded or saved, so --watch can skip saving after a no-op rebuild
+        - code changing `compressed` directly sets `changed` itself
+        '''
+        return self.changed or self.deps.changed or self.dirs.changed
+
+    def source_hash(self, dest_rel: str, src_path: Path) -> str:
+        '''
+        hash of the source file, reusing the recorded hash when the file's size
+        and mtime haven't changed since it was last hashed
+        '''
+        stat  = src_path.stat()
+        entry = self.pages.get(dest_rel)
+
+        if (
+            entry
+            and entry.get("source_size") == stat.st_size
+            and entry.get("source_mtime") == stat.st_mtime_ns
+        ):
+            return entry["source_hash"]
+
+        return hash_file(src_path)
+
+    def page_stale_reasons(self,
+        dest_rel: str,
+        src_rel: str,
+        src_hash: str,
+        template_hash: str,
+        basepath: str,
+        assets_hash: str | None=None
+    ) -> list[str]:
+        '''
+        why the page needs regenerating, or [] if it's up to date
+        '''
+        return self.deps.stale_reasons(dest_rel, page_inputs(src_rel, src_hash, template_hash, basepath, assets_hash))
+
+    def record_page(self,
+        dest_rel: str,
+        src_path: Path,
+        src_rel: str,
+        src_hash: str,
+        template_hash: str,
+        basepath: str,
+        assets_hash: str | None=None,
+        output_state: list | None=None
+    ) -> None:
+        stat = src_path.stat()
+
+        entry = {
+            "source":        src_rel,
+            "source_hash":   src_hash,
+            "source_size":   stat.st_size,
+            "source_mtime":  stat.st_mtime_ns,
+        }
+        if output_state is not None:
+            entry["output"] = output_state
+        if self.pages.get(dest_rel) != entry:
+            self.pages[dest_rel] = entry
+            self.changed = True
+        self.deps.record(dest_rel, page_inputs(src_rel, src_hash, template_hash, basepath, assets_hash))
+
+        return
+
+    def output_state(self, dest_rel: str) -> list | None:
+        '''
+        [size, mtime, hash] of the page last written to `dest_rel`, if known
+        '''
+        return self.pages.get(dest_rel, {}).get("output")
+
+    def forget_page(self, dest_rel: str) -> None:
+        if self.pages.pop(dest_rel, None) is not None:
+            self.changed = True
+        self.deps.forget(dest_rel)
+
+        return
+
+    def record_asset(self,
+        dest_rel: str,
+        dest_path: Path,
+        with_hash: bool=False,
+        output: str | None=None,
+        file_hash: str | None=None
+    ) -> None:
+        '''
+        - `output` is the asset's path in the output directory when it isn't
+          `dest_rel` (a fingerprinted copy)
+        - `file_hash`, when the caller already knows it, is recorded instead of
+          hashing the file again
+        '''
+        stat  = dest_path.stat()
+        entry = self.assets.get(dest_rel, {})
+
+        if file_hash is None and with_hash:
+            if (
+                entry.get("hash")
+                and entry.get("size") == stat.st_size
+                and entry.get("mtime") == stat.st_mtime_ns
+            ):
+                file_hash = entry["hash"]
+            else:
+                file_hash = hash_file(dest_path)
+
+        new_entry = {
+            "size":  stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash":  file_hash,
+        }
+        if output is not None and output != dest_rel:
+            new_entry["output"] = output
+        if entry != new_entry:
+            self.assets[dest_rel] = new_entry
+            self.changed = True
+
+        self.deps.record(
+            output or dest_rel,
+            asset_inputs(dest_rel, file_hash or f"{stat.st_size}:{stat.st_mtime_ns}")
+        )
+
+        return
+
+    def forget_asset(self, dest_rel: str) -> None:
+        output = self.asset_output(dest_rel)
+        if self.assets.pop(dest_rel, None) is not None:
+            self.changed = True
+
+        # a page may have taken over the output path
+        if all(name.startswith(STATIC_PREFIX) for name in self.deps.inputs(output)):
+            self.deps.forget(output)
+
+        return
+
+    def asset_output(self, dest_rel: str) -> str:
+        '''
+        where the asset from static/`dest_rel` was copied to
+        '''
+        return self.assets.get(dest_rel, {}).get("output", dest_rel)
+
+    def asset_map(self) -> dict[str, str]:
+        '''
+        static path -> output path of every fingerprinted asset
+        '''
+        return {rel: entry["output"] for rel, entry in sorted(self.assets.items()) if "output" in entry}
+
+#---[ Build Manifest ]----------------------------------------------------------
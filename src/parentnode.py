@@ -1,27 +1,34 @@
+from collections.abc import Callable, Mapping
+
 from htmlnode import HTMLNode
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self,
         tag: str,
         children: list["HTMLNode"],
-        props: dict[str, str] | None=None
+        props: Mapping[str, str] | None=None
     ) -> None:
         super().__init__(tag=tag, children=children, props=props)
 
         return
 
-    def to_html(self) -> str:
+    def render_into(self,
+        write: Callable[[str], object],
+        rewrite_url: Callable[[str], str] | None=None
+    ) -> None:
         if not self.tag:
             raise ValueError("Error: Parent node must have a tag")
 
         if not self.children:
             raise ValueError("Error: Parent Node must have children nodes")
 
-        res = f"<{self.tag}{self.props_to_html()}>"
-        
+        write(f"<{self.tag}{self.props_to_html(rewrite_url)}>")
+
         for child in self.children:
-            res += f"{child.to_html()}"
-        
-        res += f"</{self.tag}>"
+            child.render_into(write, rewrite_url)
+
+        write(f"</{self.tag}>")
 
-        return res
+        return
@@ -0,0 +1,221 @@
+'''
+On-disk cache of rendered page bodies, shared between builds (& processes).
+
+An entry is the title line followed by the <div> body HTML of one markdown
+file, keyed by the file's content hash & the basepath its URLs were rewritten
+against. A page whose entry exists skips parsing entirely, so a template-only
+change re-renders every page without re-reading any markdown syntax.
+
+Invalidation:
+    - entries live under a directory named after the parser stamp, a hash of
+      PARSER_VERSION & the source of every module that affects parser output;
+      editing any of them starts a fresh directory, & prune() deletes the
+      directories of other stamps
+    - entries are written to a temp file & renamed into place only after the
+      page rendered successfully, so a failed or interrupted build never
+      leaves a partial entry
+    - size is bounded by prune(), which evicts least recently used entries
+      (by mtime, which is refreshed on every hit)
+    - the bytes in use are kept in a SIZE_FILE next to the entries & grown by
+      what each build stored, so prune() only walks the cache when that total
+      goes over the limit (or the file is missing, e.g. deleted to force a
+      recount); builds sharing a cache at the same time may under-count
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Iterator
+import contextlib
+import os
+from   pathlib import Path
+import shutil
+import threading
+from   typing import TextIO
+
+from   manifest import hash_bytes, hash_str
+
+#---[ Global Imports ]----------------------------------------------------------
+
+PARSE_CACHE_DIR  = ".ssg-cache"
+PARSE_CACHE_SIZE = 256 << 20
+SIZE_FILE        = ".size"
+
+# bump to invalidate every cache entry by hand
+PARSER_VERSION = 1
+
+# modules whose code decides the HTML a markdown file turns into (& its
+# title & front matter, read by source)
+PARSER_MODULES = ("utils", "patterns", "block", "textnode", "htmlnode", "leafnode", "parentnode", "urls", "source")
+
+
+def parser_stamp() -> str:
+    source_dir = Path(__file__).parent
+
+    pieces = [str(PARSER_VERSION).encode()]
+    for name in PARSER_MODULES:
+        pieces.append(name.encode())
+        pieces.append((source_dir / f"{name}.py").read_bytes())
+
+    return hash_bytes(b"\0".join(pieces))
+
+
+class ParseCache:
+    def __init__(self, root: Path, max_bytes: int=PARSE_CACHE_SIZE, stamp: str | None=None) -> None:
+        self.root      = root
+        self.max_bytes = max_bytes
+        self.stamp     = stamp or parser_stamp()
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        # bytes of entries stored since the last prune()
+        self.stored    = 0
+
+        return
+
+    @property
+    def directory(self) -> Path:
+        return self.root / self.stamp[:16]
+
+    def key(self, src_hash: str, basepath: str) -> str:
+        return hash_str(f"{src_hash}\0{basepath}")
+
+    def entry_path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> Path | None:
+        '''
+        path of the entry for `key`, marking it recently used, or None
+        '''
+        path = self.find(key)
+        self.count_lookup(path is not None)
+
+        return path
+
+    def find(self, key: str) -> Path | None:
+        '''
+        get() without touching the hit/miss counters, for lookups made off the
+        thread that owns the cache (which then calls count_lookup)
+        '''
+        path = self.entry_path(key)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def count_lookup(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return
+
+    @contextlib.contextmanager
+    def store(self, key: str, title: str) -> Iterator[TextIO]:
+        '''
+        `with cache.store(key, title) as entry:` writes the body HTML for `key`
+        to `entry`; it becomes visible only if the block exits cleanly
+        '''
+        path = self.entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        try:
+            with temp_path.open("w") as outFile:
+                outFile.write(title.replace("\n", " ") + "\n")
+                yield outFile
+            size = temp_path.stat().st_size
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        self.stored += size
+
+        return
+
+    def stats(self) -> tuple[int, int, int, int]:
+        '''
+        (hits, misses, evictions, bytes stored), which add_stats() sums up from
+        the copies of the cache that worker processes use
+        '''
+        return self.hits, self.misses, self.evictions, self.stored
+
+    def add_stats(self, stats: tuple[int, int, int, int]) -> None:
+        hits, misses, evictions, stored = stats
+        self.hits      += hits
+        self.misses    += misses
+        self.evictions += evictions
+        self.stored    += stored
+
+        return
+
+    def read_size(self) -> int | None:
+        try:
+            return int((self.directory / SIZE_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_size(self, total: int) -> None:
+        (self.directory / SIZE_FILE).write_text(str(total))
+        self.stored = 0
+
+        return
+
+    def prune(self) -> int:
+        '''
+        removes entries of other parser stamps, then least recently used
+        entries until the cache fits in `max_bytes`; returns the bytes in use
+        - only walks the entries when the recorded size plus what was stored
+          since is over `max_bytes`
+        '''
+        if not self.root.is_dir():
+            return 0
+
+        for path in self.root.iterdir():
+            if path.is_dir() and path != self.directory:
+                shutil.rmtree(path, ignore_errors=True)
+
+        if not self.directory.is_dir():
+            return 0
+
+        total = self.read_size()
+        if total is not None and total + self.stored <= self.max_bytes:
+            total += self.stored
+            if self.stored:
+                self.write_size(total)
+            return total
+
+        size_path = self.directory / SIZE_FILE
+        entries = []
+        total = 0
+        for directory, _, names in os.walk(self.directory):
+            for name in names:
+                path = Path(directory) / name
+                if path == size_path:
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+        self.write_size(total)
+
+        return total
+
+    def __str__(self) -> str:
+        lookups  = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate), {self.evictions} evicted"
@@ -0,0 +1,25 @@
+'''
+Every regular expression the markdown parser uses, compiled once at import.
+
+Look patterns up by name in `PATTERNS`, or use the module-level constants.
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+import re
+
+#---[ Global Imports ]----------------------------------------------------------
+
+PATTERNS: dict[str, re.Pattern] = {
+    # inline spans
+    "image":          re.compile(r"!\[(.*?)\]\((.*?)\)"),
+    "link":           re.compile(r"\[(.*?)\]\((.*?)\)"),
+    "inline_special": re.compile(r"[!\[*_`]"),
+
+    # block types
+    "heading":        re.compile(r"(#{1,6}) ([^\s].*)"),
+}
+
+IMAGE_PATTERN          = PATTERNS["image"]
+LINK_PATTERN           = PATTERNS["link"]
+INLINE_SPECIAL_PATTERN = PATTERNS["inline_special"]
+HEADING_PATTERN        = PATTERNS["heading"]
@@ -0,0 +1,195 @@
+'''
+Build profiling for --profile.
+
+A Profiler collects:
+    - spans: timed sections (a build stage, a page) that become complete
+      events in a Chrome trace-event file (chrome://tracing, ui.perfetto.dev)
+    - stage totals: call count & wall time per stage name, including stages
+      too fine-grained to be worth a trace event each (per block parse/render)
+    - page times: wall time per source page, for the slowest-pages list
+
+When profiling is off, code is handed NULL_PROFILER, whose span() returns one
+shared do-nothing context manager, so instrumented code costs a couple of
+method calls per page & nothing per block.
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+import json
+import os
+from   pathlib import Path
+import threading
+import time
+
+#---[ Global Imports ]----------------------------------------------------------
+
+TRACE_NAME = "build-profile.json"
+
+
+#---[ Spans ]-------------------------------------------------------------------
+class Span:
+    __slots__ = ("profiler", "name", "page", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, page: object | None) -> None:
+        self.profiler = profiler
+        self.name     = name
+        self.page     = page
+        self.start    = 0
+
+        return
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter_ns()
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        end  = time.perf_counter_ns()
+        page = str(self.page) if self.page is not None else None
+        self.profiler.record(self.name, self.start, end, page)
+
+        return
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return
+
+NULL_SPAN = NullSpan()
+
+#---[ Spans ]-------------------------------------------------------------------
+
+
+#---[ Profiler ]----------------------------------------------------------------
+class Profiler:
+    '''
+    Times are perf_counter_ns values, which share a clock across processes on
+    the same machine, so worker profiles (see export & merge) line up with the
+    parent's on one timeline.
+    '''
+    enabled = True
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter_ns()
+
+        # (name, page, start_ns, end_ns, pid, tid)
+        self.events: list[tuple[str, str | None, int, int, int, int]] = []
+        # name -> [calls, total_ns]
+        self.stages: dict[str, list[int]] = {}
+        # page -> total_ns
+        self.pages: dict[str, int] = {}
+
+        return
+
+    def span(self, name: str, page: object | None=None) -> Span:
+        '''
+        times a `with` block as stage `name`; with `page`, it also counts
+        towards that page's time
+        - `page` may be a Path: it is only str()'d when the span is recorded,
+          so callers don't build labels NULL_PROFILER would throw away
+        '''
+        return Span(self, name, page)
+
+    def record(self, name: str, start_ns: int, end_ns: int, page: str | None=None) -> None:
+        self.events.append((name, page, start_ns, end_ns, os.getpid(), threading.get_native_id()))
+        self.add(name, end_ns - start_ns)
+        if page is not None:
+            self.pages[page] = self.pages.get(page, 0) + end_ns - start_ns
+
+        return
+
+    def add(self, name: str, elapsed_ns: int, calls: int=1) -> None:
+        '''
+        counts towards a stage's totals without emitting a trace event
+        '''
+        totals = self.stages.get(name)
+        if totals is None:
+            self.stages[name] = [calls, elapsed_ns]
+        else:
+            totals[0] += calls
+            totals[1] += elapsed_ns
+
+        return
+
+    def export(self) -> dict:
+        '''
+        everything recorded, as plain data that can be pickled back from a
+        worker process
+        '''
+        return {"events": self.events, "stages": self.stages, "pages": self.pages}
+
+    def merge(self, data: dict) -> None:
+        self.events.extend(data["events"])
+        for name, (calls, elapsed_ns) in data["stages"].items():
+            self.add(name, elapsed_ns, calls)
+        for page, elapsed_ns in data["pages"].items():
+            self.pages[page] = self.pages.get(page, 0) + elapsed_ns
+
+        return
+
+    def slowest_pages(self, count: int) -> list[tuple[str, int]]:
+        return sorted(self.pages.items(), key=lambda item: (-item[1], item[0]))[:count]
+
+    def report(self, top: int=10) -> str:
+        lines = [f"{'stage':<20}{'calls':>10}{'total (ms)':>14}{'mean (ms)':>12}"]
+        for name, (calls, elapsed_ns) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append(
+                f"{name:<20}{calls:>10}{elapsed_ns / 1e6:>14.2f}{elapsed_ns / 1e6 / calls:>12.3f}"
+            )
+
+        slowest = self.slowest_pages(top)
+        if slowest:
+            lines.append("")
+            lines.append(f"slowest {len(slowest)} of {len(self.pages)} page(s):")
+            for page, elapsed_ns in slowest:
+                lines.append(f"{elapsed_ns / 1e6:>10.2f} ms  {page}")
+
+        return "\n".join(lines)
+
+    def trace_events(self) -> list[dict]:
+        '''
+        Chrome trace-event "complete" events, timestamps in microseconds since
+        the profiler was created
+        '''
+        trace = []
+
+        for name, page, start_ns, end_ns, pid, tid in sorted(self.events, key=lambda event: event[2]):
+            event = {
+                "name": name,
+                "cat":  "page" if page is not None else "build",
+                "ph":   "X",
+                "ts":   (start_ns - self.origin) / 1000,
+                "dur":  (end_ns - start_ns) / 1000,
+                "pid":  pid,
+                "tid":  tid,
+            }
+            if page is not None:
+                event["args"] = {"page": page}
+            trace.append(event)
+
+        return trace
+
+    def write_trace(self, path: Path) -> None:
+        with path.open("w") as outFile:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, outFile)
+
+        return
+
+class NullProfiler:
+    enabled = False
+
+    def span(self, name: str, page: object | None=None) -> NullSpan:
+        return NULL_SPAN
+
+    def add(self, name: str, elapsed_ns: int, calls: int=1) -> None:
+        return
+
+    def merge(self, data: dict) -> None:
+        return
+
+NULL_PROFILER = NullProfiler()
+
+#---[ Profiler ]----------------------------------------------------------------
@@ -0,0 +1,359 @@
+'''
+Build-time inverted search index for --search.
+
+Output, under docs/search/:
+    - index.json: {"version", "prefix_length", "pages": [[url, title], ...],
+      "shards": [prefix, ...]}; a page id is its position in "pages" (a
+      removed page leaves a null until its id is reused)
+    - terms-<prefix>.json, one per term prefix: {term: {page id: [weight,
+      position, ...]}}, so a browser looking up "rivendell" fetches
+      index.json & terms-ri.json only
+
+Terms are lowercased words of the text in each page's node tree (the same
+block -> node trees the renderer builds), positions count words from the
+start of the page, & weight sums how prominent each occurrence is
+(TAG_WEIGHTS: a word in a heading counts for more than one in a paragraph).
+
+The index is updated incrementally: SEARCH_STATE (kept next to the build
+manifest) records each page's source hash & the terms it contributed, so only
+pages whose markdown changed are re-tokenized, & their old postings are taken
+out of (& new ones merged into) just the shards they touch. Pages the build
+just rendered hand over the terms collected from their nodes as they rendered
+(PageTerms), so their markdown isn't parsed a second time.
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Iterable
+import heapq
+import json
+import os
+from   pathlib import Path
+import re
+import shutil
+
+from   assets   import gzip_path
+from   htmlnode import HTMLNode
+from   source   import MarkdownSource, read_page
+from   utils    import block_to_html_node, iter_blocks
+from   writer   import WriteStats, write_if_changed
+
+#---[ Global Imports ]----------------------------------------------------------
+
+SEARCH_DIR     = "search"
+SEARCH_STATE   = ".ssg-search.json"
+SEARCH_VERSION = 2
+
+PREFIX_LENGTH  = 2
+MAX_POSITIONS  = 8
+MIN_TERM_SIZE  = 2
+
+TERM_PATTERN = re.compile(r"[^\W_]+")
+
+TAG_WEIGHTS = {
+    "h1": 8, "h2": 4, "h3": 3, "h4": 2, "h5": 2, "h6": 2,
+    "b": 2, "i": 1, "code": 1, "a": 1, "img": 1,
+}
+
+
+#---[ Tokenizing ]--------------------------------------------------------------
+class PageTerms:
+    '''
+    one page's title & term -> [weight, position, ...], with at most
+    MAX_POSITIONS positions per term, built up a block node at a time
+    - the renderer fills one in as a page renders (add_node as its node
+      callback); `title` stays None if the page wasn't rendered from markdown
+    '''
+    __slots__ = ("title", "terms", "position")
+
+    def __init__(self) -> None:
+        self.title: str | None = None
+        self.terms: dict[str, list[int]] = {}
+        self.position = 0
+
+        return
+
+    def add_node(self, node: HTMLNode) -> None:
+        terms = self.terms
+
+        for text, weight in node_text(node, 1):
+            for match in TERM_PATTERN.finditer(text):
+                term = match.group().lower()
+                self.position += 1
+                if len(term) < MIN_TERM_SIZE:
+                    continue
+
+                posting = terms.get(term)
+                if posting is None:
+                    terms[term] = [weight, self.position]
+                else:
+                    posting[0] += weight
+                    if len(posting) <= MAX_POSITIONS:
+                        posting.append(self.position)
+
+        return
+
+def page_terms(lines: Iterable[str]) -> dict[str, list[int]]:
+    '''
+    term -> [weight, position, ...] for one page's markdown
+    '''
+    collected = PageTerms()
+    for block in iter_blocks(lines):
+        collected.add_node(block_to_html_node(block))
+
+    return collected.terms
+
+def node_text(node: HTMLNode, weight: int) -> Iterable[tuple[str, int]]:
+    '''
+    (text, weight) for each piece of text in a node tree; image alt text
+    counts as text
+    '''
+    weight = max(weight, TAG_WEIGHTS.get(node.tag, 1))
+
+    if node.children is not None:
+        for child in node.children:
+            yield from node_text(child, weight)
+    elif node.tag == "img":
+        yield node.props.get("alt", ""), weight
+    elif node.value:
+        yield node.value, weight
+
+    return
+
+def shard_prefix(term: str) -> str:
+    '''
+    the shard a term lives in, as a filename-safe string
+    '''
+    return "".join(
+        char if char.isascii() and char.isalnum() else f"_{ord(char):x}"
+        for char in term[:PREFIX_LENGTH]
+    )
+
+#---[ Tokenizing ]--------------------------------------------------------------
+
+
+#---[ Index ]-------------------------------------------------------------------
+class SearchIndex:
+    '''
+    the index under `directory`, plus the state needed to update it; shards
+    are loaded only when a page touching them changes
+    '''
+    def __init__(self, directory: Path, state_path: Path, state: dict | None=None) -> None:
+        self.directory  = directory
+        self.state_path = state_path
+
+        state = state or {}
+        # dest_rel -> {"id", "source_hash", "title", "terms"}
+        self.pages: dict[str, dict] = state.get("pages", {})
+        self.shard_names: set[str]  = set(state.get("shards", []))
+        # ids below next_id that no page holds, as a heap so the lowest is
+        # reused first
+        self.next_id: int = state.get("next_id", 0)
+        self.free_ids: list[int] = state.get("free_ids", [])
+        heapq.heapify(self.free_ids)
+
+        self.shards: dict[str, dict[str, dict[str, list[int]]]] = {}
+        self.dirty: set[str] = set()
+
+        return
+
+    @classmethod
+    def load(cls, directory: Path, state_path: Path) -> "SearchIndex":
+        '''
+        a missing or outdated state starts a fresh index
+        '''
+        try:
+            with state_path.open("r") as inFile:
+                state = json.load(inFile)
+        except (OSError, ValueError):
+            return cls(directory, state_path)
+
+        if not isinstance(state, dict) or state.get("version") != SEARCH_VERSION or not directory.is_dir():
+            return cls(directory, state_path)
+
+        return cls(directory, state_path, state)
+
+    def shard(self, prefix: str) -> dict[str, dict[str, list[int]]]:
+        shard = self.shards.get(prefix)
+
+        if shard is None:
+            shard = {}
+            if prefix in self.shard_names:
+                with (self.directory / f"terms-{prefix}.json").open("r") as inFile:
+                    shard = json.load(inFile)
+            self.shards[prefix] = shard
+
+        return shard
+
+    def is_current(self, dest_rel: str, source_hash: str) -> bool:
+        return self.pages.get(dest_rel, {}).get("source_hash") == source_hash
+
+    def add_page(self, dest_rel: str, source_hash: str, title: str, terms: dict[str, list[int]]) -> None:
+        '''
+        (re)indexes a page; its postings replace any it had before
+        '''
+        self.remove_page(dest_rel)
+
+        page_id = self.free_id()
+        self.pages[dest_rel] = {"id": page_id, "source_hash": source_hash, "title": title, "terms": sorted(terms)}
+
+        key = str(page_id)
+        for term, posting in terms.items():
+            prefix = shard_prefix(term)
+            self.shard(prefix).setdefault(term, {})[key] = posting
+            self.dirty.add(prefix)
+
+        return
+
+    def remove_page(self, dest_rel: str) -> None:
+        entry = self.pages.pop(dest_rel, None)
+        if entry is None:
+            return
+
+        heapq.heappush(self.free_ids, entry["id"])
+
+        key = str(entry["id"])
+        for term in entry["terms"]:
+            prefix = shard_prefix(term)
+            postings = self.shard(prefix).get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self.shards[prefix][term]
+            self.dirty.add(prefix)
+
+        return
+
+    def free_id(self) -> int:
+        if self.free_ids:
+            return heapq.heappop(self.free_ids)
+
+        self.next_id += 1
+
+        return self.next_id - 1
+
+    def save(self, basepath: str, stats: WriteStats | None=None) -> None:
+        '''
+        writes the shards that changed, index.json & the state; files whose
+        contents came out the same aren't rewritten
+        '''
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for prefix in sorted(self.dirty):
+            path  = self.directory / f"terms-{prefix}.json"
+            shard = self.shards[prefix]
+
+            if not shard:
+                path.unlink(missing_ok=True)
+                gzip_path(path).unlink(missing_ok=True)
+                self.shard_names.discard(prefix)
+                continue
+
+            result = write_if_changed(path, lambda write: write(json.dumps(shard, sort_keys=True, separators=(",", ":"))))
+            self.shard_names.add(prefix)
+            if stats is not None:
+                stats.add(result)
+        self.dirty.clear()
+
+        slots = [None] * (max((entry["id"] for entry in self.pages.values()), default=-1) + 1)
+        for dest_rel, entry in self.pages.items():
+            slots[entry["id"]] = [page_url(basepath, dest_rel), entry["title"]]
+
+        index = {
+            "version":       SEARCH_VERSION,
+            "prefix_length": PREFIX_LENGTH,
+            "pages":         slots,
+            "shards":        sorted(self.shard_names),
+        }
+        result = write_if_changed(
+            self.directory / "index.json",
+            lambda write: write(json.dumps(index, sort_keys=True, separators=(",", ":")))
+        )
+        if stats is not None:
+            stats.add(result)
+
+        state = {
+            "version":  SEARCH_VERSION,
+            "pages":    self.pages,
+            "shards":   sorted(self.shard_names),
+            "next_id":  self.next_id,
+            "free_ids": sorted(self.free_ids),
+        }
+        temp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with temp_path.open("w") as outFile:
+            json.dump(state, outFile, sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+        return
+
+def page_url(basepath: str, dest_rel: str) -> str:
+    if dest_rel == "index.html" or dest_rel.endswith("/index.html"):
+        dest_rel = dest_rel[:-len("index.html")]
+
+    return basepath + dest_rel
+
+#---[ Index ]-------------------------------------------------------------------
+
+
+#---[ Updating ]----------------------------------------------------------------
+def update_search_index(
+    content_dir: Path,
+    docs_dir: Path,
+    pages: dict[str, dict],
+    basepath: str,
+    rendered: dict[str, PageTerms] | None=None
+) -> tuple[int, int, int, WriteStats]:
+    '''
+    brings docs/search/ up to date with `pages` (the build manifest's page
+    entries), returning (indexed, unchanged, removed, write stats)
+    - `rendered` holds the terms collected while rendering, by dest_rel; other
+      changed pages are parsed here
+    '''
+    rendered = rendered or {}
+    index = SearchIndex.load(docs_dir / SEARCH_DIR, docs_dir / SEARCH_STATE)
+
+    removed = 0
+    for dest_rel in sorted(set(index.pages) - set(pages)):
+        index.remove_page(dest_rel)
+        removed += 1
+
+    indexed = unchanged = 0
+    for dest_rel, entry in sorted(pages.items()):
+        if index.is_current(dest_rel, entry["source_hash"]):
+            unchanged += 1
+            continue
+
+        collected = rendered.get(dest_rel)
+        if collected is not None and collected.title is not None:
+            title, terms = collected.title, collected.terms
+        else:
+            with MarkdownSource(content_dir / entry["source"]) as source, source.lines() as lines:
+                page = read_page(lines)
+                if page is None:
+                    continue
+                title, _, body = page
+                terms = page_terms(body)
+
+        index.add_page(dest_rel, entry["source_hash"], title, terms)
+        indexed += 1
+
+    stats = WriteStats()
+    index.save(basepath, stats)
+
+    return indexed, unchanged, removed, stats
+
+def remove_search_index(docs_dir: Path) -> bool:
+    '''
+    removes an index left by an earlier --search build; a search/ directory
+    without SEARCH_STATE beside it isn't ours & is left alone
+    '''
+    state_path = docs_dir / SEARCH_STATE
+    if not state_path.exists():
+        return False
+
+    shutil.rmtree(docs_dir / SEARCH_DIR, ignore_errors=True)
+    state_path.unlink()
+
+    return True
+
+#---[ Updating ]----------------------------------------------------------------
@@ -0,0 +1,367 @@
+'''
+In-memory development server for `main.py serve`.
+
+    - SiteStore maps each output path ("blog/tom/index.html") to a Resource:
+      rendered pages & small static files are held as bytes, big static files
+      are streamed from disk
+    - every response carries an ETag, and a request whose If-None-Match still
+      matches is answered 304 without a body
+    - a rebuild renders into new Resources & then swaps them into the store,
+      so request threads never wait on one; they see either the old or the
+      new version of a page
+    - pages get a small script that listens on RELOAD_PATH (server-sent
+      events); ReloadBroker tells every open page which URLs changed, and a
+      page reloads itself when it's one of them (or "*")
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   http import HTTPStatus
+from   http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import mimetypes
+from   pathlib import Path
+import queue
+import shutil
+import threading
+from   urllib.parse import unquote
+
+from   manifest import hash_bytes, hash_str
+
+#---[ Global Imports ]----------------------------------------------------------
+
+RELOAD_PATH       = "/__livereload"
+KEEPALIVE         = 15.0
+MEMORY_MAX_BYTES  = 8 << 20
+
+# how far from the end of a rendered page </body> is looked for
+RELOAD_TAIL_BYTES = 1 << 16
+
+RELOAD_SCRIPT = (
+    "<script>"
+    f"new EventSource({json.dumps(RELOAD_PATH)}).onmessage = (event) => {{"
+    " const changed = JSON.parse(event.data);"
+    " const here = location.pathname.replace(/index\\.html$/, \"\");"
+    " if (changed.includes(\"*\") || changed.includes(here)) location.reload();"
+    " };"
+    "</script>"
+)
+
+
+#---[ Resources ]---------------------------------------------------------------
+class Resource:
+    '''
+    one servable file: `body` when it's held in memory, else `path` on disk
+    '''
+    __slots__ = ("body", "path", "size", "content_type", "etag")
+
+    def __init__(self, content_type: str, etag: str, body: bytes | None=None, path: Path | None=None) -> None:
+        self.body         = body
+        self.path         = path
+        self.size         = len(body) if body is not None else path.stat().st_size
+        self.content_type = content_type
+        self.etag         = etag
+
+        return
+
+    @classmethod
+    def from_bytes(cls, name: str, body: bytes) -> "Resource":
+        return cls(content_type(name), f'"{hash_bytes(body)[:32]}"', body=body)
+
+    @classmethod
+    def from_file(cls, name: str, path: Path) -> "Resource":
+        '''
+        small files are read into memory; bigger ones are tagged by size &
+        mtime instead of hashed, & streamed on each request
+        '''
+        stat = path.stat()
+        if stat.st_size <= MEMORY_MAX_BYTES:
+            return cls.from_bytes(name, path.read_bytes())
+
+        etag = f'"{hash_str(f"{stat.st_size}:{stat.st_mtime_ns}")[:32]}"'
+
+        return cls(content_type(name), etag, path=path)
+
+def content_type(name: str) -> str:
+    guessed, _ = mimetypes.guess_type(name)
+    if guessed is None:
+        return "application/octet-stream"
+    if guessed.startswith("text/") or guessed in ("application/javascript", "application/json", "image/svg+xml"):
+        return f"{guessed}; charset=utf-8"
+
+    return guessed
+
+def inject_reload_script(html: str) -> str:
+    index = html.rfind("</body>")
+    if index == -1:
+        return html + RELOAD_SCRIPT
+
+    return html[:index] + RELOAD_SCRIPT + html[index:]
+
+def inject_reload_script_into(buffer: io.BytesIO) -> None:
+    '''
+    inject_reload_script for a page encoded into `buffer`, looking at its
+    last RELOAD_TAIL_BYTES only, so a big page isn't copied to do it
+    '''
+    size  = buffer.seek(0, io.SEEK_END)
+    start = max(0, size - RELOAD_TAIL_BYTES)
+    buffer.seek(start)
+    tail = buffer.read()
+
+    index = tail.rfind(b"</body>")
+    if index == -1:
+        buffer.write(RELOAD_SCRIPT.encode())
+    else:
+        buffer.seek(start + index)
+        buffer.write(RELOAD_SCRIPT.encode() + tail[index:])
+
+    return
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    '''
+    whether an If-None-Match header names `etag` (weak comparison, as RFC 9110
+    asks for If-None-Match)
+    '''
+    if header is None:
+        return False
+
+    tags = [tag.strip() for tag in header.split(",")]
+
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+#---[ Resources ]---------------------------------------------------------------
+
+
+#---[ Site Store ]--------------------------------------------------------------
+class SiteStore:
+    '''
+    output path -> Resource, served under `basepath`
+
+    Readers take no lock: each update replaces whole dict entries, which is
+    atomic, so a reader never sees a half-built Resource.
+    '''
+    def __init__(self, basepath: str="/") -> None:
+        self.basepath  = basepath
+        self.resources: dict[str, Resource] = {}
+
+        return
+
+    def put(self, name: str, resource: Resource) -> None:
+        self.resources[name] = resource
+
+        return
+
+    def remove(self, name: str) -> bool:
+        return self.resources.pop(name, None) is not None
+
+    def url(self, name: str) -> str:
+        '''
+        the URL an output is linked by: directory URLs for index pages
+        '''
+        if name == "index.html" or name.endswith("/index.html"):
+            name = name[:-len("index.html")]
+
+        return self.basepath + name
+
+    def lookup(self, url_path: str) -> tuple[Resource | None, str | None]:
+        '''
+        (resource, None) for a URL that names an output, (None, location) for
+        a directory URL missing its trailing slash, else (None, None)
+        '''
+        if not url_path.startswith(self.basepath):
+            if url_path in ("/", self.basepath.rstrip("/")):
+                return None, self.basepath
+            return None, None
+
+        name = url_path[len(self.basepath):]
+        if name == "" or name.endswith("/"):
+            name += "index.html"
+
+        resource = self.resources.get(name)
+        if resource is None and f"{name}/index.html" in self.resources:
+            return None, url_path + "/"
+
+        return resource, None
+
+#---[ Site Store ]--------------------------------------------------------------
+
+
+#---[ Live Reload ]-------------------------------------------------------------
+class ReloadBroker:
+    '''
+    fans reload messages out to every connected event stream
+    '''
+    def __init__(self) -> None:
+        self.lock    = threading.Lock()
+        self.clients: set[queue.SimpleQueue] = set()
+
+        return
+
+    def subscribe(self) -> queue.SimpleQueue:
+        client = queue.SimpleQueue()
+        with self.lock:
+            self.clients.add(client)
+
+        return client
+
+    def unsubscribe(self, client: queue.SimpleQueue) -> None:
+        with self.lock:
+            self.clients.discard(client)
+
+        return
+
+    def publish(self, urls: list[str]) -> None:
+        message = json.dumps(sorted(set(urls)))
+        with self.lock:
+            clients = list(self.clients)
+
+        for client in clients:
+            client.put(message)
+
+        return
+
+    def close(self) -> None:
+        '''
+        ends every open stream
+        '''
+        with self.lock:
+            clients = list(self.clients)
+
+        for client in clients:
+            client.put(None)
+
+        return
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+#---[ Live Reload ]-------------------------------------------------------------
+
+
+#---[ Server ]------------------------------------------------------------------
+class SiteRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version   = "Sitegeist"
+
+    def do_GET(self) -> None:
+        self.respond(send_body=True)
+
+        return
+
+    def do_HEAD(self) -> None:
+        self.respond(send_body=False)
+
+        return
+
+    def respond(self, send_body: bool) -> None:
+        url_path = unquote(self.path.split("?", 1)[0].split("#", 1)[0])
+
+        if url_path == RELOAD_PATH and send_body:
+            self.stream_reloads()
+            return
+
+        resource, location = self.server.store.lookup(url_path)
+
+        if location is not None:
+            self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if resource is None:
+            body = b"404 Not Found\n"
+            self.send_response(HTTPStatus.NOT_FOUND)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+            return
+
+        if etag_matches(self.headers.get("If-None-Match"), resource.etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", resource.etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", resource.content_type)
+        self.send_header("Content-Length", str(resource.size))
+        self.send_header("ETag", resource.etag)
+        # always revalidate, so an edit shows up on the next load as a 200
+        # & everything else is a cheap 304
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        if not send_body:
+            return
+
+        if resource.body is not None:
+            self.wfile.write(resource.body)
+        else:
+            with resource.path.open("rb") as inFile:
+                shutil.copyfileobj(inFile, self.wfile)
+
+        return
+
+    def stream_reloads(self) -> None:
+        '''
+        holds the connection open as a text/event-stream, sending a message
+        per rebuild & a comment every KEEPALIVE seconds so dead clients are
+        noticed
+        '''
+        broker = self.server.broker
+        client = broker.subscribe()
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            self.wfile.write(b"retry: 1000\n\n")
+            self.wfile.flush()
+            while True:
+                try:
+                    message = client.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    if message is None:
+                        break
+                    self.wfile.write(f"data: {message}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            broker.unsubscribe(client)
+
+        return
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+        return
+
+class SiteServer(ThreadingHTTPServer):
+    '''
+    one thread per connection, so slow clients & open event streams never
+    hold up other requests
+    '''
+    daemon_threads     = True
+    request_queue_size = 128
+
+    def __init__(self, address: tuple[str, int], store: SiteStore, broker: ReloadBroker, quiet: bool=False) -> None:
+        self.store  = store
+        self.broker = broker
+        self.quiet  = quiet
+        super().__init__(address, SiteRequestHandler)
+
+        return
+
+#---[ Server ]------------------------------------------------------------------
@@ -0,0 +1,262 @@
+'''
+Sharded builds, for spreading one site's pages over several machines (or
+processes).
+
+`main.py --shard i/N` builds only the pages of shard i into their own output
+directory (SHARD_DIR/i-of-N/ unless --output says otherwise), with a partial
+build manifest that records which shard it is. A page belongs to the shard
+picked by a stable hash of its markdown path under content/, so every
+machine agrees on the split without talking to the others. Static files are
+synced by every shard, so each shard's pages see the same asset names.
+
+`main.py merge` then checks the shards fit together & copies them into the
+final docs/ tree with one manifest covering everything. It refuses when:
+    - a shard is missing, repeated, or was split N ways with a different N
+    - the shards were built with different settings (template, basepath, or
+      fingerprinted assets)
+    - a page was built by more than one shard
+    - an output file is in several shards but differs between them
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+import filecmp
+import hashlib
+from   pathlib import Path
+
+from   assets   import fast_copy
+from   deps     import CONTENT_PREFIX, STATIC_PREFIX
+from   manifest import MANIFEST_NAME, BuildManifest
+from   walker   import walk_files
+
+#---[ Global Imports ]----------------------------------------------------------
+
+SHARD_DIR = ".ssg-shards"
+
+
+class ShardSpec:
+    '''
+    shard `index` (1-based) of `count`
+    '''
+    def __init__(self, index: int, count: int) -> None:
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"shard must be i/N with 1 <= i <= N, got {index}/{count}")
+
+        self.index = index
+        self.count = count
+
+        return
+
+    @classmethod
+    def parse(cls, text: str) -> "ShardSpec":
+        index, separator, count = text.partition("/")
+        if not separator or not index.strip().isdigit() or not count.strip().isdigit():
+            raise ValueError(f"shard must look like i/N (e.g. 2/4), got {text!r}")
+
+        return cls(int(index), int(count))
+
+    @property
+    def name(self) -> str:
+        return f"{self.index}-of-{self.count}"
+
+    def owns(self, src_rel: str) -> bool:
+        return shard_of(src_rel, self.count) == self.index
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ShardSpec):
+            return NotImplemented
+
+        return (self.index, self.count) == (other.index, other.count)
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+def shard_of(src_rel: str, count: int) -> int:
+    '''
+    the 1-based shard a markdown path (relative to content/) belongs to; the
+    same on every machine & Python process, unlike hash()
+    '''
+    digest = hashlib.sha256(src_rel.encode("utf-8")).digest()
+
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+#---[ Merging ]-----------------------------------------------------------------
+class MergeError(Exception):
+    def __init__(self, conflicts: list[str]) -> None:
+        super().__init__(f"{len(conflicts)} conflict(s)")
+        self.conflicts = conflicts
+
+        return
+
+    def __str__(self) -> str:
+        return "\n".join(self.conflicts)
+
+class MergeStats:
+    def __init__(self) -> None:
+        self.shards = 0
+        self.pages  = 0
+        self.files  = 0
+        self.shared = 0
+
+        return
+
+    def __str__(self) -> str:
+        return (
+            f"merged {self.shards} shard(s): {self.pages} pages, {self.files} files copied "
+            f"({self.shared} identical in several shards)"
+        )
+
+def load_shards(shard_dirs: list[Path]) -> list[tuple[Path, BuildManifest, ShardSpec]]:
+    '''
+    each shard directory's manifest & shard, in shard order
+
+    Raises:
+        - `MergeError` unless the directories hold every shard of one split
+          exactly once
+    '''
+    conflicts = []
+    shards = []
+
+    for shard_dir in shard_dirs:
+        manifest = BuildManifest.load(shard_dir / MANIFEST_NAME)
+        if manifest.shard is None:
+            conflicts.append(f"{shard_dir}: not a shard build (no shard recorded in {MANIFEST_NAME})")
+            continue
+        shards.append((shard_dir, manifest, ShardSpec(*manifest.shard)))
+
+    counts = {shard.count for _, _, shard in shards}
+    if len(counts) > 1:
+        conflicts.append(f"shards were split different ways: {', '.join(f'{count} shards' for count in sorted(counts))}")
+    elif counts:
+        count = counts.pop()
+        seen = {}
+        for shard_dir, _, shard in shards:
+            if shard.index in seen:
+                conflicts.append(f"shard {shard} is in both {seen[shard.index]} and {shard_dir}")
+            seen[shard.index] = shard_dir
+        missing = [str(index) for index in range(1, count + 1) if index not in seen]
+        if missing:
+            conflicts.append(f"missing shard(s) {', '.join(missing)} of {count}")
+    elif not conflicts:
+        conflicts.append("no shards to merge")
+
+    if conflicts:
+        raise MergeError(conflicts)
+
+    return sorted(shards, key=lambda shard: shard[2].index)
+
+def build_settings(shards: list[tuple[Path, BuildManifest, ShardSpec]]) -> dict[str, str]:
+    '''
+    the settings every page was built with ("template.html", "@basepath", ...)
+    - the inputs of the dependency graph that aren't files under content/ or
+      static/
+
+    Raises:
+        - `MergeError` if two pages anywhere were built with different values,
+          or one page with a setting & another without
+    '''
+    pages = [
+        (inputs, shard)
+        for _, manifest, shard in shards
+        for dest_rel, inputs in manifest.deps.edges.items()
+        if dest_rel in manifest.pages
+    ]
+    names = {name for inputs, _ in pages for name in inputs if not name.startswith((CONTENT_PREFIX, STATIC_PREFIX))}
+
+    # name -> value (None when a page didn't have the setting) -> the first
+    # shard that used it
+    values: dict[str, dict[str | None, ShardSpec]] = {name: {} for name in names}
+    for inputs, shard in pages:
+        for name in names:
+            values[name].setdefault(inputs.get(name), shard)
+
+    conflicts = [
+        f"{name} differs between shards: " + ", ".join(f"{value!r} (shard {shard})" for value, shard in used.items())
+        for name, used in sorted(values.items())
+        if len(used) > 1
+    ]
+    if conflicts:
+        raise MergeError(conflicts)
+
+    return {name: next(iter(used)) for name, used in values.items()}
+
+def plan_merge(shards: list[tuple[Path, BuildManifest, ShardSpec]]) -> tuple[dict[str, Path], MergeStats]:
+    '''
+    output path -> the shard file to copy there
+
+    Raises:
+        - `MergeError` for pages built by several shards, or files that
+          several shards have but disagree on
+    '''
+    stats = MergeStats()
+    stats.shards = len(shards)
+
+    conflicts = []
+    owners: dict[str, str] = {}
+    for _, manifest, shard in shards:
+        for dest_rel in manifest.pages:
+            if dest_rel in owners:
+                conflicts.append(f"{dest_rel}: built by both shard {owners[dest_rel]} and shard {shard}")
+            owners[dest_rel] = str(shard)
+    stats.pages = len(owners)
+
+    plan: dict[str, Path] = {}
+    for shard_dir, _, _ in shards:
+        for path, rel in walk_files(shard_dir):
+            if rel in (MANIFEST_NAME, MANIFEST_NAME + ".tmp"):
+                continue
+
+            first = plan.get(rel)
+            if first is None:
+                plan[rel] = path
+            elif filecmp.cmp(first, path, shallow=False):
+                stats.shared += 1
+            else:
+                conflicts.append(f"{rel}: differs between {first.parent} and {path.parent}")
+
+    if conflicts:
+        raise MergeError(conflicts)
+
+    stats.files = len(plan)
+
+    return plan, stats
+
+class ShardMerge:
+    '''
+    shard builds checked to fit together, ready to be copied into one site
+    - `settings` are the settings the pages were built with (see
+      build_settings)
+
+    Raises:
+        - `MergeError` listing every conflict found
+    '''
+    def __init__(self, shard_dirs: list[Path]) -> None:
+        self.shards   = load_shards(shard_dirs)
+        self.settings = build_settings(self.shards)
+        self.plan, self.stats = plan_merge(self.shards)
+
+        return
+
+    def copy_to(self, output_dir: Path) -> BuildManifest:
+        '''
+        copies the shards into `output_dir` (expected to be empty), returning
+        the merged manifest, unsaved
+        - files keep their mtimes, so the [size, mtime, hash] recorded for
+          each page still holds & later --incremental builds don't re-read
+          them
+        '''
+        for rel, src_path in self.plan.items():
+            dest_path = output_dir / rel
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            fast_copy(src_path, dest_path)
+
+        merged = BuildManifest(output_dir / MANIFEST_NAME)
+        for _, manifest, _ in self.shards:
+            merged.pages.update(manifest.pages)
+            merged.deps.edges.update(manifest.deps.edges)
+            for rel, entry in manifest.assets.items():
+                merged.assets.setdefault(rel, entry)
+
+        return merged
+
+#---[ Merging ]-----------------------------------------------------------------
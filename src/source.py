@@ -0,0 +1,220 @@
+'''
+Reading markdown sources.
+
+MarkdownSource opens a file once for both hashing & rendering. Files of at
+least MMAP_MIN_BYTES are memory-mapped rather than read: their bytes stay in
+the page cache instead of being copied into the process, the hash is taken
+straight off the mapping, & lines are decoded from it a buffer at a time as
+the block scanner asks for them. Pages already hashed or read are handed
+back to the kernel (MADV_DONTNEED) every RELEASE_BYTES, so they don't pile
+up in the process's resident set either. A tens-of-MB generated page costs
+about one block of memory to render, not several copies of the whole file.
+
+read_page pulls the title & front matter off the top of a page's lines
+without looking any further, and hands back the rest of the lines untouched.
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Iterable, Iterator
+import hashlib
+import io
+import itertools
+import mmap
+import os
+from   pathlib import Path
+from   typing import TextIO
+
+from   utils import extract_title
+
+#---[ Global Imports ]----------------------------------------------------------
+
+MMAP_MIN_BYTES   = 1 << 20
+READ_BUFFER_SIZE = 1 << 16
+RELEASE_BYTES    = 4 << 20
+
+FRONT_MATTER_FENCE = "---"
+
+
+#---[ Sources ]-----------------------------------------------------------------
+class MappedReader(io.RawIOBase):
+    '''
+    a read-only raw stream over a buffer (e.g. an mmap), so io's buffering &
+    decoding layers can read from it without the buffer being copied first
+    '''
+    def __init__(self, buffer) -> None:
+        super().__init__()
+        self.buffer   = buffer
+        self.view     = memoryview(buffer)
+        self.position = 0
+        self.released = 0
+
+        return
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        size = min(len(target), len(self.view) - self.position)
+        target[:size] = self.view[self.position:self.position + size]
+        self.position += size
+
+        if self.position - self.released >= RELEASE_BYTES:
+            self.released = release_pages(self.buffer, self.released, self.position)
+
+        return size
+
+    def close(self) -> None:
+        # the mmap can't be closed while a view of it is alive
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+        return
+
+class MarkdownSource:
+    '''
+    a markdown file opened for one render; use it as a context manager
+    - small files are read whole, since mapping them costs more than it saves
+    - streams from `lines()` can't be read once the source is closed
+    '''
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+        with path.open("rb") as inFile:
+            self.size = os.fstat(inFile.fileno()).st_size
+            if self.size >= MMAP_MIN_BYTES:
+                self.data = mmap.mmap(inFile.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    self.data.madvise(mmap.MADV_SEQUENTIAL)
+            else:
+                self.data = inFile.read()
+
+        self.readers: list[MappedReader] = []
+
+        return
+
+    @property
+    def is_mapped(self) -> bool:
+        return isinstance(self.data, mmap.mmap)
+
+    def hash(self) -> str:
+        '''
+        same as manifest.hash_file, without reading the file again
+        '''
+        if not self.is_mapped:
+            return hashlib.sha256(self.data).hexdigest()
+
+        digest = hashlib.sha256()
+        with memoryview(self.data) as view:
+            for start in range(0, self.size, RELEASE_BYTES):
+                digest.update(view[start:start + RELEASE_BYTES])
+                release_pages(self.data, start, start + RELEASE_BYTES)
+
+        return digest.hexdigest()
+
+    def lines(self) -> TextIO:
+        '''
+        the file as text, decoded exactly as path.open("r") would
+        '''
+        if not self.is_mapped:
+            # BytesIO shares a bytes object's buffer rather than copying it
+            return io.TextIOWrapper(io.BytesIO(self.data))
+
+        reader = MappedReader(self.data)
+        self.readers.append(reader)
+
+        return io.TextIOWrapper(io.BufferedReader(reader, READ_BUFFER_SIZE))
+
+    def close(self) -> None:
+        if self.is_mapped:
+            for reader in self.readers:
+                reader.close()
+            self.data.close()
+
+        return
+
+    def __enter__(self) -> "MarkdownSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+        return
+
+def release_pages(buffer, start: int, end: int) -> int:
+    '''
+    drops the pages of an mmap between `start` & `end` from the process (the
+    kernel still caches them, & reading them again just faults them back in),
+    returning the offset released up to; a no-op for other buffers
+    '''
+    if not isinstance(buffer, mmap.mmap) or not hasattr(mmap, "MADV_DONTNEED"):
+        return start
+
+    start = start - start % mmap.PAGESIZE
+    end   = min(end, len(buffer))
+    end   = end - end % mmap.PAGESIZE
+    if end > start:
+        buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    return max(start, end)
+
+#---[ Sources ]-----------------------------------------------------------------
+
+
+#---[ Page Header ]-------------------------------------------------------------
+def read_page(lines: Iterable[str]) -> tuple[str, dict[str, str], Iterator[str]] | None:
+    '''
+    splits a page into (title, front matter, body lines), reading no further
+    than the first line of the body; None for an empty page
+    - front matter is an optional block of "key: value" lines between two
+      "---" lines at the very top of the page
+    - a "title" key in it names the page; otherwise the body's first line
+      has to be a "# heading", as extract_title expects
+
+    Raises:
+        - `ValueError` for a page without a title, or malformed front matter
+    '''
+    lines = iter(lines)
+    first_line = next(lines, "")
+    front_matter = {}
+
+    if first_line.rstrip("\r\n") == FRONT_MATTER_FENCE:
+        front_matter = parse_front_matter(lines)
+        first_line = next(lines, "")
+        while first_line.strip() == "" and first_line != "":
+            first_line = next(lines, "")
+
+    if first_line == "":
+        return None
+
+    title = front_matter["title"] if "title" in front_matter else extract_title(first_line)
+
+    return title, front_matter, itertools.chain([first_line], lines)
+
+def parse_front_matter(lines: Iterator[str]) -> dict[str, str]:
+    '''
+    reads "key: value" lines up to the closing "---"
+    - blank lines & lines starting with "#" are skipped
+    - a value wrapped in matching quotes has them removed
+    '''
+    front_matter = {}
+
+    for line in lines:
+        line = line.strip()
+        if line == FRONT_MATTER_FENCE:
+            return front_matter
+        if not line or line.startswith("#"):
+            continue
+
+        key, separator, value = line.partition(":")
+        if not separator or not key.strip():
+            raise ValueError(f"front matter line is not 'key: value': {line!r}")
+
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+            value = value[1:-1]
+        front_matter[key.strip()] = value
+
+    raise ValueError(f"front matter is missing its closing {FRONT_MATTER_FENCE!r}")
+
+#---[ Page Header ]-------------------------------------------------------------
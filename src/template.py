@@ -0,0 +1,205 @@
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Callable
+import re
+from   pathlib import Path
+
+from   manifest import hash_str
+from   urls     import UrlRewriter
+
+#---[ Global Imports ]----------------------------------------------------------
+
+# names every page fills in itself
+PAGE_NAMES = ("Title", "Content")
+
+# names filled in once per build
+BUILD_NAMES = ("Basepath",)
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
+NAME_PATTERN        = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+#---[ Template ]----------------------------------------------------------------
+class Template:
+    '''
+    A template compiled into its literal segments & placeholder slots.
+
+    `segments` always has one more entry than `slots`: rendering is
+        segments[0] + value(slots[0]) + segments[1] + ... + segments[-1]
+    so a page costs a single join over precomputed pieces.
+
+    `url_rewriter` is the rewriter the template's own URLs went through, if
+    any; pages rendered into it use the same one.
+    '''
+    def __init__(self,
+        segments: list[str],
+        slots: list[str],
+        path: Path | None=None,
+        fingerprint: str="",
+        url_rewriter: UrlRewriter | None=None
+    ) -> None:
+        if len(segments) != len(slots) + 1:
+            raise TemplateError("Error: a template needs exactly one more segment than slots")
+
+        self.segments     = segments
+        self.slots        = slots
+        self.path         = path
+        self.fingerprint  = fingerprint
+        self.url_rewriter = url_rewriter
+
+        return
+
+    @property
+    def names(self) -> set[str]:
+        return set(self.slots)
+
+    def partial(self, context: dict[str, str]) -> "Template":
+        '''
+        fills in the slots named in `context` & merges the surrounding literals,
+        returning a template with only the remaining slots
+        - used for values that are the same for every page in a build
+        '''
+        segments = [self.segments[0]]
+        slots    = []
+
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            if slot in context:
+                segments[-1] += context[slot] + segment
+            else:
+                slots.append(slot)
+                segments.append(segment)
+
+        # bound values are part of what the rendered pages depend on
+        bound = "".join(f"\0{name}\0{context[name]}" for name in sorted(context))
+        fingerprint = hash_str(self.fingerprint + bound)
+
+        return Template(segments, slots, self.path, fingerprint, self.url_rewriter)
+
+    def with_url_rewriter(self, url_rewriter: UrlRewriter) -> "Template":
+        '''
+        the template with its own URLs rewritten, as if `url_rewriter` had
+        been passed to compile_template
+        - only for a template compiled without one, & before partial(), so
+          the values it fills in aren't rewritten
+        '''
+        if self.url_rewriter is not None:
+            raise TemplateError("Error: the template's URLs have already been rewritten")
+
+        segments = [url_rewriter.rewrite_html(segment) for segment in self.segments]
+
+        return Template(segments, self.slots, self.path, self.fingerprint, url_rewriter)
+
+    def render(self, context: dict[str, "str | Callable"]) -> str:
+        pieces = []
+        self.render_into(pieces.append, context)
+
+        return "".join(pieces)
+
+    def render_into(self,
+        write: Callable[[str], object],
+        context: dict[str, "str | Callable"]
+    ) -> None:
+        '''
+        writes the segments & slot values to `write` in order
+        - a context value can be a callable taking `write`, so e.g. a node tree
+          renders straight into the same buffer instead of into its own string
+        '''
+        missing = self.names - context.keys()
+        if missing:
+            raise TemplateError(f"Error: no value for template placeholder(s): {', '.join(sorted(missing))}")
+
+        write(self.segments[0])
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            value = context[slot]
+            if callable(value):
+                value(write)
+            else:
+                write(value)
+            write(segment)
+
+        return
+
+    def __repr__(self) -> str:
+        return f"Template(path: {self.path}, slots: {self.slots})"
+
+#---[ Template ]----------------------------------------------------------------
+
+
+#---[ Template Compilation ]----------------------------------------------------
+def compile_template(
+    text: str,
+    known_names: set[str] | None=None,
+    path: Path | None=None,
+    fingerprint: str="",
+    url_rewriter: UrlRewriter | None=None
+) -> Template:
+    '''
+    Splits template text on its `{{ Name }}` placeholders.
+
+    Raises `TemplateError` for:
+        - a placeholder whose name isn't an identifier (e.g. `{{ }}`)
+        - unbalanced `{{` / `}}` outside of a placeholder
+        - a name not in `known_names` (when given), so typos fail the build
+          instead of being left in the output
+
+    With `url_rewriter`, the template's own href="/..." & src="/..." URLs are
+    rewritten here once instead of on every rendered page.
+    '''
+    segments = []
+    offsets  = []
+    slots    = []
+
+    location = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        name = match.group(1).strip()
+
+        if not NAME_PATTERN.fullmatch(name):
+            raise TemplateError(
+                f"Error: invalid placeholder {match.group(0)!r} on line {_line_number(text, match.start())}"
+            )
+        if known_names is not None and name not in known_names:
+            raise TemplateError(
+                f"Error: unknown placeholder {match.group(0)!r} on line {_line_number(text, match.start())}"
+            )
+
+        segments.append(text[location:match.start()])
+        offsets.append(location)
+        slots.append(name)
+        location = match.end()
+
+    segments.append(text[location:])
+    offsets.append(location)
+
+    for segment, offset in zip(segments, offsets):
+        for brace in ("{{", "}}"):
+            index = segment.find(brace)
+            if index != -1:
+                raise TemplateError(
+                    f"Error: unmatched {brace!r} on line {_line_number(text, offset + index)}"
+                )
+
+    if url_rewriter:
+        segments = [url_rewriter.rewrite_html(segment) for segment in segments]
+
+    return Template(segments, slots, path, fingerprint, url_rewriter)
+
+def load_template(
+    path: Path,
+    known_names: set[str] | None=None,
+    url_rewriter: UrlRewriter | None=None
+) -> Template:
+    with path.open("r") as inFile:
+        text = inFile.read()
+
+    if text == "":
+        raise TemplateError(f"Error: template {path} is empty")
+
+    return compile_template(text, known_names, path, hash_str(text), url_rewriter)
+
+def _line_number(text: str, index: int) -> int:
+    return text.count("\n", 0, index) + 1
+
+#---[ Template Compilation ]----------------------------------------------------
@@ -1,22 +1,58 @@
 #---[ Imports ]-----------------------------------------------------------------
+import contextlib
+import gzip
+import http.client
+import io
+import itertools
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
 import unittest
+from   pathlib import Path, PurePosixPath
+
+import main
 
 from   textnode   import TextNode, TextType
 from   htmlnode   import HTMLNode
 from   leafnode   import LeafNode
 from   parentnode import ParentNode
 from   block      import BlockType
+from   manifest   import MANIFEST_NAME, BuildManifest, hash_file, hash_str
+from   assets     import fast_copy, fingerprinted_name, sync_static, update_assets
+from   blockcache import BlockCache
+from   compress   import compress_outputs, gzip_file, gzip_path, remove_compressed
+from   deps       import DependencyGraph, asset_inputs, page_inputs
+from   main       import PageBuildError, collect_pages, generate_pages_incrementally, render_pages
+from   template   import Template, TemplateError, compile_template, load_template
+from   urls       import UrlRewriter
+from   parsecache import ParseCache, parser_stamp
+from   patterns   import PATTERNS
+from   profiler   import NULL_PROFILER, Profiler
+from   search     import SEARCH_DIR, SEARCH_STATE, SearchIndex, page_terms, shard_prefix, update_search_index
+from   source     import MMAP_MIN_BYTES, MarkdownSource, read_page
+from   shard      import MergeError, ShardMerge, ShardSpec, shard_of
+from   serve      import RELOAD_SCRIPT, ReloadBroker, Resource, SiteServer, SiteStore, etag_matches, inject_reload_script, inject_reload_script_into
+from   walker     import RACY_NS, DirListings, PathFilter, walk_files
+from   watch      import PollingWatcher, make_watcher, wait_for_changes
+from   writer     import write_if_changed
 
 from   utils import (
     text_node_to_html_node,
     extract_markdown_links,
     extract_markdown_images,
+    split_nodes_delimiter,
     split_nodes_image,
     split_nodes_link,
     text_to_text_nodes,
     markdown_to_blocks,
     block_to_block_type,
-    markdown_to_html_node
+    markdown_to_html_node,
+    iter_blocks,
+    render_markdown_into
 )
 
 #---[ Imports ]-----------------------------------------------------------------
@@ -216,6 +252,62 @@ class TestParentNode(unittest.TestCase):
 
         return
 
+class TestRenderInto(unittest.TestCase):
+    def test_render_into_matches_to_html(self) -> None:
+        print("[ test ] render_into() chunks join to to_html()")
+
+        node = ParentNode("div", [
+            ParentNode("p", [LeafNode("b", "bold"), LeafNode(None, " text")], {"class": "x"}),
+            LeafNode("img", "", {"src": "/a.png", "alt": "a"}),
+        ])
+
+        chunks = []
+        node.render_into(chunks.append)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), node.to_html())
+        self.assertEqual(
+            node.to_html(),
+            '<div><p class="x"><b>bold</b> text</p><img src="/a.png" alt="a" /></div>'
+        )
+
+        return
+
+    def test_wide_tree(self) -> None:
+        print("[ test ] render_into() handles a 10k item list")
+
+        items = [LeafNode("li", f"item {i}") for i in range(10_000)]
+        node = ParentNode("ul", items)
+
+        html = node.to_html()
+        self.assertTrue(html.startswith("<ul><li>item 0</li><li>item 1</li>"))
+        self.assertTrue(html.endswith("<li>item 9999</li></ul>"))
+
+        return
+
+    def test_render_into_raises_before_writing(self) -> None:
+        print("[ test ] render_into() validates before writing")
+
+        chunks = []
+        with self.assertRaises(ValueError):
+            ParentNode("p", []).render_into(chunks.append)
+        self.assertEqual(chunks, [])
+
+        return
+
+    def test_template_streams_content(self) -> None:
+        print("[ test ] Template render_into() streams callable values")
+
+        template = compile_template("<article>{{ Content }}</article>")
+        node = ParentNode("p", [LeafNode("i", "hi")])
+
+        chunks = []
+        template.render_into(chunks.append, {"Content": node.render_into})
+
+        self.assertEqual("".join(chunks), "<article><p><i>hi</i></p></article>")
+
+        return
+
 class TestTextNode(unittest.TestCase):
     # Node Creation Tests
     def test_create_text(self) -> None:
@@ -329,6 +421,111 @@ class TestTextNode(unittest.TestCase):
 
         return
 
+def fixed_point_text_to_text_nodes(text: str) -> list[TextNode]:
+    '''
+    the split-until-nothing-changes loop text_to_text_nodes used to be, kept as
+    the reference for the single-pass scanner
+    '''
+    node_list = [TextNode(text)]
+    prev_list = []
+
+    while prev_list != node_list:
+        prev_list = node_list.copy()
+
+        node_list = split_nodes_delimiter(node_list, "**", TextType.BOLD)
+        node_list = split_nodes_delimiter(node_list, "_", TextType.ITALIC)
+        node_list = split_nodes_delimiter(node_list, "`", TextType.CODE)
+        node_list = split_nodes_image(node_list)
+        node_list = split_nodes_link(node_list)
+
+    return node_list
+
+def fuzzed_inline_corpus(seed: int, count: int) -> list[str]:
+    '''
+    random well formed inline markdown: plain words mixed with bold, italic,
+    code, image & link spans that don't nest or overlap
+    '''
+    rng = random.Random(seed)
+    words = ["doggo", "is", "a", "good", "boy", "Tom", "Bombadil", "42", "x.y", "(ok)", "!", "]", ":"]
+
+    def plain() -> str:
+        return " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+
+    corpus = []
+    for i in range(count):
+        pieces = []
+        for j in range(rng.randint(0, 8)):
+            kind = rng.randrange(6)
+            if kind == 0:
+                pieces.append(f"**{plain()}**")
+            elif kind == 1:
+                pieces.append(f"_{plain()}_")
+            elif kind == 2:
+                pieces.append(f"`{plain()}`")
+            elif kind == 3:
+                pieces.append(f"![{plain()}](https://img.example.com/{i}/{j}.png)")
+            elif kind == 4:
+                pieces.append(f"[{plain()}](/pages/{i}/{j})")
+            else:
+                pieces.append(plain())
+            if rng.random() < 0.6:
+                pieces.append(" " + plain() + " ")
+
+        corpus.append("".join(pieces))
+
+    return corpus
+
+class TestInlineScanner(unittest.TestCase):
+    def test_matches_fixed_point_on_unit_tests(self) -> None:
+        print("[ test ] single-pass inline scanner matches the fixed-point splitter")
+
+        tests = [
+            "This is **text** with an _italic_ word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)",
+            "This is text with an ![image](https://i.imgur.com/zjjcJKZ.png) and another ![second image](https://i.imgur.com/3elNhQu.png)",
+            "This is text with an [image](https://i.imgur.com/zjjcJKZ.png) and another [second image](https://i.imgur.com/3elNhQu.png)",
+            "This is **bolded** paragraph text in a p tag here",
+            "This is another paragraph with _italic_ text and `code` here",
+            "**bold** at the start and **more bold** at the end **too**",
+            "plain text only",
+            "",
+        ]
+        for test in tests:
+            self.assertEqual(text_to_text_nodes(test), fixed_point_text_to_text_nodes(test), test)
+
+        return
+
+    def test_matches_fixed_point_on_fuzzed_corpus(self) -> None:
+        print("[ test ] single-pass inline scanner matches on a fuzzed corpus")
+
+        for test in fuzzed_inline_corpus(seed=1234, count=500):
+            self.assertEqual(text_to_text_nodes(test), fixed_point_text_to_text_nodes(test), test)
+
+        return
+
+    def test_unclosed_delimiters_are_text(self) -> None:
+        print("[ test ] single-pass inline scanner leaves unclosed spans as text")
+
+        self.assertEqual(
+            text_to_text_nodes("snake_case and 2 * 3 and ![broken](link and `tick"),
+            [TextNode("snake_case and 2 * 3 and ![broken](link and `tick")]
+        )
+
+        return
+
+    def test_code_contents_not_scanned(self) -> None:
+        print("[ test ] single-pass inline scanner doesn't parse inside code")
+
+        self.assertEqual(
+            text_to_text_nodes("run `a **b** _c_` now"),
+            [
+                TextNode("run "),
+                TextNode("a **b** _c_", TextType.CODE),
+                TextNode(" now"),
+            ]
+        )
+
+        return
+
 class TestTextNodeToHtmlNode(unittest.TestCase):
     def test_text_to_html(self) -> None:
         print("[ test ] TextNode <Text> -> HTMLNode")
@@ -451,6 +648,30 @@ class TestImageLinkExtraction(unittest.TestCase):
             new_nodes,
         )
 
+    def test_split_repeated_links(self):
+        print("[ test ] split links uses match spans for repeated links")
+
+        node = TextNode("[home](/) and [home](/) again", TextType.TEXT)
+        new_nodes = split_nodes_link([node])
+
+        self.assertListEqual(
+            [
+                TextNode("home", TextType.LINK, "/"),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("home", TextType.LINK, "/"),
+                TextNode(" again", TextType.TEXT),
+            ],
+            new_nodes,
+        )
+
+    def test_pattern_registry(self):
+        print("[ test ] parser patterns are compiled once")
+
+        for name, pattern in PATTERNS.items():
+            self.assertIsInstance(pattern, re.Pattern, name)
+
+        self.assertEqual(extract_markdown_links("[a](b) and [c](d)"), [("a", "b"), ("c", "d")])
+
 class TestMarkdownToBlocks(unittest.TestCase):
     def test_markdown_to_blocks(self) -> None:
         test_markdown = """
@@ -651,6 +872,1690 @@ the **same** even with inline stuff
         return
 
 
+class TestStreamingBlocks(unittest.TestCase):
+    def test_fenced_code_keeps_blank_lines(self) -> None:
+        print("[ test ] iter_blocks() keeps blank lines inside a fence")
+
+        lines = ["para\n", "\n", "```\n", "first\n", "\n", "\n", "second\n", "```\n", "\n", "after\n"]
+
+        self.assertEqual(
+            list(iter_blocks(lines)),
+            ["para", "```\nfirst\n\n\nsecond\n```", "after"]
+        )
+
+        return
+
+    def test_unclosed_fence_ends_at_eof(self) -> None:
+        print("[ test ] iter_blocks() closes a fence left open at the end of the document")
+
+        lines = ["para\n", "\n", "```\n", "code\n", "\n", "more code\n"]
+
+        self.assertEqual(list(iter_blocks(lines)), ["para", "```\ncode\n\nmore code\n```"])
+
+        chunks = []
+        render_markdown_into(iter(lines), chunks.append)
+        self.assertEqual("".join(chunks), "<div><p>para</p><pre><code>code\n\nmore code\n</code></pre></div>")
+
+        return
+
+    def test_blocks_are_read_lazily(self) -> None:
+        print("[ test ] iter_blocks() only reads as far as the block it yields")
+
+        source = io.StringIO("# Title\n\nfirst paragraph\n\nsecond paragraph\n")
+        blocks = iter_blocks(source)
+
+        self.assertEqual(next(blocks), "# Title")
+        self.assertEqual(source.readline(), "first paragraph\n")
+        self.assertEqual(list(blocks), ["second paragraph"])
+
+        return
+
+    def test_render_markdown_into_matches_tree(self) -> None:
+        print("[ test ] render_markdown_into() matches markdown_to_html_node()")
+
+        md = (
+            "# Title\n\nsome **bold** [link](/a)\n\n```\ncode\n\nmore code\n```\n\n"
+            "- one\n- two\n\n> quoted\r\n> lines\n\n1. first\n2. second\n"
+        )
+
+        chunks = []
+        render_markdown_into(io.StringIO(md), chunks.append)
+        self.assertEqual("".join(chunks), markdown_to_html_node(md).to_html())
+
+        rewriter = UrlRewriter("/SSG/")
+        chunks = []
+        render_markdown_into(io.StringIO(md), chunks.append, rewriter)
+        self.assertEqual("".join(chunks), markdown_to_html_node(md).to_html(rewriter))
+        self.assertIn('href="/SSG/a"', "".join(chunks))
+
+        return
+
+    def test_render_markdown_into_empty(self) -> None:
+        print("[ test ] render_markdown_into() rejects a document with no blocks")
+
+        chunks = []
+        with self.assertRaises(ValueError):
+            render_markdown_into(iter(["\n", "   \n"]), chunks.append)
+        self.assertEqual(chunks, [])
+
+        return
+
+
+class TestBuildManifest(unittest.TestCase):
+    def test_page_stale_reasons(self) -> None:
+        print("[ test ] BuildManifest detects changed page inputs")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src_path = Path(temp_dir) / "index.md"
+            src_path.write_text("# Title\n\nbody\n")
+            src_hash = hash_file(src_path)
+
+            def stale(src_hash: str, template_hash: str, basepath: str) -> bool:
+                return bool(manifest.page_stale_reasons("index.html", "index.md", src_hash, template_hash, basepath))
+
+            manifest = BuildManifest(Path(temp_dir) / "manifest.json")
+            self.assertTrue(stale(src_hash, "t", "/"))
+
+            manifest.record_page("index.html", src_path, "index.md", src_hash, "t", "/")
+            self.assertFalse(stale(src_hash, "t", "/"))
+            self.assertTrue(stale(hash_str("other"), "t", "/"))
+            self.assertTrue(stale(src_hash, "t2", "/"))
+            self.assertTrue(stale(src_hash, "t", "/SSG/"))
+
+        return
+
+    def test_save_and_load(self) -> None:
+        print("[ test ] BuildManifest round trips through disk")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src_path = Path(temp_dir) / "index.md"
+            src_path.write_text("# Title\n")
+            src_hash = hash_file(src_path)
+
+            manifest = BuildManifest(Path(temp_dir) / "manifest.json")
+            manifest.record_page("index.html", src_path, "index.md", src_hash, "t", "/")
+            manifest.save()
+
+            loaded = BuildManifest.load(Path(temp_dir) / "manifest.json")
+            self.assertEqual(loaded.pages, manifest.pages)
+            self.assertEqual(loaded.deps.edges, manifest.deps.edges)
+            self.assertEqual(loaded.source_hash("index.html", src_path), src_hash)
+
+            # garbage on disk is the same as no manifest at all
+            (Path(temp_dir) / "manifest.json").write_text("not json")
+            self.assertEqual(BuildManifest.load(Path(temp_dir) / "manifest.json").pages, {})
+
+        return
+
+    def test_has_changes(self) -> None:
+        print("[ test ] BuildManifest only reports changes when an entry changed")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src_path = Path(temp_dir) / "index.md"
+            src_path.write_text("# Title\n")
+            src_hash = hash_file(src_path)
+
+            manifest = BuildManifest(Path(temp_dir) / "manifest.json")
+            self.assertFalse(manifest.has_changes())
+            manifest.record_page("index.html", src_path, "index.md", src_hash, "t", "/")
+            self.assertTrue(manifest.has_changes())
+            manifest.save()
+            self.assertFalse(manifest.has_changes())
+
+            # recording the same thing again isn't a change
+            loaded = BuildManifest.load(Path(temp_dir) / "manifest.json")
+            loaded.record_page("index.html", src_path, "index.md", src_hash, "t", "/")
+            loaded.forget_page("missing.html")
+            self.assertFalse(loaded.has_changes())
+
+            loaded.record_page("index.html", src_path, "index.md", src_hash, "t2", "/")
+            self.assertTrue(loaded.has_changes())
+            loaded.save()
+            loaded.forget_page("index.html")
+            self.assertTrue(loaded.has_changes())
+
+        return
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def test_stale_reasons(self) -> None:
+        print("[ test ] DependencyGraph explains which inputs changed")
+
+        graph = DependencyGraph()
+        inputs = page_inputs("blog/post.md", "h1", "t1", "/")
+
+        self.assertEqual(graph.stale_reasons("blog/post.html", inputs), ["never built"])
+
+        graph.record("blog/post.html", inputs)
+        self.assertEqual(graph.stale_reasons("blog/post.html", inputs), [])
+        self.assertEqual(
+            graph.stale_reasons("blog/post.html", page_inputs("blog/post.md", "h2", "t1", "/SSG/")),
+            ["content/blog/post.md changed", "basepath changed ('/' -> '/SSG/')"]
+        )
+        self.assertEqual(
+            graph.stale_reasons("blog/post.html", page_inputs("blog/renamed.md", "h1", "t1", "/")),
+            ["new input content/blog/renamed.md", "content/blog/post.md no longer an input"]
+        )
+
+        return
+
+    def test_dependents(self) -> None:
+        print("[ test ] DependencyGraph finds the outputs built from an input")
+
+        graph = DependencyGraph()
+        graph.record("index.html", page_inputs("index.md", "a", "t", "/"))
+        graph.record("blog/post.html", page_inputs("blog/post.md", "b", "t", "/"))
+        graph.record("images/tom.png", asset_inputs("images/tom.png", "c"))
+
+        self.assertEqual(graph.dependents(["template.html"]), {"index.html", "blog/post.html"})
+        self.assertEqual(graph.dependents(["content/blog"]), set())
+        self.assertEqual(graph.dependents(["content/blog"], below=True), {"blog/post.html"})
+        self.assertEqual(graph.dependents(["static/images/tom.png"]), {"images/tom.png"})
+
+        return
+
+    def test_explain_rebuilds(self) -> None:
+        print("[ test ] --explain names what made each page stale")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            manifest = BuildManifest(docs_dir / "manifest.json")
+
+            def build(template: Template, basepath: str="/") -> str:
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    generate_pages_incrementally(
+                        content_dir, template, docs_dir, basepath, manifest, explain=True
+                    )
+                return output.getvalue()
+
+            self.assertIn("index.html: output missing; never built", build(template))
+            self.assertIn("0 generated, 2 up to date", build(template))
+
+            (content_dir / "blog" / "post.md").write_text("# Post\n\nedited\n")
+            output = build(template)
+            self.assertIn("blog/post.html: content/blog/post.md changed", output)
+            self.assertNotIn("index.html:", output)
+
+            other = compile_template("<h1>{{ Title }}</h1>{{ Content }}", fingerprint="other")
+            output = build(other)
+            self.assertIn("index.html: template.html changed", output)
+            self.assertIn("2 generated", output)
+
+        return
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render(self) -> None:
+        print("[ test ] Template renders placeholders from a context")
+
+        template = compile_template("<title>{{ Title }}</title>{{Content}}<p>{{ Title }}</p>")
+
+        self.assertEqual(template.slots, ["Title", "Content", "Title"])
+        self.assertEqual(
+            template.render({"Title": "Hi", "Content": "<b>x</b>"}),
+            "<title>Hi</title><b>x</b><p>Hi</p>"
+        )
+
+        with self.assertRaises(TemplateError):
+            template.render({"Title": "Hi"})
+
+        return
+
+    def test_partial(self) -> None:
+        print("[ test ] Template partial fills build-wide placeholders")
+
+        template = compile_template("{{ Site }}: {{ Title }} ({{ Site }})")
+        partial  = template.partial({"Site": "Sitegeist"})
+
+        self.assertEqual(partial.slots, ["Title"])
+        self.assertEqual(partial.segments, ["Sitegeist: ", " (Sitegeist)"])
+        self.assertEqual(partial.render({"Title": "Home"}), "Sitegeist: Home (Sitegeist)")
+        self.assertNotEqual(partial.fingerprint, template.fingerprint)
+
+        return
+
+    def test_compile_errors(self) -> None:
+        print("[ test ] Template validates placeholders at compile time")
+
+        tests = [
+            "{{ }}",
+            "{{ two words }}",
+            "<p>{{ Title </p>",
+            "<p> Title }}</p>",
+        ]
+        for test in tests:
+            with self.assertRaises(TemplateError):
+                compile_template(test)
+
+        with self.assertRaises(TemplateError):
+            compile_template("{{ Title }}{{ Contnet }}", {"Title", "Content"})
+
+        return
+
+    def test_with_url_rewriter(self) -> None:
+        print("[ test ] Template URLs can be rewritten after it's been checked")
+
+        text     = '<a href="/">{{ Title }}</a><link href="{{ Basepath }}index.css">'
+        rewriter = UrlRewriter("/SSG/")
+        later    = compile_template(text).with_url_rewriter(rewriter)
+
+        self.assertEqual(later.segments, compile_template(text, url_rewriter=rewriter).segments)
+        self.assertEqual(
+            later.partial({"Basepath": "/SSG/"}).render({"Title": "Home"}),
+            '<a href="/SSG/">Home</a><link href="/SSG/index.css">'
+        )
+        with self.assertRaises(TemplateError):
+            later.with_url_rewriter(rewriter)
+
+        return
+
+class TestUrlRewriter(unittest.TestCase):
+    def test_rewrite_url(self) -> None:
+        print("[ test ] UrlRewriter prefixes site-absolute URLs")
+
+        rewrite = UrlRewriter("/SSG/")
+
+        self.assertEqual(rewrite("/"), "/SSG/")
+        self.assertEqual(rewrite("/images/tom.png"), "/SSG/images/tom.png")
+        self.assertEqual(rewrite("images/tom.png"), "images/tom.png")
+        self.assertEqual(rewrite("https://boot.dev"), "https://boot.dev")
+        self.assertEqual(rewrite("//cdn.example.com/a.js"), "//cdn.example.com/a.js")
+
+        # a missing trailing slash doesn't glue the basepath onto the path
+        self.assertEqual(UrlRewriter("/SSG")("/index.css"), "/SSG/index.css")
+        self.assertTrue(UrlRewriter("/").is_identity)
+
+        return
+
+    def test_rewrite_fingerprinted_assets(self) -> None:
+        print("[ test ] UrlRewriter points static files at their fingerprinted names")
+
+        assets  = {"index.css": "index.3f2a9c1b.css", "images/tom.png": "images/tom.0badf00d.png"}
+        rewrite = UrlRewriter("/", assets)
+
+        self.assertFalse(rewrite.is_identity)
+        self.assertEqual(rewrite("/index.css"), "/index.3f2a9c1b.css")
+        self.assertEqual(rewrite("/index.css?v=2#top"), "/index.3f2a9c1b.css?v=2#top")
+        self.assertEqual(UrlRewriter("/SSG/", assets)("/images/tom.png"), "/SSG/images/tom.0badf00d.png")
+        self.assertEqual(rewrite("/blog/tom/"), "/blog/tom/")
+        self.assertEqual(rewrite("index.css"), "index.css")
+
+        # the asset map is part of the rewriter's identity, for cache keys
+        self.assertEqual(rewrite, UrlRewriter("/", dict(assets)))
+        self.assertNotEqual(rewrite, UrlRewriter("/"))
+        self.assertNotEqual(rewrite.key, UrlRewriter("/", {"index.css": "index.00000000.css"}).key)
+        self.assertEqual(UrlRewriter("/SSG/").key, "/SSG/")
+
+        return
+
+    def test_rewrite_while_rendering(self) -> None:
+        print("[ test ] href & src props rewritten during to_html()")
+
+        node = ParentNode("p", [
+            LeafNode("a", "home", {"href": "/"}),
+            LeafNode("img", "", {"src": "/images/tom.png", "alt": "/not-a-url"}),
+        ])
+
+        self.assertEqual(
+            node.to_html(UrlRewriter("/SSG/")),
+            '<p><a href="/SSG/">home</a><img src="/SSG/images/tom.png" alt="/not-a-url" /></p>'
+        )
+        self.assertEqual(
+            node.to_html(),
+            '<p><a href="/">home</a><img src="/images/tom.png" alt="/not-a-url" /></p>'
+        )
+
+        return
+
+    def test_rewrite_template(self) -> None:
+        print("[ test ] template URLs rewritten at compile time")
+
+        template = compile_template(
+            '<link href="/index.css" /><a href="https://x.com">{{ Title }}</a><img src=\'/a.png\' />',
+            url_rewriter=UrlRewriter("/SSG/")
+        )
+
+        self.assertEqual(
+            template.render({"Title": "t"}),
+            '<link href="/SSG/index.css" /><a href="https://x.com">t</a><img src=\'/SSG/a.png\' />'
+        )
+
+        return
+
+class TestSyncStatic(unittest.TestCase):
+    def test_fast_copy(self) -> None:
+        print("[ test ] fast_copy copies contents & mtime")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            src_path = Path(temp_dir) / "a.bin"
+            src_path.write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+            dest_path = Path(temp_dir) / "b.bin"
+
+            fast_copy(src_path, dest_path)
+
+            self.assertEqual(src_path.read_bytes(), dest_path.read_bytes())
+            self.assertEqual(src_path.stat().st_mtime_ns, dest_path.stat().st_mtime_ns)
+
+        return
+
+    def test_only_changed_assets_copied(self) -> None:
+        print("[ test ] sync_static copies changed files & removes stale ones")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            static_dir = Path(temp_dir) / "static"
+            docs_dir   = Path(temp_dir) / "docs"
+            (static_dir / "images").mkdir(parents=True)
+            docs_dir.mkdir()
+
+            (static_dir / "index.css").write_text("body {}")
+            (static_dir / "images" / "a.png").write_bytes(b"png")
+
+            manifest = BuildManifest(docs_dir / "manifest.json")
+
+            stats = sync_static(static_dir, docs_dir, manifest)
+            self.assertEqual((stats.copied, stats.unchanged), (2, 0))
+            self.assertEqual((docs_dir / "images" / "a.png").read_bytes(), b"png")
+
+            stats = sync_static(static_dir, docs_dir, manifest)
+            self.assertEqual((stats.copied, stats.unchanged), (0, 2))
+
+            (static_dir / "index.css").write_text("body { color: red }")
+            os.remove(static_dir / "images" / "a.png")
+
+            stats = sync_static(static_dir, docs_dir, manifest)
+            self.assertEqual((stats.copied, stats.unchanged, stats.removed), (1, 0, 1))
+            self.assertEqual((docs_dir / "index.css").read_text(), "body { color: red }")
+            self.assertFalse((docs_dir / "images").exists())
+
+        return
+
+    def test_fingerprinted_assets(self) -> None:
+        print("[ test ] sync_static fingerprints asset names & reuses recorded hashes")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            static_dir = Path(temp_dir) / "static"
+            docs_dir   = Path(temp_dir) / "docs"
+            (static_dir / "images").mkdir(parents=True)
+            docs_dir.mkdir()
+
+            css_path = static_dir / "index.css"
+            css_path.write_text("body {}")
+            (static_dir / "images" / "a.png").write_bytes(b"png")
+            (static_dir / "robots.txt").write_text("User-agent: *")
+
+            css_name = fingerprinted_name("index.css", hash_str("body {}"))
+            self.assertRegex(css_name, r"^index\.[0-9a-f]{8}\.css$")
+            self.assertEqual(fingerprinted_name("robots.txt", "ab" * 32), "robots.txt")
+
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+            sync_static(static_dir, docs_dir, manifest, fingerprint=True)
+            self.assertEqual(manifest.asset_map(), {
+                "images/a.png": fingerprinted_name("images/a.png", hash_str("png")),
+                "index.css":    css_name,
+            })
+            self.assertEqual((docs_dir / css_name).read_text(), "body {}")
+            self.assertFalse((docs_dir / "index.css").exists())
+            self.assertTrue((docs_dir / "robots.txt").exists())
+
+            # same size & mtime: the recorded hash is trusted, the file isn't re-read
+            png_path = static_dir / "images" / "a.png"
+            stat = png_path.stat()
+            png_path.write_bytes(b"gif")
+            os.utime(png_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            stats = sync_static(static_dir, docs_dir, manifest, fingerprint=True)
+            self.assertEqual((stats.copied, stats.unchanged), (0, 3))
+
+            css_path.write_text("body { color: red }")
+            stats = sync_static(static_dir, docs_dir, manifest, fingerprint=True)
+            new_name = manifest.asset_map()["index.css"]
+            self.assertEqual((stats.copied, stats.removed), (1, 1))
+            self.assertNotEqual(new_name, css_name)
+            self.assertFalse((docs_dir / css_name).exists())
+            self.assertEqual((docs_dir / new_name).read_text(), "body { color: red }")
+
+            # turning fingerprinting off goes back to the plain names
+            stats = sync_static(static_dir, docs_dir, manifest)
+            self.assertEqual((stats.copied, stats.unchanged, stats.removed), (2, 1, 2))
+            self.assertEqual(manifest.asset_map(), {})
+            self.assertEqual(sorted(path.name for path in docs_dir.rglob("*.*")), ["a.png", "index.css", "robots.txt"])
+
+        return
+
+    def test_fingerprinted_stylesheets(self) -> None:
+        print("[ test ] sync_static points stylesheet urls at fingerprinted assets")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            static_dir = Path(temp_dir) / "static"
+            docs_dir   = Path(temp_dir) / "docs"
+            (static_dir / "css").mkdir(parents=True)
+            (static_dir / "images").mkdir()
+            docs_dir.mkdir()
+
+            png_path = static_dir / "images" / "a.png"
+            png_path.write_bytes(b"png")
+            (static_dir / "css" / "base.css").write_text("p {}")
+            (static_dir / "css" / "site.css").write_text(
+                '@import "base.css";\n'
+                "a { background: url(../images/a.png); }\n"
+                "b { background: url( '/images/a.png?v=1#x' ); }\n"
+                "i { background: url(data:image/png;base64,AA==) url(https://cdn.example/a.png) url(missing.png); }\n"
+            )
+
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+            sync_static(static_dir, docs_dir, manifest, fingerprint=True)
+            asset_map = manifest.asset_map()
+            png_name  = PurePosixPath(asset_map["images/a.png"]).name
+            base_name = PurePosixPath(asset_map["css/base.css"]).name
+
+            site_css = docs_dir / asset_map["css/site.css"]
+            self.assertEqual(site_css.read_text(), (
+                f'@import "{base_name}";\n'
+                f"a {{ background: url(../images/{png_name}); }}\n"
+                f"b {{ background: url( '/images/{png_name}?v=1#x' ); }}\n"
+                "i { background: url(data:image/png;base64,AA==) url(https://cdn.example/a.png) url(missing.png); }\n"
+            ))
+            self.assertEqual(asset_map["css/site.css"], fingerprinted_name("css/site.css", hash_file(site_css)))
+
+            stats = sync_static(static_dir, docs_dir, manifest, fingerprint=True)
+            self.assertEqual((stats.copied, stats.unchanged), (0, 3))
+
+            # a new image means a new stylesheet name too, even through update_assets
+            png_path.write_bytes(b"new png")
+            stats = update_assets([png_path], static_dir, docs_dir, manifest, fingerprint=True)
+            self.assertEqual((stats.copied, stats.removed), (2, 2))
+            self.assertNotEqual(manifest.asset_map()["css/site.css"], asset_map["css/site.css"])
+            self.assertEqual(manifest.asset_map()["css/base.css"], asset_map["css/base.css"])
+            self.assertFalse(site_css.exists())
+            self.assertIn(
+                PurePosixPath(manifest.asset_map()["images/a.png"]).name,
+                (docs_dir / manifest.asset_map()["css/site.css"]).read_text()
+            )
+
+        return
+
+    def test_fingerprinted_pages(self) -> None:
+        print("[ test ] pages link to fingerprinted assets & rebuild when the asset map changes")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            content_dir = root / "content"
+            content_dir.mkdir()
+            (content_dir / "index.md").write_text("# Home\n\n![tom](/images/tom.png)\n")
+            template_path = root / "template.html"
+            template_path.write_text('<link href="/index.css" />{{ Title }}{{ Content }}')
+            docs_dir = root / "docs"
+            docs_dir.mkdir()
+
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+            assets = {"index.css": "index.11111111.css", "images/tom.png": "images/tom.22222222.png"}
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                template = main.compile_page_template(template_path, "/SSG/", {}, assets)
+                generate_pages_incrementally(content_dir, template, docs_dir, "/SSG/", manifest)
+
+                self.assertEqual(
+                    (docs_dir / "index.html").read_text(),
+                    '<link href="/SSG/index.11111111.css" />Home'
+                    '<div><h1>Home</h1><p><img src="/SSG/images/tom.22222222.png" alt="tom" /></p></div>'
+                )
+
+                assets["index.css"] = "index.33333333.css"
+                template = main.compile_page_template(template_path, "/SSG/", {}, assets)
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    generate_pages_incrementally(content_dir, template, docs_dir, "/SSG/", manifest, explain=True)
+
+            self.assertIn("index.html: assets changed", output.getvalue())
+            self.assertIn("/SSG/index.33333333.css", (docs_dir / "index.html").read_text())
+
+        return
+
+    def test_hash_skips_touched_files(self) -> None:
+        print("[ test ] sync_static with hashes skips touched but identical files")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            static_dir = Path(temp_dir) / "static"
+            docs_dir   = Path(temp_dir) / "docs"
+            static_dir.mkdir()
+            docs_dir.mkdir()
+
+            src_path = static_dir / "index.css"
+            src_path.write_text("body {}")
+
+            manifest = BuildManifest(docs_dir / "manifest.json")
+            sync_static(static_dir, docs_dir, manifest, use_hash=True)
+
+            stat = src_path.stat()
+            os.utime(src_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+            stats = sync_static(static_dir, docs_dir, manifest, use_hash=True)
+            self.assertEqual((stats.copied, stats.unchanged), (0, 1))
+
+        return
+
+class TestWalker(unittest.TestCase):
+    def make_tree(self, root: Path) -> None:
+        for rel in ["b.md", "a/z.md", "a/b/c.md", "drafts/x.md", "a/_partial.md", "a.txt"]:
+            (root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (root / rel).write_text(rel)
+
+        return
+
+    def test_walk_order(self) -> None:
+        print("[ test ] walk_files visits files in the order of a sorted recursive walk")
+
+        def sorted_walk(directory: Path) -> list[Path]:
+            files = []
+            for path in sorted(directory.iterdir()):
+                files.extend(sorted_walk(path) if path.is_dir() else [path])
+            return files
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            self.make_tree(root)
+
+            walked = list(walk_files(root))
+            self.assertEqual([path for path, _ in walked], sorted_walk(root))
+            self.assertEqual([rel for _, rel in walked][:3], ["a/_partial.md", "a/b/c.md", "a/z.md"])
+
+            # deep trees don't recurse on the Python stack
+            deep = root / "deep"
+            deep.joinpath(*["d"] * 300).mkdir(parents=True)
+            deep.joinpath(*["d"] * 300, "leaf.md").write_text("")
+            self.assertEqual(list(walk_files(deep))[0][1], "/".join(["d"] * 300 + ["leaf.md"]))
+
+        return
+
+    def test_path_filter(self) -> None:
+        print("[ test ] PathFilter include & exclude globs")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            self.make_tree(root)
+
+            def walk(include: list[str], exclude: list[str]) -> list[str]:
+                return [rel for _, rel in walk_files(root, PathFilter(include, exclude))]
+
+            self.assertEqual(walk(["*.md"], ["drafts", "_*"]), ["a/b/c.md", "a/z.md", "b.md"])
+            self.assertEqual(walk(["a/**"], ["a/b/**"]), ["a/_partial.md", "a/z.md"])
+            self.assertEqual(walk(["/b.md", "a/*/*.md"], []), ["a/b/c.md", "b.md"])
+            self.assertEqual(walk([], ["**/*.md"]), ["a.txt"])
+
+            path_filter = PathFilter(exclude=["drafts"])
+            self.assertFalse(path_filter.allows("drafts/x.md"))
+            self.assertTrue(path_filter.allows("a/drafts.md"))
+            self.assertFalse(PathFilter())
+
+        return
+
+    def test_dir_listings(self) -> None:
+        print("[ test ] DirListings reuses listings of directories whose mtime is unchanged")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            self.make_tree(root)
+
+            # age every directory past the racy window so its listing is kept,
+            # without giving a changed directory back its recorded mtime
+            ages = itertools.count(2 * RACY_NS, 10**9)
+            def age(directories: list[Path]) -> None:
+                old = time.time_ns() - next(ages)
+                for directory in directories:
+                    os.utime(directory, ns=(old, old))
+                return
+
+            age([root, *(path for path in root.rglob("*") if path.is_dir())])
+            listings = DirListings()
+            expected = list(walk_files(root))
+            self.assertEqual(list(walk_files(root, listings=listings, key_prefix="t/")), expected)
+            self.assertEqual((listings.hits, listings.misses), (0, 4))
+            self.assertIn("t/a/b/", listings.entries)
+
+            self.assertEqual(list(walk_files(root, listings=listings, key_prefix="t/")), expected)
+            self.assertEqual((listings.hits, listings.misses), (4, 4))
+            self.assertEqual(listings.prune("t/"), 0)
+
+            # a new file changes its directory's mtime, so only that one is listed again
+            (root / "a" / "b" / "d.md").write_text("")
+            (root / "drafts" / "x.md").unlink()
+            (root / "drafts").rmdir()
+            age([root, root / "a" / "b"])
+            rels = [rel for _, rel in walk_files(root, listings=listings, key_prefix="t/")]
+            self.assertIn("a/b/d.md", rels)
+            self.assertNotIn("drafts/x.md", rels)
+            self.assertEqual((listings.hits, listings.misses), (5, 6))
+
+            self.assertEqual(listings.prune("t/"), 1)
+            self.assertNotIn("t/drafts/", listings.entries)
+
+            # recently modified directories aren't recorded
+            (root / "new").mkdir()
+            list(walk_files(root, listings=listings, key_prefix="t/"))
+            self.assertNotIn("t/new/", listings.entries)
+
+        return
+
+class TestWatchers(unittest.TestCase):
+    def check_watcher(self, polling: bool) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir).resolve()
+            content_dir = root / "content"
+            content_dir.mkdir()
+            template_path = root / "template.html"
+            template_path.write_text("{{ Content }}")
+            (root / "unrelated.txt").write_text("")
+
+            watcher = make_watcher([content_dir], [template_path], polling=polling)
+            if polling:
+                self.assertIsInstance(watcher, PollingWatcher)
+
+            try:
+                page_path = content_dir / "blog" / "index.md"
+                page_path.parent.mkdir()
+                page_path.write_text("# Title")
+                self.assertIn(page_path, wait_for_changes(watcher))
+
+                template_path.write_text("<p>{{ Content }}</p>")
+                (root / "unrelated.txt").write_text("ignored")
+                self.assertEqual(wait_for_changes(watcher), {template_path})
+
+                os.remove(page_path)
+                self.assertIn(page_path, wait_for_changes(watcher))
+            finally:
+                watcher.close()
+
+        return
+
+    def test_polling_watcher(self) -> None:
+        print("[ test ] PollingWatcher reports created, changed & deleted files")
+
+        self.check_watcher(polling=True)
+
+        return
+
+    def test_default_watcher(self) -> None:
+        print("[ test ] default watcher (inotify where available) reports changes")
+
+        self.check_watcher(polling=False)
+
+        return
+
+def write_site(root: Path) -> tuple[Path, Template, Path]:
+    content_dir = root / "content"
+    (content_dir / "blog").mkdir(parents=True)
+    (content_dir / "index.md").write_text("# Home\n\nwelcome\n")
+    (content_dir / "blog" / "post.md").write_text("# Post\n\nsome **bold** text\n")
+
+    template_path = root / "template.html"
+    template_path.write_text("<title>{{ Title }}</title><body>{{ Content }}</body>")
+
+    return content_dir, load_template(template_path), root / "docs"
+
+def output_hashes(results: list) -> list[str | None]:
+    return [result.hash if result is not None else None for result in results]
+
+class TestRenderPages(unittest.TestCase):
+    def test_parallel_matches_serial(self) -> None:
+        print("[ test ] render_pages with jobs > 1 matches serial output")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+
+            work_list = collect_pages(content_dir, docs_dir)
+            self.assertEqual(
+                [dest.relative_to(docs_dir).as_posix() for _, dest in work_list],
+                ["blog/post.html", "index.html"]
+            )
+
+            results = render_pages(work_list, template, "/", jobs=1)
+            self.assertEqual([result.written for result in results], [True, True])
+            serial = [dest.read_text() for _, dest in work_list]
+
+            for _, dest in work_list:
+                dest.unlink()
+
+            parallel_results = render_pages(work_list, template, "/", jobs=2)
+            self.assertEqual([result.written for result in parallel_results], [True, True])
+            parallel = [dest.read_text() for _, dest in work_list]
+
+            self.assertEqual(serial, parallel)
+            self.assertEqual(output_hashes(parallel_results), output_hashes(results))
+
+        return
+
+    def test_error_names_failing_page(self) -> None:
+        print("[ test ] render_pages attributes errors to the failing page")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+
+            # pages must start with a heading
+            bad_path = content_dir / "blog" / "post.md"
+            bad_path.write_text("no heading here\n")
+
+            work_list = collect_pages(content_dir, docs_dir)
+            for jobs in (1, 2):
+                with self.assertRaises(PageBuildError) as context:
+                    render_pages(work_list, template, "/", jobs=jobs)
+                self.assertEqual(context.exception.src_path, bad_path)
+
+        return
+
+    def test_pipelined_matches_serial(self) -> None:
+        print("[ test ] render_pages with io_threads matches the one-page-at-a-time output")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+            (content_dir / "blog" / "empty.md").write_text("")
+            for i in range(20):
+                (content_dir / f"page{i}.md").write_text(f"# Page {i}\r\n\n[home](/) **{i}**\n")
+
+            work_list = collect_pages(content_dir, docs_dir)
+            expected = output_hashes(render_pages(work_list, template, "/SSG/", io_threads=0))
+            serial = [dest.read_text() if dest.exists() else None for _, dest in work_list]
+
+            for dest in docs_dir.rglob("*.html"):
+                dest.unlink()
+
+            cache = ParseCache(Path(temp_dir) / "cache")
+            for _ in range(2):
+                self.assertEqual(
+                    output_hashes(render_pages(work_list, template, "/SSG/", io_threads=3, parse_cache=cache)),
+                    expected
+                )
+                self.assertEqual([dest.read_text() if dest.exists() else None for _, dest in work_list], serial)
+            # the empty page is looked up but never stored
+            entries = [path for path in cache.directory.rglob("*") if path.is_file()]
+            self.assertEqual(len(entries), 22)
+            self.assertEqual(cache.stats(), (22, 24, 0, sum(path.stat().st_size for path in entries)))
+
+            # big pages are streamed instead of read whole
+            original = main.PIPELINE_MAX_BYTES
+            main.PIPELINE_MAX_BYTES = 1
+            try:
+                self.assertEqual(output_hashes(render_pages(work_list, template, "/SSG/", io_threads=2)), expected)
+            finally:
+                main.PIPELINE_MAX_BYTES = original
+            self.assertEqual([dest.read_text() if dest.exists() else None for _, dest in work_list], serial)
+
+            bad_path = content_dir / "page7.md"
+            bad_path.write_text("no heading here\n")
+            with self.assertRaises(PageBuildError) as context:
+                render_pages(work_list, template, "/", io_threads=2)
+            self.assertEqual(context.exception.src_path, bad_path)
+
+        return
+
+
+class TestProfiler(unittest.TestCase):
+    def test_spans_and_stage_totals(self) -> None:
+        print("[ test ] Profiler records spans, stage totals & page times")
+
+        profiler = Profiler()
+        with profiler.span("stage"):
+            with profiler.span("page", Path("a.md")):
+                pass
+        profiler.add("parse", 2_000_000, calls=4)
+        profiler.add("parse", 1_000_000)
+
+        self.assertEqual(profiler.stages["parse"], [5, 3_000_000])
+        self.assertEqual(profiler.stages["stage"][0], 1)
+        self.assertEqual(list(profiler.pages), ["a.md"])
+
+        events = profiler.trace_events()
+        self.assertEqual([event["name"] for event in events], ["stage", "page"])
+        self.assertEqual(events[1]["args"], {"page": "a.md"})
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in events))
+
+        other = Profiler()
+        other.add("parse", 1_000_000)
+        other.record("page", 0, 5_000_000, "b.md")
+        profiler.merge(other.export())
+
+        self.assertEqual(profiler.stages["parse"], [6, 4_000_000])
+        self.assertEqual(profiler.slowest_pages(1), [("b.md", 5_000_000)])
+        self.assertIn("b.md", profiler.report(top=1))
+
+        return
+
+    def test_null_profiler(self) -> None:
+        print("[ test ] NULL_PROFILER records nothing")
+
+        with NULL_PROFILER.span("stage", "a.md") as span:
+            NULL_PROFILER.add("parse", 1)
+        self.assertIs(span, NULL_PROFILER.span("other"))
+        self.assertFalse(NULL_PROFILER.enabled)
+
+        return
+
+    def test_render_pages_profile(self) -> None:
+        print("[ test ] render_pages collects per page & per block times, also from workers")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+            work_list = collect_pages(content_dir, docs_dir)
+
+            for jobs in (1, 2):
+                profiler = Profiler()
+                render_pages(work_list, template, "/", jobs=jobs, profiler=profiler)
+
+                self.assertEqual(sorted(profiler.pages), sorted(str(src) for src, _ in work_list))
+                self.assertEqual(profiler.stages["page"][0], 2)
+                self.assertEqual(profiler.stages["parse"][0], 4)
+
+                trace_path = Path(temp_dir) / "trace.json"
+                profiler.write_trace(trace_path)
+                with trace_path.open("r") as inFile:
+                    trace = json.load(inFile)
+                self.assertEqual(
+                    sum(event["name"] == "page" for event in trace["traceEvents"]), 2
+                )
+
+        return
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_lru_eviction(self) -> None:
+        print("[ test ] BlockCache evicts the least recently used block")
+
+        cache = BlockCache(max_entries=2)
+        cache.put("a", "<p>a</p>")
+        cache.put("b", "<p>b</p>")
+        self.assertEqual(cache.get("a"), "<p>a</p>")
+
+        cache.put("c", "<p>c</p>")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "<p>a</p>")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats(), (2, 1, 1))
+
+        cache.add_stats((1, 2, 3))
+        self.assertEqual(cache.stats(), (3, 3, 4))
+
+        return
+
+    def test_cached_render_matches_uncached(self) -> None:
+        print("[ test ] render_markdown_into() with a BlockCache matches uncached output")
+
+        md = "# Title\n\n> shared [note](/note)\n\nfirst\n\n> shared [note](/note)\n\n```\ncode\n```\n"
+        cache = BlockCache()
+
+        for rewriter in (None, UrlRewriter("/SSG/"), UrlRewriter("/SSG")):
+            expected = markdown_to_html_node(md).to_html(rewriter)
+
+            for _ in range(2):
+                chunks = []
+                render_markdown_into(io.StringIO(md), chunks.append, rewriter, cache=cache)
+                self.assertEqual("".join(chunks), expected)
+
+                chunks = []
+                render_markdown_into(io.StringIO(md), chunks.append, rewriter, Profiler(), cache)
+                self.assertEqual("".join(chunks), expected)
+
+        # equal basepaths share entries; the repeated quote is rendered once each
+        self.assertEqual(len(cache), 8)
+        self.assertEqual(cache.misses, 8)
+        self.assertEqual(cache.hits, 3 * 4 * 5 - 8)
+
+        return
+
+    def test_render_pages_reports_worker_hits(self) -> None:
+        print("[ test ] render_pages folds worker block cache counts into the parent's")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+            work_list = collect_pages(content_dir, docs_dir)
+
+            for jobs in (1, 2):
+                cache = BlockCache()
+                render_pages(work_list, template, "/", jobs=jobs, cache=cache)
+                self.assertEqual(cache.hits + cache.misses, 4)
+
+        return
+
+
+class TestParseCache(unittest.TestCase):
+    def test_store_get_and_failed_store(self) -> None:
+        print("[ test ] ParseCache stores entries only when the write completes")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ParseCache(Path(temp_dir), stamp="a" * 64)
+            key = cache.key(hash_str("# Title\n"), "/")
+
+            self.assertIsNone(cache.get(key))
+
+            with self.assertRaises(RuntimeError):
+                with cache.store(key, "Title") as entry:
+                    entry.write("<div>half")
+                    raise RuntimeError("render failed")
+            self.assertIsNone(cache.get(key))
+            self.assertEqual(list(cache.entry_path(key).parent.iterdir()), [])
+
+            with cache.store(key, "Title") as entry:
+                entry.write("<div>body</div>")
+            self.assertEqual(cache.get(key).read_text(), "Title\n<div>body</div>")
+            self.assertEqual(cache.stats(), (1, 2, 0, len("Title\n<div>body</div>")))
+
+            self.assertNotEqual(cache.key(hash_str("# Title\n"), "/SSG/"), key)
+
+        return
+
+    def test_prune(self) -> None:
+        print("[ test ] ParseCache.prune() drops other parser stamps & least recently used entries")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+
+            old = ParseCache(root, stamp="b" * 64)
+            with old.store(old.key("x", "/"), "old") as entry:
+                entry.write("x")
+
+            cache = ParseCache(root, max_bytes=50, stamp="c" * 64)
+            keys = [cache.key(str(i), "/") for i in range(3)]
+            for i, key in enumerate(keys):
+                with cache.store(key, "t") as entry:
+                    entry.write("x" * 18)
+                os.utime(cache.entry_path(key), ns=(i * 10**9, i * 10**9))
+
+            # touch the oldest so the middle one is least recently used
+            cache.get(keys[0])
+
+            self.assertEqual(cache.prune(), 40)
+            self.assertEqual([path.name for path in root.iterdir()], [cache.directory.name])
+            self.assertIsNotNone(cache.get(keys[0]))
+            self.assertIsNone(cache.get(keys[1]))
+            self.assertIsNotNone(cache.get(keys[2]))
+
+        return
+
+    def test_prune_tracks_size(self) -> None:
+        print("[ test ] ParseCache.prune() only walks the entries once over the limit")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ParseCache(Path(temp_dir), max_bytes=50, stamp="d" * 64)
+            keys = [cache.key(str(i), "/") for i in range(3)]
+
+            with cache.store(keys[0], "t") as entry:
+                entry.write("x" * 18)
+            self.assertEqual(cache.prune(), 20)
+            self.assertEqual(cache.read_size(), 20)
+
+            # a later build, in a fresh process, adds to the recorded total;
+            # an entry removed behind its back goes unnoticed while under the limit
+            cache = ParseCache(Path(temp_dir), max_bytes=50, stamp="d" * 64)
+            with cache.store(keys[1], "t") as entry:
+                entry.write("x" * 18)
+            cache.entry_path(keys[0]).unlink()
+            self.assertEqual(cache.prune(), 40)
+
+            # going over the limit recounts from disk
+            with cache.store(keys[2], "t") as entry:
+                entry.write("x" * 18)
+            self.assertEqual(cache.prune(), 40)
+            self.assertEqual(cache.read_size(), 40)
+            self.assertEqual(cache.evictions, 0)
+
+        return
+
+    def test_parser_stamp_is_stable(self) -> None:
+        print("[ test ] parser_stamp() only changes with the parser")
+
+        self.assertEqual(parser_stamp(), parser_stamp())
+        self.assertEqual(len(parser_stamp()), 64)
+
+        return
+
+    def test_template_change_skips_parsing(self) -> None:
+        print("[ test ] render_pages reuses cached bodies under a new template")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+            work_list = collect_pages(content_dir, docs_dir)
+
+            for jobs in (1, 2):
+                cache = ParseCache(Path(temp_dir) / "cache")
+                render_pages(work_list, template, "/", jobs=jobs, parse_cache=cache)
+                uncached = [dest.read_text() for _, dest in work_list]
+
+                other = compile_template("<h1>{{ Title }}</h1>{{ Content }}")
+                cache = ParseCache(Path(temp_dir) / "cache")
+                render_pages(work_list, other, "/", jobs=jobs, parse_cache=cache)
+                self.assertEqual(cache.stats(), (2, 0, 0, 0))
+                self.assertEqual(
+                    (docs_dir / "index.html").read_text(),
+                    "<h1>Home</h1><div><h1>Home</h1><p>welcome</p></div>"
+                )
+
+                render_pages(work_list, template, "/", jobs=jobs, parse_cache=cache)
+                self.assertEqual([dest.read_text() for _, dest in work_list], uncached)
+
+        return
+
+    def test_parallel_stats_count_each_page_once(self) -> None:
+        print("[ test ] render_pages with jobs > 1 counts one cache lookup per page")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+            for i in range(40):
+                (content_dir / f"page{i}.md").write_text(f"# Page {i}\n\nbody {i}\n")
+            work_list = collect_pages(content_dir, docs_dir)
+
+            # enough pages that the pool pickles several jobs per chunk
+            cache = ParseCache(Path(temp_dir) / "cache")
+            render_pages(work_list, template, "/", jobs=2, parse_cache=cache)
+            entries = [path for path in cache.directory.rglob("*") if path.is_file()]
+            self.assertEqual(
+                cache.stats(), (0, 42, 0, sum(path.stat().st_size for path in entries))
+            )
+
+            cache = ParseCache(Path(temp_dir) / "cache")
+            render_pages(work_list, template, "/", jobs=2, parse_cache=cache)
+            self.assertEqual(cache.stats(), (42, 0, 0, 0))
+
+        return
+
+
+class TestSource(unittest.TestCase):
+    def test_mapped_source(self) -> None:
+        print("[ test ] MarkdownSource reads & hashes big files through a memory map")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "api.md"
+            with path.open("wb") as outFile:
+                outFile.write(b"# API\r\n\r\n")
+                while outFile.tell() < MMAP_MIN_BYTES + 12345:
+                    outFile.write(b"## fn\r\n\r\ncalls `thing` \xc3\xa9\r\n\r\n")
+
+            with MarkdownSource(path) as source, path.open("r") as inFile:
+                self.assertTrue(source.is_mapped)
+                self.assertEqual(source.hash(), hash_file(path))
+                with source.lines() as lines:
+                    self.assertEqual(list(lines), list(inFile))
+                    # hashing again after reading still sees the whole file
+                    self.assertEqual(source.hash(), hash_file(path))
+
+            small = Path(temp_dir) / "small.md"
+            small.write_text("# Small\n\ntext\n")
+            with MarkdownSource(small) as source:
+                self.assertFalse(source.is_mapped)
+                self.assertEqual(source.hash(), hash_file(small))
+                self.assertEqual(source.lines().read(), "# Small\n\ntext\n")
+
+        return
+
+    def test_read_page(self) -> None:
+        print("[ test ] read_page splits off the title & front matter")
+
+        lines = iter(["# Title\n", "\n", "body\n"])
+        title, front_matter, body = read_page(lines)
+        self.assertEqual((title, front_matter), ("Title", {}))
+        self.assertEqual(list(body), ["# Title\n", "\n", "body\n"])
+
+        page = ["---\n", "title: \"Tom: a Mistake\"\n", "# a comment\n", "author: me\n", "---\n", "\n", "text\n"]
+        title, front_matter, body = read_page(page)
+        self.assertEqual(title, "Tom: a Mistake")
+        self.assertEqual(front_matter, {"title": "Tom: a Mistake", "author": "me"})
+        self.assertEqual(list(body), ["text\n"])
+
+        # without a title key the body still has to open with a heading
+        title, _, _ = read_page(["---\n", "author: me\n", "---\n", "# Heading\n"])
+        self.assertEqual(title, "Heading")
+
+        self.assertIsNone(read_page([]))
+        self.assertIsNone(read_page(["---\n", "title: x\n", "---\n", "\n"]))
+        with self.assertRaises(ValueError):
+            read_page(["---\n", "title: x\n"])
+        with self.assertRaises(ValueError):
+            read_page(["---\n", "no separator\n", "---\n", "# x\n"])
+        with self.assertRaises(ValueError):
+            read_page(["text\n"])
+
+        return
+
+    def test_front_matter_pages(self) -> None:
+        print("[ test ] front matter is left out of the rendered page")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            docs_dir.mkdir()
+            (content_dir / "blog" / "post.md").write_text("---\ntitle: Named\n---\n\nsome **bold** text\n")
+
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_pages_incrementally(content_dir, template, docs_dir, "/", manifest, io_threads=2)
+            serial = (docs_dir / "blog" / "post.html").read_text()
+            self.assertEqual(serial, "<title>Named</title><body><div><p>some <b>bold</b> text</p></div></body>")
+
+            (docs_dir / "blog" / "post.html").unlink()
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_pages_incrementally(content_dir, template, docs_dir, "/", manifest)
+            self.assertEqual((docs_dir / "blog" / "post.html").read_text(), serial)
+
+        return
+
+class TestServe(unittest.TestCase):
+    def test_site_store_lookup(self) -> None:
+        print("[ test ] SiteStore maps URLs under the basepath onto outputs")
+
+        store = SiteStore("/SSG/")
+        page = Resource.from_bytes("blog/tom/index.html", b"<p>tom</p>")
+        store.put("blog/tom/index.html", page)
+
+        self.assertIs(store.lookup("/SSG/blog/tom/")[0], page)
+        self.assertIs(store.lookup("/SSG/blog/tom/index.html")[0], page)
+        self.assertEqual(store.lookup("/SSG/blog/tom"), (None, "/SSG/blog/tom/"))
+        self.assertEqual(store.lookup("/"), (None, "/SSG/"))
+        self.assertEqual(store.lookup("/SSG/blog/jerry/"), (None, None))
+        self.assertEqual(store.lookup("/blog/tom/"), (None, None))
+        self.assertEqual(store.url("blog/tom/index.html"), "/SSG/blog/tom/")
+        self.assertEqual(page.content_type, "text/html; charset=utf-8")
+
+        return
+
+    def test_etags_and_reload_script(self) -> None:
+        print("[ test ] etag_matches() & inject_reload_script()")
+
+        self.assertTrue(etag_matches('"abc"', '"abc"'))
+        self.assertTrue(etag_matches('"x", W/"abc"', '"abc"'))
+        self.assertTrue(etag_matches("*", '"abc"'))
+        self.assertFalse(etag_matches('"abd"', '"abc"'))
+        self.assertFalse(etag_matches(None, '"abc"'))
+
+        html = inject_reload_script("<body><p>x</p></body></html>")
+        self.assertTrue(html.endswith(RELOAD_SCRIPT + "</body></html>"))
+        self.assertEqual(inject_reload_script("<p>x</p>"), "<p>x</p>" + RELOAD_SCRIPT)
+
+        for page in ["<body>" + "<p>x</p>" * 20000 + "</body></html>", "<p>x</p>"]:
+            buffer = io.BytesIO(page.encode())
+            inject_reload_script_into(buffer)
+            self.assertEqual(buffer.getvalue(), inject_reload_script(page).encode())
+
+        return
+
+    def test_server_conditional_requests(self) -> None:
+        print("[ test ] SiteServer answers 200, 304, 301 & 404 from memory")
+
+        store = SiteStore("/")
+        store.put("index.html", Resource.from_bytes("index.html", b"<p>home</p>"))
+        server = SiteServer(("127.0.0.1", 0), store, ReloadBroker(), quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def get(path: str, headers: dict[str, str] | None=None) -> tuple[int, dict, bytes]:
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+            connection.request("GET", path, headers=headers or {})
+            response = connection.getresponse()
+            result = (response.status, dict(response.getheaders()), response.read())
+            connection.close()
+
+            return result
+
+        try:
+            status, headers, body = get("/")
+            self.assertEqual((status, body), (200, b"<p>home</p>"))
+
+            status, _, body = get("/", {"If-None-Match": headers["ETag"]})
+            self.assertEqual((status, body), (304, b""))
+
+            # a re-render swaps in a new version with a new ETag
+            store.put("index.html", Resource.from_bytes("index.html", b"<p>new home</p>"))
+            status, _, body = get("/", {"If-None-Match": headers["ETag"]})
+            self.assertEqual((status, body), (200, b"<p>new home</p>"))
+
+            self.assertEqual(get("/missing.html")[0], 404)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        return
+
+    def test_reload_broker(self) -> None:
+        print("[ test ] ReloadBroker sends every subscriber the changed URLs")
+
+        broker = ReloadBroker()
+        first, second = broker.subscribe(), broker.subscribe()
+        broker.publish(["/b/", "/a/", "/b/"])
+        self.assertEqual(first.get_nowait(), '["/a/", "/b/"]')
+        self.assertEqual(second.get_nowait(), '["/a/", "/b/"]')
+
+        broker.unsubscribe(first)
+        broker.close()
+        self.assertTrue(first.empty())
+        self.assertIsNone(second.get_nowait())
+
+        return
+
+    def test_serve_pages(self) -> None:
+        print("[ test ] serve_pages renders into the store & keeps the last good version")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, _ = write_site(Path(temp_dir))
+            store, sources = SiteStore("/"), {}
+
+            page_list = [(src, dest.as_posix()) for src, dest in collect_pages(content_dir, Path())]
+            updated = main.serve_pages(page_list, template, "/", store, sources)
+            self.assertEqual(updated, ["blog/post.html", "index.html"])
+            self.assertIn(RELOAD_SCRIPT.encode(), store.resources["index.html"].body)
+
+            first = store.resources["index.html"]
+            (content_dir / "index.md").write_bytes(b"\xff not utf-8")
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(main.serve_pages(page_list[1:], template, "/", store, sources), [])
+            self.assertIs(store.resources["index.html"], first)
+
+            (content_dir / "index.md").unlink()
+            self.assertEqual(main.forget_served([content_dir / "index.md"], store, sources), ["index.html"])
+            self.assertEqual(list(store.resources), ["blog/post.html"])
+
+        return
+
+
+class TestWriter(unittest.TestCase):
+    def test_write_if_changed(self) -> None:
+        print("[ test ] write_if_changed skips identical output & writes atomically")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "page.html"
+
+            first = write_if_changed(path, lambda write: (write("<p>"), write("hi</p>")))
+            self.assertTrue(first.written)
+            self.assertEqual((first.size, first.hash), (9, hash_str("<p>hi</p>")))
+            self.assertEqual(path.read_text(), "<p>hi</p>")
+
+            os.utime(path, ns=(0, 10**9))
+            same = write_if_changed(path, lambda write: write("<p>hi</p>"))
+            self.assertFalse(same.written)
+            self.assertEqual(path.stat().st_mtime_ns, 10**9)
+
+            # with the recorded state matching, the file isn't read: a same-size
+            # edit made behind the writer's back goes unnoticed
+            path.write_text("<p>ho</p>")
+            os.utime(path, ns=(0, 10**9))
+            self.assertFalse(write_if_changed(path, lambda write: write("<p>hi</p>"), same.state()).written)
+            self.assertTrue(write_if_changed(path, lambda write: write("<p>hi</p>")).written)
+
+            def fail(write) -> None:
+                write("<p>half")
+                raise RuntimeError("render failed")
+
+            with self.assertRaises(RuntimeError):
+                write_if_changed(path, fail)
+            self.assertEqual(path.read_text(), "<p>hi</p>")
+            self.assertEqual([entry.name for entry in Path(temp_dir).iterdir()], ["page.html"])
+
+        return
+
+    def test_unchanged_pages_not_rewritten(self) -> None:
+        print("[ test ] pages re-rendered to the same HTML keep their mtime")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, _, docs_dir = write_site(Path(temp_dir))
+            docs_dir.mkdir()
+            template_path = Path(temp_dir) / "template.html"
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                template = main.compile_page_template(template_path, "/", {"Unused": "1"})
+                generate_pages_incrementally(content_dir, template, docs_dir, "/", manifest)
+            mtimes = {path: path.stat().st_mtime_ns for path in docs_dir.rglob("*.html")}
+
+            # a new template fingerprint makes every page stale, but the HTML is the same
+            (content_dir / "index.md").write_text("# Home\n\nwelcome back\n")
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                template = main.compile_page_template(template_path, "/", {"Unused": "2"})
+                generate_pages_incrementally(content_dir, template, docs_dir, "/", manifest)
+
+            self.assertIn("2 generated, 0 up to date", output.getvalue())
+            self.assertIn("writes: 1 written", output.getvalue())
+            self.assertEqual((docs_dir / "blog" / "post.html").stat().st_mtime_ns, mtimes[docs_dir / "blog" / "post.html"])
+            self.assertIn("welcome back", (docs_dir / "index.html").read_text())
+            self.assertEqual(
+                manifest.output_state("index.html"),
+                [(docs_dir / "index.html").stat().st_size, (docs_dir / "index.html").stat().st_mtime_ns,
+                 hash_file(docs_dir / "index.html")]
+            )
+
+        return
+
+
+class TestCompress(unittest.TestCase):
+    def test_compress_outputs(self) -> None:
+        print("[ test ] compress_outputs writes .gz siblings only when they pay off")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            docs_dir = Path(temp_dir)
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+
+            page = docs_dir / "blog" / "index.html"
+            page.parent.mkdir()
+            page.write_text("<p>hello world</p>\n" * 100)
+            (docs_dir / "tiny.css").write_text("p { color: red; }")
+            (docs_dir / "noise.js").write_bytes(random.Random(0).randbytes(4096))
+            (docs_dir / "image.png").write_bytes(b"\0" * 4096)
+            manifest.save()
+
+            stats = compress_outputs(docs_dir, manifest, threads=2)
+            self.assertEqual((stats.compressed, stats.skipped, stats.unchanged), (1, 2, 0))
+            self.assertEqual(gzip.decompress(gzip_path(page).read_bytes()), page.read_bytes())
+            self.assertEqual(stats.bytes_saved, page.stat().st_size - gzip_path(page).stat().st_size)
+            self.assertEqual(
+                sorted(path.name for path in docs_dir.rglob("*.gz")),
+                ["index.html.gz"]
+            )
+
+            stats = compress_outputs(docs_dir, manifest)
+            self.assertEqual((stats.compressed, stats.skipped, stats.unchanged), (0, 0, 3))
+
+            first = gzip_path(page).read_bytes()
+            page.write_text("<p>hello again</p>\n" * 100)
+            stats = compress_outputs(docs_dir, manifest)
+            self.assertEqual((stats.compressed, stats.unchanged), (1, 2))
+            self.assertNotEqual(gzip_path(page).read_bytes(), first)
+
+            page.unlink()
+            stats = compress_outputs(docs_dir, manifest)
+            self.assertEqual(stats.removed, 1)
+            self.assertFalse(gzip_path(page).exists())
+            self.assertNotIn("blog/index.html", manifest.compressed)
+
+        return
+
+    def test_gzip_is_deterministic(self) -> None:
+        print("[ test ] gzip_file produces the same bytes for the same input")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "page.html"
+            path.write_text("<div>same</div>" * 50)
+
+            gzip_file(path)
+            first = gzip_path(path).read_bytes()
+            os.utime(path, ns=(0, 0))
+            gzip_file(path)
+            self.assertEqual(gzip_path(path).read_bytes(), first)
+
+        return
+
+    def test_stale_siblings_are_removed(self) -> None:
+        print("[ test ] .gz siblings go with their outputs & with --gzip turned off")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, _, docs_dir = write_site(Path(temp_dir))
+            docs_dir.mkdir()
+            (content_dir / "index.md").write_text("# Home\n\n" + "welcome home\n" * 100)
+            (content_dir / "blog" / "post.md").write_text("# Post\n\n" + "some **bold** text\n" * 100)
+            template = main.compile_page_template(Path(temp_dir) / "template.html", "/", {})
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_pages_incrementally(content_dir, template, docs_dir, "/", manifest)
+                self.assertEqual(compress_outputs(docs_dir, manifest).compressed, 2)
+
+                (content_dir / "blog" / "post.md").unlink()
+                generate_pages_incrementally(content_dir, template, docs_dir, "/", manifest)
+            self.assertFalse(gzip_path(docs_dir / "blog" / "post.html").exists())
+            self.assertEqual(list(manifest.compressed), ["index.html"])
+
+            self.assertEqual(remove_compressed(docs_dir, manifest), 1)
+            self.assertFalse(gzip_path(docs_dir / "index.html").exists())
+            self.assertTrue((docs_dir / "index.html").exists())
+            self.assertEqual(manifest.compressed, {})
+
+        return
+
+
+class TestSearch(unittest.TestCase):
+    def test_page_terms(self) -> None:
+        print("[ test ] page_terms weighs headings above body text & records positions")
+
+        terms = page_terms(["# Tom Bombadil\n", "\n", "Tom sings, **Tom** dances & a ![hobbit hole](/h.png)\n"])
+
+        self.assertEqual(terms["bombadil"], [8, 2])
+        self.assertEqual(terms["tom"], [8 + 1 + 2, 1, 3, 5])
+        self.assertEqual(terms["hobbit"], [1, 8])
+        self.assertNotIn("a", terms)
+
+        self.assertEqual(shard_prefix("tom"), "to")
+        self.assertEqual(shard_prefix("e\u00e4rendil"), "e_e4")
+
+        return
+
+    def test_incremental_update(self) -> None:
+        print("[ test ] only changed pages are re-indexed & their shards rewritten")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, _, docs_dir = write_site(Path(temp_dir))
+            docs_dir.mkdir()
+            template_path = Path(temp_dir) / "template.html"
+            manifest = BuildManifest(docs_dir / MANIFEST_NAME)
+
+            def build() -> tuple[int, int, int]:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    template = main.compile_page_template(template_path, "/SSG/", {})
+                    generate_pages_incrementally(content_dir, template, docs_dir, "/SSG/", manifest)
+                indexed, unchanged, removed, _ = update_search_index(content_dir, docs_dir, manifest.pages, "/SSG/")
+
+                return indexed, unchanged, removed
+
+            def shard(prefix: str) -> dict:
+                return json.loads((docs_dir / SEARCH_DIR / f"terms-{prefix}.json").read_text())
+
+            self.assertEqual(build(), (2, 0, 0))
+            index = json.loads((docs_dir / SEARCH_DIR / "index.json").read_text())
+            self.assertEqual(index["pages"], [["/SSG/blog/post.html", "Post"], ["/SSG/", "Home"]])
+            self.assertIn("bo", index["shards"])
+            self.assertEqual(shard("bo")["bold"], {"0": [2, 3]})
+
+            self.assertEqual(build(), (0, 2, 0))
+
+            we_mtime = (docs_dir / SEARCH_DIR / "terms-we.json").stat().st_mtime_ns
+            (content_dir / "blog" / "post.md").write_text("# Post\n\nno longer bold\n")
+            self.assertEqual(build(), (1, 1, 0))
+            self.assertEqual(shard("lo")["longer"], {"0": [1, 3]})
+            self.assertEqual(shard("bo")["bold"], {"0": [1, 4]})
+            self.assertEqual((docs_dir / SEARCH_DIR / "terms-we.json").stat().st_mtime_ns, we_mtime)
+
+            (content_dir / "blog" / "post.md").unlink()
+            self.assertEqual(build(), (0, 1, 1))
+            index = json.loads((docs_dir / SEARCH_DIR / "index.json").read_text())
+            self.assertEqual(index["pages"], [None, ["/SSG/", "Home"]])
+            self.assertFalse((docs_dir / SEARCH_DIR / "terms-bo.json").exists())
+            self.assertNotIn("bo", index["shards"])
+            self.assertEqual(shard("we")["welcome"], {"1": [1, 2]})
+
+        return
+
+    def test_ids_reused_across_saves(self) -> None:
+        print("[ test ] freed page ids are kept in the state & reused lowest first")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            docs_dir = Path(temp_dir)
+
+            def load() -> SearchIndex:
+                return SearchIndex.load(docs_dir / SEARCH_DIR, docs_dir / SEARCH_STATE)
+
+            index = load()
+            for name in ("a", "b", "c", "d"):
+                index.add_page(f"{name}.html", name, name, {"word": [1, 1]})
+            index.remove_page("c.html")
+            index.remove_page("b.html")
+            index.save("/")
+
+            index = load()
+            self.assertEqual((index.next_id, sorted(index.free_ids)), (4, [1, 2]))
+            index.add_page("e.html", "e", "e", {})
+            index.add_page("f.html", "f", "f", {})
+            index.add_page("g.html", "g", "g", {})
+            self.assertEqual([index.pages[f"{name}.html"]["id"] for name in "efg"], [1, 2, 4])
+
+        return
+
+    def test_terms_collected_while_rendering(self) -> None:
+        print("[ test ] render_pages collects the same terms page_terms parses, on every path")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            content_dir, template, docs_dir = write_site(Path(temp_dir))
+            (docs_dir / "blog").mkdir(parents=True)
+            for i in range(4):
+                (content_dir / f"page{i}.md").write_text(f"# Page {i}\n\nsome **bold** text {i}\n")
+            work_list = collect_pages(content_dir, docs_dir)
+
+            expected = []
+            for src_path, _ in work_list:
+                with src_path.open("r") as inFile:
+                    title, _, body = read_page(inFile)
+                    expected.append((title, page_terms(body)))
+
+            for options in ({}, {"jobs": 2}, {"io_threads": 2}, {"cache": BlockCache(64)}):
+                terms = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    render_pages(work_list, template, "/", terms=terms, **options)
+                self.assertEqual([(page.title, page.terms) for page in terms], expected)
+
+            # a parse cache hit has no nodes to collect from
+            cache = ParseCache(Path(temp_dir) / "cache")
+            with contextlib.redirect_stdout(io.StringIO()):
+                render_pages(work_list, template, "/", parse_cache=cache)
+                terms = []
+                render_pages(work_list, template, "/", parse_cache=cache, terms=terms)
+            self.assertEqual([page.title for page in terms], [None] * len(work_list))
+
+        return
+
+
+class TestShard(unittest.TestCase):
+    def build(self, root: Path, output: Path, shard: ShardSpec | None, basepath: str="/SSG/") -> BuildManifest:
+        output.mkdir(parents=True, exist_ok=True)
+        (output / "style.css").write_text("body {}\n")
+        manifest = BuildManifest(output / MANIFEST_NAME)
+        with contextlib.redirect_stdout(io.StringIO()):
+            template = main.compile_page_template(root / "template.html", basepath, {})
+            generate_pages_incrementally(
+                root / "content", template, output, basepath, manifest, shard=shard
+            )
+        manifest.shard = [shard.index, shard.count] if shard else None
+        manifest.save()
+
+        return manifest
+
+    def test_shard_spec(self) -> None:
+        print("[ test ] shards are picked by a stable hash of the markdown path")
+
+        self.assertEqual(ShardSpec.parse("2/4"), ShardSpec(2, 4))
+        self.assertEqual(ShardSpec(2, 4).name, "2-of-4")
+        for text in ("0/2", "3/2", "1", "a/b"):
+            with self.assertRaises(ValueError):
+                ShardSpec.parse(text)
+
+        self.assertEqual(shard_of("index.md", 2), 2)
+        self.assertEqual(shard_of("blog/post.md", 2), 1)
+        self.assertEqual(shard_of("index.md", 1), 1)
+        self.assertEqual(
+            sum(ShardSpec(index, 3).owns(f"page{i}.md") for i in range(30) for index in (1, 2, 3)), 30
+        )
+
+        return
+
+    def test_merge_matches_full_build(self) -> None:
+        print("[ test ] merging every shard's build gives the same site as one build")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            write_site(root)
+            full = self.build(root, root / "docs", None)
+            shard_dirs = [root / "shards" / str(index) for index in (1, 2)]
+            for index, shard_dir in enumerate(shard_dirs, 1):
+                self.build(root, shard_dir, ShardSpec(index, 2))
+            self.assertEqual(sorted(BuildManifest.load(shard_dirs[0] / MANIFEST_NAME).pages), ["blog/post.html"])
+
+            merge = ShardMerge(shard_dirs)
+            merged = merge.copy_to(root / "merged")
+            self.assertEqual(merge.settings["@basepath"], "/SSG/")
+            self.assertEqual((merge.stats.pages, merge.stats.files, merge.stats.shared), (2, 3, 1))
+            # the outputs' recorded mtimes are the shards', not the full build's
+            self.assertEqual(
+                {rel: entry["source_hash"] for rel, entry in merged.pages.items()},
+                {rel: entry["source_hash"] for rel, entry in full.pages.items()}
+            )
+            self.assertEqual(merged.pages["index.html"], BuildManifest.load(shard_dirs[1] / MANIFEST_NAME).pages["index.html"])
+            self.assertEqual(merged.deps.edges, full.deps.edges)
+            for rel in ("index.html", "blog/post.html", "style.css"):
+                self.assertEqual((root / "merged" / rel).read_bytes(), (root / "docs" / rel).read_bytes())
+
+        return
+
+    def test_output_must_be_empty_or_a_build(self) -> None:
+        print("[ test ] --output refuses a non-empty directory that isn't an earlier build")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            write_site(root)
+            shard_dirs = [root / "shards" / str(index) for index in (1, 2)]
+            for index, shard_dir in enumerate(shard_dirs, 1):
+                self.build(root, shard_dir, ShardSpec(index, 2))
+
+            output = root / "site"
+            output.mkdir()
+            argv = [*map(str, shard_dirs), "--output", str(output)]
+            self.assertEqual(main.parse_merge_args(argv).output, output)
+
+            (output / "notes.txt").write_text("mine\n")
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                main.parse_merge_args(argv)
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                main.parse_args(["/", "--output", str(output)])
+            self.assertTrue((output / "notes.txt").exists())
+
+            (output / "notes.txt").unlink()
+            with contextlib.redirect_stdout(io.StringIO()):
+                main.merge_site(main.parse_merge_args(argv))
+            self.assertEqual(main.parse_merge_args(argv).output, output)
+            self.assertEqual(main.parse_args(["/", "--output", str(output)]).output, output)
+
+        return
+
+    def test_merge_conflicts(self) -> None:
+        print("[ test ] shards that don't fit together are refused before anything is copied")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            write_site(root)
+            one = self.build(root, root / "one", ShardSpec(1, 2))
+            two = root / "two"
+            self.build(root, two, ShardSpec(2, 2), basepath="/")
+
+            def conflicts(shard_dirs: list[Path]) -> list[str]:
+                with self.assertRaises(MergeError) as context:
+                    ShardMerge(shard_dirs)
+
+                return context.exception.conflicts
+
+            self.assertEqual(conflicts([root / "one"]), ["missing shard(s) 2 of 2"])
+            self.assertIn("shard 1/2 is in both", conflicts([root / "one", root / "one"])[0])
+            self.assertIn("not a shard build", conflicts([root / "one", root / "content"])[0])
+            self.assertTrue(conflicts([root / "one", two])[0].startswith("@basepath differs between shards"))
+
+            # same settings, but a page built by both & a static file that differs
+            self.build(root, two, ShardSpec(2, 2))
+            one.pages["index.html"] = BuildManifest.load(two / MANIFEST_NAME).pages["index.html"]
+            one.save()
+            (two / "style.css").write_text("body { color: red }\n")
+            found = conflicts([root / "one", two])
+            self.assertEqual(len(found), 2)
+            self.assertIn("index.html: built by both shard 1/2 and shard 2/2", found)
+            self.assertTrue(found[1].startswith("style.css: differs between"))
+
+        return
+
+
 #---[ Test Entry ]--------------------------------------------------------------
 if __name__ == "__main__":
     unittest.main()
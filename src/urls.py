@@ -0,0 +1,91 @@
+#---[ Global Imports ]----------------------------------------------------------
+import json
+import re
+
+from   manifest import hash_str
+
+#---[ Global Imports ]----------------------------------------------------------
+
+# attributes holding URLs that get rewritten against the basepath
+URL_ATTRS = frozenset(("href", "src"))
+
+URL_ATTR_PATTERN = re.compile(r"""\b(href|src)=(["'])(/[^"']*)\2""")
+
+
+class UrlRewriter:
+    '''
+    Maps site-absolute URLs ("/images/tom.png") onto the basepath the site is
+    served under ("/SSG/images/tom.png").
+
+    - relative URLs, full URLs, & protocol-relative URLs ("//cdn...") are left
+      alone
+    - with `assets` (static path -> fingerprinted output path, see --fingerprint),
+      URLs of static files are also pointed at their fingerprinted copies:
+      "/index.css?v=1" -> "/SSG/index.3f2a9c1b.css?v=1"
+    - a plain class rather than a closure so it can be sent to worker processes
+    - rewriters with the same basepath & asset map compare (& hash) equal, so
+      one can be part of a cache key; `key` identifies them as a string
+    '''
+    def __init__(self, basepath: str="/", assets: dict[str, str] | None=None) -> None:
+        if not basepath.endswith("/"):
+            basepath += "/"
+        if not basepath.startswith("/"):
+            basepath = "/" + basepath
+
+        self.basepath = basepath
+        self.assets   = assets or {}
+
+        # hashed once here rather than per page or per cache lookup
+        self.assets_hash = hash_str(json.dumps(self.assets, sort_keys=True))[:16] if self.assets else None
+        self.key = basepath if self.assets_hash is None else f"{basepath}\0{self.assets_hash}"
+
+        return
+
+    @property
+    def is_identity(self) -> bool:
+        return self.basepath == "/" and not self.assets
+
+    def __call__(self, url: str) -> str:
+        if not url.startswith("/") or url.startswith("//"):
+            return url
+
+        if self.assets:
+            end = len(url)
+            for separator in "?#":
+                index = url.find(separator, 1, end)
+                if index != -1:
+                    end = index
+
+            fingerprinted = self.assets.get(url[1:end])
+            if fingerprinted is not None:
+                url = "/" + fingerprinted + url[end:]
+
+        return self.basepath + url[1:]
+
+    def rewrite_html(self, html: str) -> str:
+        '''
+        rewrites every href="/..." & src="/..." attribute in `html` in one pass
+        - meant for HTML that didn't come from an HTMLNode tree (e.g. the template)
+        '''
+        if self.is_identity:
+            return html
+
+        return URL_ATTR_PATTERN.sub(
+            lambda match: f"{match.group(1)}={match.group(2)}{self(match.group(3))}{match.group(2)}",
+            html
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, UrlRewriter):
+            return NotImplemented
+
+        return self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        if self.assets:
+            return f"UrlRewriter({self.basepath!r}, {len(self.assets)} assets)"
+
+        return f"UrlRewriter({self.basepath!r})"
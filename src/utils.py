@@ -1,5 +1,8 @@
 #---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Callable, Iterable, Iterator
+import itertools
 import re
+import time
 
 # nodes
 from   textnode import TextNode
@@ -11,14 +14,24 @@ from   parentnode import ParentNode
 from   textnode import TextType
 from   block    import BlockType
 
+# compiled regex
+from   patterns import HEADING_PATTERN, IMAGE_PATTERN, INLINE_SPECIAL_PATTERN, LINK_PATTERN
+
 #---[ Global Imports ]----------------------------------------------------------
 
+# inline delimiters, in the order they're tried at a given position
+INLINE_DELIMITERS = (
+    ("**", TextType.BOLD),
+    ("_",  TextType.ITALIC),
+    ("`",  TextType.CODE),
+)
+
 def extract_title(markdown: str) -> str:
     if not markdown: raise ValueError("empty markdown")
 
     title = ""
 
-    first_line = markdown.split('\n')[0]
+    first_line = markdown.partition('\n')[0]
     if first_line[0] != "#":
         raise ValueError("markdown does not begin with a heading #")
     
@@ -34,31 +47,77 @@ def extract_title(markdown: str) -> str:
 #---[ str, TextNode, HTMLNode Conversion ]--------------------------------------
 def text_to_text_nodes(text: str) -> list[TextNode]:
     '''
-    Splits inline markdown into text, bold, italic, and code TextNodes
+    Splits inline markdown into text, bold, italic, code, image, and link
+    TextNodes in a single left-to-right scan
+
+    - at each special character the earliest complete span wins: an image
+      `![alt](url)`, a link `[text](url)`, or a `**`/`_`/`` ` `` delimited run
+    - span contents aren't scanned again, so `` `a **b**` `` stays code
+    - characters that don't open a complete span are plain text
     '''
-    type_delimiter_map = {
-        TextType.BOLD: "**",
-        TextType.ITALIC: "_",
-        TextType.CODE: "`"
-    }
+    node_list = []
+
+    text_start = 0  # start of the plain text not yet emitted
+    location   = 0
 
-    node = TextNode(text)
-    node_list = [node]
+    while True:
+        match = INLINE_SPECIAL_PATTERN.search(text, location)
+        if not match:
+            break
+
+        index = match.start()
+        span  = _match_inline_span(text, index)
 
-    prev_list = []
+        if span is None:
+            location = index + 1
+            continue
 
-    while prev_list != node_list:
-        if prev_list == node_list: break
-        prev_list = node_list.copy()
+        span_node, span_end = span
 
-        for text_type, delimiter in type_delimiter_map.items():
-            node_list = split_nodes_delimiter(node_list, delimiter, text_type)
+        if text_start != index:
+            node_list.append(TextNode(text[text_start:index]))
+        node_list.append(span_node)
 
-        node_list = split_nodes_image(node_list)
-        node_list = split_nodes_link(node_list)
+        text_start = span_end
+        location   = span_end
+
+    if text_start < len(text) or not node_list:
+        node_list.append(TextNode(text[text_start:]))
 
     return node_list
 
+def _match_inline_span(text: str, index: int) -> tuple[TextNode, int] | None:
+    '''
+    the inline span starting at text[index] & the index just past it, if any
+    '''
+    char = text[index]
+
+    if char == "!":
+        match = IMAGE_PATTERN.match(text, index)
+        if match:
+            return TextNode(match.group(1), TextType.IMAGE, match.group(2)), match.end()
+        return None
+
+    if char == "[":
+        match = LINK_PATTERN.match(text, index)
+        if match:
+            return TextNode(match.group(1), TextType.LINK, match.group(2)), match.end()
+        return None
+
+    for delimiter, text_type in INLINE_DELIMITERS:
+        if not text.startswith(delimiter, index):
+            continue
+
+        # unclosed delimiters are plain text
+        content_start = index + len(delimiter)
+        close = text.find(delimiter, content_start)
+        if close == -1:
+            return None
+
+        return TextNode(text[content_start:close], text_type), close + len(delimiter)
+
+    return None
+
 def text_to_children(text: str) -> list[LeafNode]:
     textnode_list = text_to_text_nodes(text)
     child_node_list = []
@@ -90,42 +149,199 @@ def text_node_to_html_node(text_node: TextNode) -> LeafNode:
             raise Exception("TextNode to HTMLNode Error: invalid TextType given")
 
 def markdown_to_html_node(markdown: str) -> HTMLNode:
-    block_list = markdown_to_blocks(markdown)
-
-    children_list = []
-    for block in block_list:
-        block_type = block_to_block_type(block)
-
-        match block_type:
-            case BlockType.PARAGRAPH:
-                node = block_to_paragraph_html_node(block)
-                children_list.append(node)
-            case BlockType.HEADING:
-                node = block_to_heading_html_node(block)
-                children_list.append(node)
-            case BlockType.CODE:
-                node = block_to_code_html_node(block)
-                children_list.append(node)
-            case BlockType.QUOTE:
-                node = block_to_quote_html_node(block)
-                children_list.append(node)
-            case BlockType.ORDERED_LIST:
-                node = block_to_list_html_node(block, "ol")
-                children_list.append(node)
-            case BlockType.UNORDERED_LIST:
-                node = block_to_list_html_node(block, "ul")
-                children_list.append(node)
+    children_list = [block_to_html_node(block) for block in iter_blocks(markdown.split("\n"))]
 
     root_node = ParentNode("div", children_list)
     return root_node
 
+def render_markdown_into(
+    lines: Iterable[str],
+    write: Callable[[str], object],
+    rewrite_url: Callable[[str], str] | None=None,
+    profiler=None,
+    cache=None,
+    on_node: Callable[[HTMLNode], object] | None=None
+) -> None:
+    '''
+    Streaming markdown_to_html_node(...).render_into(write): each block's HTML
+    is written as soon as the block is read, so only one block (& its nodes)
+    is in memory at a time.
+
+    Args:
+        - `lines`: markdown lines, e.g. an open file
+        - `write`: called with each chunk of HTML
+        - `profiler`: if given, per block "read", "parse" & "render" times are
+          added to its stage totals (see profiler.py)
+        - `cache`: a BlockCache; blocks found in it are written from it, the
+          rest are rendered & added (see blockcache.py)
+        - `on_node`: called with each block's node before it's rendered (e.g.
+          to collect search terms); every block is then parsed, so `cache` is
+          not used
+
+    Raises:
+        - `ValueError` if there are no blocks, same as an empty <div> ParentNode
+    '''
+    blocks = iter_blocks(lines)
+
+    first_block = next(blocks, None)
+    if first_block is None:
+        raise ValueError("Error: Parent Node must have children nodes")
+
+    if on_node is not None:
+        cache = None
+
+    write("<div>")
+    if profiler is not None:
+        _profiled_render_blocks(first_block, blocks, write, rewrite_url, profiler, cache, on_node)
+    elif on_node is not None:
+        for block in itertools.chain((first_block,), blocks):
+            node = block_to_html_node(block)
+            on_node(node)
+            node.render_into(write, rewrite_url)
+    elif cache is not None:
+        write(cached_block_html(first_block, rewrite_url, cache))
+        for block in blocks:
+            write(cached_block_html(block, rewrite_url, cache))
+    else:
+        block_to_html_node(first_block).render_into(write, rewrite_url)
+        for block in blocks:
+            block_to_html_node(block).render_into(write, rewrite_url)
+    write("</div>")
+
+    return
+
+def cached_block_html(block: str, rewrite_url: Callable[[str], str] | None, cache) -> str:
+    '''
+    a block's HTML from `cache`, rendering & caching it on a miss
+    - the URL rewriter is part of the key, since it changes the output
+    '''
+    key = (rewrite_url, block)
+
+    html = cache.get(key)
+    if html is None:
+        chunks = []
+        block_to_html_node(block).render_into(chunks.append, rewrite_url)
+        html = "".join(chunks)
+        cache.put(key, html)
+
+    return html
+
+def _profiled_render_blocks(
+    block: str,
+    blocks: Iterator[str],
+    write: Callable[[str], object],
+    rewrite_url: Callable[[str], str] | None,
+    profiler,
+    cache=None,
+    on_node: Callable[[HTMLNode], object] | None=None
+) -> None:
+    read_ns = parse_ns = render_ns = cached_ns = 0
+    count = cached = 0
+
+    while True:
+        start = time.perf_counter_ns()
+
+        html = cache.get((rewrite_url, block)) if cache is not None else None
+        if html is not None:
+            write(html)
+            rendered = time.perf_counter_ns()
+            cached_ns += rendered - start
+            cached += 1
+        else:
+            node = block_to_html_node(block)
+            if on_node is not None:
+                on_node(node)
+            parsed = time.perf_counter_ns()
+            if cache is not None:
+                chunks = []
+                node.render_into(chunks.append, rewrite_url)
+                html = "".join(chunks)
+                cache.put((rewrite_url, block), html)
+                write(html)
+            else:
+                node.render_into(write, rewrite_url)
+            rendered = time.perf_counter_ns()
+
+            parse_ns  += parsed - start
+            render_ns += rendered - parsed
+            count += 1
+
+        block = next(blocks, None)
+        read_ns += time.perf_counter_ns() - rendered
+        if block is None:
+            break
+
+    profiler.add("read", read_ns, count + cached)
+    profiler.add("parse", parse_ns, count)
+    profiler.add("render", render_ns, count)
+    if cached:
+        profiler.add("block_cache_hit", cached_ns, cached)
+
+    return
+
+def block_to_html_node(block: str) -> HTMLNode:
+    block_type = block_to_block_type(block)
+
+    match block_type:
+        case BlockType.HEADING:
+            return block_to_heading_html_node(block)
+        case BlockType.CODE:
+            return block_to_code_html_node(block)
+        case BlockType.QUOTE:
+            return block_to_quote_html_node(block)
+        case BlockType.ORDERED_LIST:
+            return block_to_list_html_node(block, "ol")
+        case BlockType.UNORDERED_LIST:
+            return block_to_list_html_node(block, "ul")
+        case _:
+            return block_to_paragraph_html_node(block)
+
 def markdown_to_blocks(markdown: str) -> list[str]:
-    blocks = markdown.split("\n\n")
-    
-    # remove surrounding whitespace & filter empty lines
-    blocks = [block_str.strip() for block_str in blocks if block_str.strip() != ""]
+    return list(iter_blocks(markdown.split("\n")))
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[str]:
+    '''
+    Lazily groups markdown lines into blocks separated by blank lines.
+
+    - each block has its surrounding whitespace stripped
+    - a block opening with ``` runs until a line ending in ```, blank lines
+      and all, so fenced code keeps its empty lines
+    - a fence still open at the end of the document is closed there, so the
+      rest of the page renders as code rather than one paragraph
+    - `lines` may keep their line endings (e.g. iterating over a file)
+    '''
+    block_lines = []
+    in_fence = False
 
-    return blocks
+    for line in lines:
+        line = line.rstrip("\r\n")
+        stripped = line.strip()
+
+        if in_fence:
+            block_lines.append(line)
+            if stripped.endswith("```"):
+                in_fence = False
+            continue
+
+        if not stripped:
+            if block_lines:
+                yield "\n".join(block_lines).strip()
+                block_lines = []
+            continue
+
+        # a fence only opens at the start of a block; "```code```" on one
+        # line opens & closes it
+        if not block_lines and stripped.startswith("```"):
+            in_fence = len(stripped) < 6 or not stripped.endswith("```")
+
+        block_lines.append(line)
+
+    if in_fence:
+        block_lines.append("```")
+    if block_lines:
+        yield "\n".join(block_lines).strip()
+
+    return
 
 #---[ str, TextNode, HTMLNode Conversion ]--------------------------------------
 
@@ -321,7 +537,7 @@ def split_nodes_delimiter(
             if split_res[0]:
                 node_left = TextNode(split_res[0])
             node_right = None
-            if split_res[0]:
+            if split_res[2]:
                 node_right = TextNode(split_res[2])
             node_middle = TextNode(split_res[1], text_type)
 
@@ -336,6 +552,20 @@ def split_nodes_delimiter(
     return res
 
 def split_nodes_image(old_nodes: list[TextNode]) -> list[TextNode]:
+    return _split_nodes_pattern(old_nodes, IMAGE_PATTERN, TextType.IMAGE)
+
+def split_nodes_link(old_nodes: list[TextNode]) -> list[TextNode]:
+    return _split_nodes_pattern(old_nodes, LINK_PATTERN, TextType.LINK)
+
+def _split_nodes_pattern(
+    old_nodes: list[TextNode],
+    pattern: re.Pattern,
+    text_type: TextType
+) -> list[TextNode]:
+    '''
+    splits TEXT nodes around every match of an image or link `pattern`
+    - match spans come straight from finditer, so each string is scanned once
+    '''
     new_nodes = []
 
     for node in old_nodes:
@@ -343,99 +573,39 @@ def split_nodes_image(old_nodes: list[TextNode]) -> list[TextNode]:
             new_nodes.append(node)
             continue
 
-        link_pairs = extract_markdown_images(node.text)
-
-        # no match: extract() returns empty list
-        if not link_pairs:
-            new_nodes.append(node)
-            continue
-
-        # match: create left TextNode, image node, & right TextNode
+        # match: create left TextNode, image/link node, & right TextNode
         text_node_start = 0
 
-        for text, link in link_pairs:
-            # get start & end indices of link
-            reconstructed_link = f"![{text}]({link})"
-
-            left = node.text.find(reconstructed_link)
-            right = left + len(reconstructed_link)
+        for match in pattern.finditer(node.text):
+            left, right = match.span()
 
             # create text node before
             if text_node_start != left:
-                text_string = node.text[text_node_start:left]
-                new_text_node = TextNode(text_string)
-                new_nodes.append(new_text_node)
+                new_nodes.append(TextNode(node.text[text_node_start:left]))
 
-            # create image node
-            new_image_node = TextNode(text, TextType.IMAGE, link)
-            new_nodes.append(new_image_node)
+            # create image/link node
+            text, link = match.groups()
+            new_nodes.append(TextNode(text, text_type, link))
 
             # set next text starting index
             text_node_start = right
 
-        # create possible last text node
-        if text_node_start < len(node.text):
-            new_text_node = TextNode(node.text[text_node_start:])
-            new_nodes.append(new_text_node)
-
-    return new_nodes
-
-def split_nodes_link(old_nodes: list[TextNode]) -> list[TextNode]:
-    new_nodes = []
-
-    for node in old_nodes:
-        if node.text_type != TextType.TEXT:
+        # no match: keep the original node
+        if text_node_start == 0:
             new_nodes.append(node)
             continue
 
-        link_pairs = extract_markdown_links(node.text)
-
-        # no match: extract() returns empty list
-        if not link_pairs:
-            new_nodes.append(node)
-            continue
-
-        # match: create left TextNode, image node, & right TextNode
-        text_node_start = 0
-
-        for text, link in link_pairs:
-            # get start & end indices of link
-            reconstructed_link = f"[{text}]({link})"
-
-            left = node.text.find(reconstructed_link)
-            right = left + len(reconstructed_link)
-
-            # create text node before
-            if text_node_start != left:
-                text_string = node.text[text_node_start:left]
-                new_text_node = TextNode(text_string)
-                new_nodes.append(new_text_node)
-
-            # create image node
-            new_image_node = TextNode(text, TextType.LINK, link)
-            new_nodes.append(new_image_node)
-
-            # set next text starting index
-            text_node_start = right
-
         # create possible last text node
         if text_node_start < len(node.text):
-            new_text_node = TextNode(node.text[text_node_start:])
-            new_nodes.append(new_text_node)
+            new_nodes.append(TextNode(node.text[text_node_start:]))
 
     return new_nodes
 
 def extract_markdown_images(text: str) -> list[tuple[str, str]]:
-    pattern = r"!\[(.*?)\]\((.*?)\)"
-    matches = re.findall(pattern, text)
-
-    return matches
+    return IMAGE_PATTERN.findall(text)
 
 def extract_markdown_links(text: str) -> list[tuple[str, str]]:
-    pattern = r"\[(.*?)\]\((.*?)\)"
-    matches = re.findall(pattern, text)
-
-    return matches
+    return LINK_PATTERN.findall(text)
 
 #---[ Split TextNodes & extract link str ]--------------------------------------
 
@@ -462,11 +632,9 @@ def block_to_block_type(markdown_block: str) -> BlockType:
     return res
 
 def check_block_is_heading(lines: list[str]) -> bool:
-    import re
     if len(lines) != 1: return False
 
-    pattern = r"(#{1,6}) ([^\s].*)"
-    return re.match(pattern, lines[0]) is not None
+    return HEADING_PATTERN.match(lines[0]) is not None
 
 def check_block_is_code(lines: list[str]) -> bool:
     # check total length is at least 6
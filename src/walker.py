@@ -0,0 +1,219 @@
+'''
+Iterative directory walking for big content & static trees.
+
+walk_files visits a tree depth-first, in the same name order as recursing
+over sorted(Path.iterdir()), but:
+    - with os.scandir, whose entries already know whether they're directories
+      (d_type), so there's no extra stat per file
+    - with an explicit stack instead of recursion, yielding files as it finds
+      them
+    - skipping what a PathFilter's globs rule out, without descending into
+      excluded directories
+    - with DirListings, reusing the names recorded for a directory whose mtime
+      hasn't changed since it was last listed, so an incremental build stats
+      each directory once instead of listing it
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Iterable, Iterator
+import os
+from   pathlib import Path
+import re
+import time
+
+#---[ Global Imports ]----------------------------------------------------------
+
+# a directory modified this recently may change again within the same mtime
+# tick, so its listing isn't recorded (the same "racy" rule git uses)
+RACY_NS = 2 * 10**9
+
+
+#---[ Globs ]-------------------------------------------------------------------
+def glob_to_regex(pattern: str) -> re.Pattern:
+    '''
+    compiles a glob matched against "/"-separated paths relative to the root
+        - "*" & "?" don't cross "/", "**" does ("drafts/**", "**/_*.md")
+        - a pattern without a "/" matches a name at any depth ("*.md")
+        - a leading "/" anchors it to the root ("/index.md")
+    '''
+    anchored = "/" in pattern.rstrip("/")
+    pattern  = pattern.strip("/")
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", i + 2)) != -1:
+            chars = pattern[i + 1:end]
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            parts.append(f"[{chars.replace(chr(92), chr(92) * 2)}]")
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+
+    return re.compile(("" if anchored else "(?:.*/)?") + "".join(parts))
+
+class PathFilter:
+    '''
+    which files of a tree to visit: those matching any `include` glob (every
+    file when there are none) & no `exclude` glob; a directory matching an
+    `exclude` glob is skipped along with everything below it
+    '''
+    def __init__(self, include: Iterable[str]=(), exclude: Iterable[str]=()) -> None:
+        self.include = [glob_to_regex(pattern) for pattern in include]
+        self.exclude = [glob_to_regex(pattern) for pattern in exclude]
+
+        return
+
+    def allows_dir(self, rel: str) -> bool:
+        # "drafts/**" should skip the directory itself, not just its files
+        return not any(regex.fullmatch(rel) or regex.fullmatch(rel + "/") for regex in self.exclude)
+
+    def allows_file(self, rel: str) -> bool:
+        if any(regex.fullmatch(rel) for regex in self.exclude):
+            return False
+
+        return not self.include or any(regex.fullmatch(rel) for regex in self.include)
+
+    def allows(self, rel: str) -> bool:
+        '''
+        allows_file, plus none of the file's directories being excluded; for
+        checking a single path without walking to it
+        '''
+        parts = rel.split("/")
+        for depth in range(1, len(parts)):
+            if not self.allows_dir("/".join(parts[:depth])):
+                return False
+
+        return self.allows_file(rel)
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude)
+
+#---[ Globs ]-------------------------------------------------------------------
+
+
+#---[ Directory Listings ]------------------------------------------------------
+class DirListings:
+    '''
+    key -> {"mtime", "entries"} for directories listed by an earlier walk,
+    where entries are the names in the directory in order, with a "/" after
+    subdirectories
+    - keys are a tree prefix ("content/") plus the directory's path relative
+      to the tree, so one instance can hold several trees
+    - `entries` is the dict stored in the build manifest; `changed` says
+      whether it changed since it was last saved
+    '''
+    def __init__(self, entries: dict[str, dict] | None=None) -> None:
+        self.entries = entries if entries is not None else {}
+        self.seen: set[str] = set()
+        self.hits    = 0
+        self.misses  = 0
+        self.changed = False
+
+        return
+
+    def list(self, path: Path, key: str) -> list[tuple[str, bool]]:
+        '''
+        (name, is_dir) for each entry of the directory, in name order
+        '''
+        self.seen.add(key)
+        mtime = os.stat(path).st_mtime_ns
+
+        entry = self.entries.get(key)
+        if entry is not None and entry["mtime"] == mtime:
+            self.hits += 1
+            return [(name[:-1], True) if name.endswith("/") else (name, False) for name in entry["entries"]]
+
+        self.misses += 1
+        listing = scan_dir(path)
+        if time.time_ns() - mtime >= RACY_NS:
+            self.entries[key] = {"mtime": mtime, "entries": [name + "/" if is_dir else name for name, is_dir in listing]}
+            self.changed = True
+        elif self.entries.pop(key, None) is not None:
+            self.changed = True
+
+        return listing
+
+    def prune(self, prefix: str) -> int:
+        '''
+        forgets directories under `prefix` that the walks since the last prune
+        didn't reach, because they were deleted (or excluded)
+        '''
+        gone = [key for key in self.entries if key.startswith(prefix) and key not in self.seen]
+        for key in gone:
+            del self.entries[key]
+            self.changed = True
+        self.seen = {key for key in self.seen if not key.startswith(prefix)}
+
+        return len(gone)
+
+    def __str__(self) -> str:
+        return f"{self.hits} directories unchanged, {self.misses} listed"
+
+def scan_dir(path: Path) -> list[tuple[str, bool]]:
+    with os.scandir(path) as entries:
+        return sorted((entry.name, entry.is_dir()) for entry in entries)
+
+#---[ Directory Listings ]------------------------------------------------------
+
+
+#---[ Walking ]-----------------------------------------------------------------
+def walk_files(
+    root: Path,
+    path_filter: PathFilter | None=None,
+    listings: DirListings | None=None,
+    key_prefix: str=""
+) -> Iterator[tuple[Path, str]]:
+    '''
+    yields (path, path relative to `root` with "/" separators) for each file
+    below `root`, depth-first in name order
+    - directories are listed only as the walk reaches them
+    - `key_prefix` names the tree in `listings`
+    '''
+    def listing(path: Path, rel: str) -> Iterator[tuple[str, bool]]:
+        if listings is None:
+            return iter(scan_dir(path))
+
+        return iter(listings.list(path, key_prefix + rel))
+
+    stack = [(root, "", listing(root, ""))]
+    while stack:
+        directory, rel_dir, entries = stack[-1]
+
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+
+        name, is_dir = entry
+        rel = rel_dir + name
+        if is_dir:
+            if path_filter is None or path_filter.allows_dir(rel):
+                path = directory / name
+                try:
+                    stack.append((path, rel + "/", listing(path, rel + "/")))
+                except FileNotFoundError:
+                    # removed since its parent was listed
+                    continue
+        elif path_filter is None or path_filter.allows_file(rel):
+            yield directory / name, rel
+
+    return
+
+#---[ Walking ]-----------------------------------------------------------------
@@ -0,0 +1,275 @@
+'''
+File watchers for --watch.
+
+Both watchers report changed file paths (created, modified, or deleted) from
+`poll(timeout)`. InotifyWatcher asks the kernel for events, so an idle tick
+costs nothing; PollingWatcher is the portable fallback and stats every
+watched file each tick.
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+import ctypes
+import ctypes.util
+import os
+from   pathlib import Path
+import select
+import struct
+import sys
+import time
+
+#---[ Global Imports ]----------------------------------------------------------
+
+POLL_INTERVAL = 0.05
+DEBOUNCE      = 0.05
+
+
+#---[ Polling ]-----------------------------------------------------------------
+class PollingWatcher:
+    def __init__(self, roots: list[Path], files: list[Path] | None=None) -> None:
+        self.roots    = roots
+        self.files    = files or []
+        self.snapshot = self.scan()
+
+        return
+
+    def scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot = {}
+
+        stack = [root for root in self.roots if root.is_dir()]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+
+        for path in self.files:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+    def poll(self, timeout: float) -> set[Path]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            snapshot = self.scan()
+            changed = {
+                path for path in snapshot.keys() | self.snapshot.keys()
+                if snapshot.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = snapshot
+
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def close(self) -> None:
+        return
+
+#---[ Polling ]-----------------------------------------------------------------
+
+
+#---[ inotify ]-----------------------------------------------------------------
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR       = 0x40000000
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyWatcher:
+    '''
+    Watches every directory under `roots` (plus the directories holding
+    `files`, filtered down to just those files) with Linux inotify, via libc.
+    '''
+    def __init__(self, roots: list[Path], files: list[Path] | None=None) -> None:
+        self.libc = load_libc()
+        if self.libc is None:
+            raise OSError("inotify is not available")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.directories: dict[int, Path] = {}
+        self.files = set(files or [])
+
+        # directories only watched for `files`, whose other events are ignored
+        self.file_parents = {
+            path.parent for path in self.files
+            if not any(path.parent == root or root in path.parent.parents for root in roots)
+        }
+
+        for root in roots:
+            self.add_tree(root)
+        for parent in self.file_parents:
+            self.add_directory(parent)
+
+        return
+
+    def add_directory(self, directory: Path) -> None:
+        if directory in self.directories.values():
+            return
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.directories[wd] = directory
+
+        return
+
+    def add_tree(self, root: Path) -> list[Path]:
+        '''
+        watches `root` & every directory below it, returning the files found
+        '''
+        found = []
+
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            self.add_directory(directory)
+
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                else:
+                    found.append(Path(entry.path))
+
+        return found
+
+    def poll(self, timeout: float) -> set[Path]:
+        changed = set()
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            directory = self.directories.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                self.directories.pop(wd, None)
+                continue
+            if not name:
+                continue
+
+            path = directory / os.fsdecode(name)
+
+            if directory in self.file_parents and path not in self.files:
+                continue
+
+            if mask & IN_ISDIR:
+                # new or moved-in directories bring their whole contents;
+                # removed ones are reported as the directory itself
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self.add_tree(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changed.add(path)
+                continue
+
+            changed.add(path)
+
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+        return
+
+def load_libc() -> ctypes.CDLL | None:
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+
+    if not hasattr(libc, "inotify_init1"):
+        return None
+
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+    return libc
+
+#---[ inotify ]-----------------------------------------------------------------
+
+
+#---[ Watching ]----------------------------------------------------------------
+def make_watcher(
+    roots: list[Path],
+    files: list[Path] | None=None,
+    polling: bool=False
+) -> InotifyWatcher | PollingWatcher:
+    '''
+    inotify where the platform has it, polling everywhere else
+    '''
+    if not polling:
+        try:
+            return InotifyWatcher(roots, files)
+        except OSError:
+            pass
+
+    return PollingWatcher(roots, files)
+
+def wait_for_changes(watcher: InotifyWatcher | PollingWatcher, debounce: float=DEBOUNCE) -> set[Path]:
+    '''
+    blocks until something changes, then keeps collecting changes until none
+    arrive for `debounce` seconds, so a burst of saves is one rebuild
+    '''
+    changed = set()
+
+    while not changed:
+        changed = watcher.poll(1.0)
+
+    while True:
+        more = watcher.poll(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+#---[ Watching ]----------------------------------------------------------------
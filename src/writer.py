@@ -0,0 +1,138 @@
+'''
+Output writes that leave unchanged files alone.
+
+A page is rendered into a temp file next to its output while its bytes are
+hashed. If the output already holds exactly those bytes the temp file is
+dropped, so the output keeps its mtime (& rsync / CDN deploys don't re-upload
+it); otherwise the temp file is renamed over the output, so readers never see
+a half-written page & a failed render leaves the previous version in place.
+
+Comparing against the existing output costs nothing in the common cases:
+    - a different size means it changed
+    - an output with the size & mtime recorded in the build manifest has the
+      recorded hash, so it isn't re-read
+'''
+
+#---[ Global Imports ]----------------------------------------------------------
+from   collections.abc import Callable
+import hashlib
+import locale
+import os
+from   pathlib import Path
+import threading
+
+from   manifest import hash_file
+
+#---[ Global Imports ]----------------------------------------------------------
+
+# what open(path, "w") would have encoded pages with
+ENCODING = locale.getpreferredencoding(False)
+
+
+class WriteResult:
+    '''
+    the outcome of one write: whether the file was replaced, & the size, hash
+    & mtime of what's now there (recorded in the manifest for next time)
+    '''
+    __slots__ = ("written", "size", "hash", "mtime")
+
+    def __init__(self, written: bool, size: int, file_hash: str, mtime: int) -> None:
+        self.written = written
+        self.size    = size
+        self.hash    = file_hash
+        self.mtime   = mtime
+
+        return
+
+    def state(self) -> list:
+        return [self.size, self.mtime, self.hash]
+
+    def __repr__(self) -> str:
+        return f"WriteResult(written: {self.written}, size: {self.size})"
+
+class WriteStats:
+    def __init__(self) -> None:
+        self.written       = 0
+        self.skipped       = 0
+        self.bytes_written = 0
+        self.bytes_skipped = 0
+
+        return
+
+    def add(self, result: WriteResult) -> None:
+        if result.written:
+            self.written       += 1
+            self.bytes_written += result.size
+        else:
+            self.skipped       += 1
+            self.bytes_skipped += result.size
+
+        return
+
+    def __str__(self) -> str:
+        return (
+            f"{self.written} written ({self.bytes_written:,} bytes), "
+            f"{self.skipped} unchanged ({self.bytes_skipped:,} bytes)"
+        )
+
+
+#---[ Writing ]-----------------------------------------------------------------
+def write_if_changed(
+    dest_path: Path,
+    render: Callable[[Callable[[str], object]], None],
+    previous: list | None=None
+) -> WriteResult:
+    '''
+    calls `render(write)` to produce the file's text, then replaces `dest_path`
+    with it only if its bytes differ
+    - `previous` is the [size, mtime, hash] recorded for `dest_path` by an
+      earlier write, if any
+    - if `render` raises, `dest_path` is left as it was
+    '''
+    temp_path = dest_path.with_name(f".{dest_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    digest = hashlib.sha256()
+
+    try:
+        with temp_path.open("wb") as outFile:
+            def write(chunk: str) -> None:
+                data = chunk.encode(ENCODING)
+                digest.update(data)
+                outFile.write(data)
+
+                return
+
+            render(write)
+            size = outFile.tell()
+
+        file_hash = digest.hexdigest()
+        if output_matches(dest_path, size, file_hash, previous):
+            temp_path.unlink()
+            return WriteResult(False, size, file_hash, dest_path.stat().st_mtime_ns)
+
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return WriteResult(True, size, file_hash, dest_path.stat().st_mtime_ns)
+
+def output_matches(dest_path: Path, size: int, file_hash: str, previous: list | None=None) -> bool:
+    '''
+    whether `dest_path` already holds `size` bytes hashing to `file_hash`
+    '''
+    try:
+        stat = dest_path.stat()
+    except FileNotFoundError:
+        return False
+
+    if stat.st_size != size:
+        return False
+
+    if previous is not None:
+        recorded_size, recorded_mtime, recorded_hash = previous
+        if recorded_size == stat.st_size and recorded_mtime == stat.st_mtime_ns:
+            return recorded_hash == file_hash
+
+    return hash_file(dest_path) == file_hash
+
+#---[ Writing ]-----------------------------------------------------------------